@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.models import IntegerField
+
+        from . import signals  # noqa: F401
+        from .filters import ArrayIn
+
+        IntegerField.register_lookup(ArrayIn)
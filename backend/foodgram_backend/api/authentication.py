@@ -0,0 +1,80 @@
+from rest_framework import authentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from foodgram_backend.db_router import replicas_enabled, use_primary
+from users.models import TokenUser
+
+from .revocation import AUTH_HASH_CLAIM, is_revoked
+
+
+# Поля пользователя, которые кладутся в JWT и восстанавливаются из него
+USER_CLAIMS = ('email', 'username', 'first_name', 'last_name')
+AVATAR_CLAIM = 'avatar'
+STAFF_CLAIM = 'is_staff'
+
+
+class TokenAuthentication(authentication.TokenAuthentication):
+    """
+    TokenAuthentication с учётом реплик: если токен не найден
+    на реплике (например, выдан только что и ещё не реплицирован),
+    поиск повторяется на основной БД.
+    """
+
+    def authenticate_credentials(self, key):
+        try:
+            return super().authenticate_credentials(key)
+        except AuthenticationFailed:
+            if not replicas_enabled():
+                raise
+        with use_primary():
+            return super().authenticate_credentials(key)
+
+
+def set_user_claims(token, user):
+    """Записывает в токен поля пользователя, нужные для ответов API."""
+
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    token[AVATAR_CLAIM] = user.avatar.name if user.avatar else None
+    token[STAFF_CLAIM] = user.is_staff
+    token[AUTH_HASH_CLAIM] = user.get_session_auth_hash()
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    Аутентификация по короткоживущему access-токену JWT без запроса
+    к БД: подпись и срок проверяются локально, пользователь
+    восстанавливается из claims как TokenUser. Отозванные токены
+    отсекаются по списку в памяти воркера (api.revocation).
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken('Токен отозван.')
+        return token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                'Токен не содержит идентификатора пользователя.'
+            )
+
+        user = TokenUser(
+            id=user_id,
+            is_active=True,
+            is_staff=bool(validated_token.get(STAFF_CLAIM)),
+            avatar=validated_token.get(AVATAR_CLAIM),
+            **{
+                claim: validated_token.get(claim, '')
+                for claim in USER_CLAIMS
+            }
+        )
+        user._state.adding = False
+        user._state.db = 'default'
+        return user
@@ -0,0 +1,363 @@
+import hashlib
+import math
+import random
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError
+from rest_framework import status
+from rest_framework.response import Response
+
+from monitoring.metrics import (
+    CACHE_HIT,
+    CACHE_MISS,
+    CACHE_STALE,
+    record_cache,
+)
+
+from .invalidation import TOKENS_SCOPE, register_handler
+
+
+RESPONSE_KEY_PREFIX = 'response:'
+TAG_KEY_PREFIX = 'response-tag:'
+LOCK_KEY_PREFIX = 'response-lock:'
+# Тег всех страниц ленты рецептов без фильтра по автору
+RECIPE_LIST_TAG = 'recipe-list'
+# Тег всех списков ингредиентов (в том числе с поиском по name)
+INGREDIENT_LIST_TAG = 'ingredient-list'
+# Тег, которым неявно помечена каждая запись: его очистка делает
+# устаревшими все ответы, не трогая другие данные того же хранилища
+ALL_RESPONSES_TAG = 'all'
+CACHE_NAME = 'responses'
+# Заголовок ответа, отданного из устаревшей записи кэша
+STALE_HEADER = 'X-Cache-Stale'
+# Как часто ждущий запрос проверяет, не посчитан ли уже ответ
+LOCK_POLL_INTERVAL = 0.05
+
+
+def recipe_tag(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def author_tag(author_id):
+    return f'author:{author_id}'
+
+
+def author_list_tag(author_id):
+    return f'recipe-list:author:{author_id}'
+
+
+def ingredient_tag(ingredient_id):
+    return f'ingredient:{ingredient_id}'
+
+
+def subscriptions_tag(user_id):
+    return f'subscriptions:{user_id}'
+
+
+class TaggedResponseCache:
+    """
+    Кэш данных ответов с инвалидацией по тегам и мягким сроком жизни.
+
+    Для каждого тега в кэше хранится время его последней очистки.
+    Запись свежая, если её вычисление началось позже очистки всех её
+    тегов и не истёк мягкий срок timeout. Устаревшая запись
+    (истёк срок или очищен тег) хранится ещё stale_timeout секунд:
+    её отдают, пока один запрос пересчитывает ответ, и при ошибках БД.
+    Тег, вытесненный из кэша, считается очищенным только что.
+    """
+
+    def __init__(self, alias, timeout, stale_timeout, lock_timeout,
+                 early_refresh_beta):
+        self.alias = alias
+        self.timeout = timeout
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.early_refresh_beta = early_refresh_beta
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _purged_at(self, tags):
+        keys = [f'{TAG_KEY_PREFIX}{tag}' for tag in tags]
+        purged = self.cache.get_many(keys)
+        for key in keys:
+            if key not in purged:
+                now = time.time()
+                self.cache.add(key, now, None)
+                purged[key] = self.cache.get(key, now)
+        return max(purged.values(), default=0)
+
+    def get(self, key):
+        """Возвращает пару (запись, свежая ли она) или (None, False)."""
+
+        entry = self.cache.get(f'{RESPONSE_KEY_PREFIX}{key}')
+        if entry is None:
+            return None, False
+        fresh = (
+            time.time() < entry['fresh_until']
+            and self._purged_at(
+                [*entry['tags'], ALL_RESPONSES_TAG]
+            ) < entry['started']
+        )
+        return entry, fresh
+
+    def should_refresh_early(self, entry):
+        """
+        Вероятностное досрочное обновление (XFetch): чем ближе конец
+        мягкого срока и чем дольше считается ответ, тем вероятнее,
+        что запрос обновит запись до её устаревания.
+        """
+
+        if not self.early_refresh_beta:
+            return False
+        return time.time() - (
+            entry['delta'] * self.early_refresh_beta
+            * math.log(1 - random.random())
+        ) >= entry['fresh_until']
+
+    def set(self, key, data, tags, started):
+        # Теги, которые ещё ни разу не очищались, заводятся с нулевым
+        # временем, иначе запись оказалась бы устаревшей сразу
+        tag_keys = {
+            f'{TAG_KEY_PREFIX}{tag}' for tag in (*tags, ALL_RESPONSES_TAG)
+        }
+        for tag_key in tag_keys - self.cache.get_many(tag_keys).keys():
+            self.cache.add(tag_key, 0, None)
+        now = time.time()
+        self.cache.set(
+            f'{RESPONSE_KEY_PREFIX}{key}',
+            {
+                'data': data,
+                'tags': sorted(tags),
+                'started': started,
+                'fresh_until': now + self.timeout,
+                'delta': now - started,
+            },
+            self.timeout + self.stale_timeout,
+        )
+
+    def delete(self, key):
+        self.cache.delete(f'{RESPONSE_KEY_PREFIX}{key}')
+
+    def lock(self, key):
+        """Пересчитывать ответ должен только тот, кто взял блокировку."""
+
+        return self.cache.add(
+            f'{LOCK_KEY_PREFIX}{key}', True, self.lock_timeout
+        )
+
+    def unlock(self, key):
+        self.cache.delete(f'{LOCK_KEY_PREFIX}{key}')
+
+    def wait(self, key, timeout):
+        """Ждёт, пока ответ посчитает запрос, взявший блокировку."""
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry, fresh = self.get(key)
+            if fresh:
+                return entry
+        return None
+
+    def purge(self, *tags):
+        now = time.time()
+        self.cache.set_many(
+            {f'{TAG_KEY_PREFIX}{tag}': now for tag in tags}, None
+        )
+
+
+_response_cache = None
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = TaggedResponseCache(
+            alias=settings.RESPONSE_CACHE_ALIAS,
+            timeout=settings.RESPONSE_CACHE_TIMEOUT,
+            stale_timeout=settings.RESPONSE_CACHE_STALE_TIMEOUT,
+            lock_timeout=settings.RESPONSE_CACHE_LOCK_TIMEOUT,
+            early_refresh_beta=settings.RESPONSE_CACHE_EARLY_REFRESH_BETA,
+        )
+    return _response_cache
+
+
+@register_handler
+def purge_responses(scope, tags, local):
+    """
+    Очищает кэш ответов по событию шины инвалидации. События других
+    воркеров обрабатываются, только если кэш локален для процесса:
+    общий кэш уже очищен воркером, выполнившим запись.
+    """
+
+    if not settings.RESPONSE_CACHE_ENABLED or scope == TOKENS_SCOPE:
+        return
+    response_cache = get_response_cache()
+    if not local and not isinstance(response_cache.cache, LocMemCache):
+        return
+    if tags is None:
+        # Не clear(): хранилище может быть общим с другими данными
+        # (привязка к основной БД)
+        response_cache.purge(ALL_RESPONSES_TAG)
+    else:
+        response_cache.purge(*tags)
+
+
+def request_cache_key(request):
+    """
+    Ключ ответа: хост, путь и нормализованные параметры запроса
+    (отсортированы, пустые значения отброшены).
+    """
+
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    )
+    raw = (
+        f'{request.scheme}://{request.get_host()}{request.path}'
+        f'?{urlencode(params)}'
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _page_items(data):
+    return data['results'] if isinstance(data, dict) else data
+
+
+class ResponseCacheMixin:
+    """
+    Кэширует list и retrieve ViewSet.
+
+    Сохраняются данные ответа (до рендеринга) по ключу из
+    нормализованных параметров. Записи помечаются тегами
+    (get_list_cache_tags, get_item_cache_tags) и очищаются сигналами
+    api.signals при изменении этих объектов. Устаревшую запись
+    пересчитывает один запрос, взявший блокировку, остальные получают
+    устаревшие данные; при ошибке БД тоже отдаются устаревшие данные.
+    """
+
+    # Кэшировать ли ответы авторизованным пользователям
+    # (если ответ от пользователя не зависит)
+    cache_authenticated_responses = False
+
+    def get_list_cache_tags(self, request, items):
+        return set().union(*map(self.get_item_cache_tags, items))
+
+    def get_item_cache_tags(self, item):
+        return set()
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(
+            request,
+            lambda data: self.get_list_cache_tags(
+                request, _page_items(data)
+            ),
+            super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            request, self.get_item_cache_tags,
+            super().retrieve, *args, **kwargs
+        )
+
+    def _cached_response(self, request, get_tags, handler, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED or (
+            not self.cache_authenticated_responses
+            and request.user.is_authenticated
+        ):
+            return handler(request, *args, **kwargs)
+
+        response_cache = get_response_cache()
+        key = request_cache_key(request)
+        entry, fresh = response_cache.get(key)
+
+        if fresh and not response_cache.should_refresh_early(entry):
+            record_cache(CACHE_NAME, CACHE_HIT)
+            return Response(entry['data'])
+
+        locked = response_cache.lock(key)
+        if not locked:
+            # Ответ уже пересчитывает другой запрос
+            if entry is not None:
+                return self._stale_response(entry, fresh)
+            entry = response_cache.wait(
+                key, settings.RESPONSE_CACHE_LOCK_WAIT
+            )
+            if entry is not None:
+                record_cache(CACHE_NAME, CACHE_HIT)
+                return Response(entry['data'])
+
+        record_cache(CACHE_NAME, CACHE_MISS)
+        started = time.time()
+        # Блокировка снимается только после записи в кэш: иначе
+        # в промежутке ответ начал бы пересчитывать другой запрос
+        try:
+            try:
+                response = handler(request, *args, **kwargs)
+            except DatabaseError:
+                if entry is None:
+                    raise
+                return self._stale_response(entry, fresh)
+
+            if response.status_code == status.HTTP_200_OK:
+                response_cache.set(
+                    key, response.data, get_tags(response.data), started
+                )
+            else:
+                response_cache.delete(key)
+            return response
+        finally:
+            if locked:
+                response_cache.unlock(key)
+
+    def _stale_response(self, entry, fresh):
+        if fresh:
+            record_cache(CACHE_NAME, CACHE_HIT)
+            return Response(entry['data'])
+        record_cache(CACHE_NAME, CACHE_STALE)
+        return Response(entry['data'], headers={STALE_HEADER: '1'})
+
+
+class RecipeResponseCacheMixin(ResponseCacheMixin):
+    """Кэш ответов рецептов для анонимных пользователей."""
+
+    def get_list_cache_tags(self, request, items):
+        author = request.query_params.get('author')
+        return {
+            author_list_tag(author) if author else RECIPE_LIST_TAG,
+            *super().get_list_cache_tags(request, items),
+        }
+
+    def get_item_cache_tags(self, item):
+        tags = {recipe_tag(item['id'])}
+        # Автора может не быть в ответе или он свёрнут до id (?fields=,
+        # ?expand=): тогда его изменения ответ не затрагивают
+        if isinstance(item.get('author'), dict):
+            tags.add(author_tag(item['author']['id']))
+        return tags
+
+
+class IngredientResponseCacheMixin(ResponseCacheMixin):
+    """
+    Кэш ответов справочника ингредиентов. Справочник одинаков для всех
+    пользователей, поэтому кэшируются и ответы авторизованным.
+    """
+
+    cache_authenticated_responses = True
+
+    def get_list_cache_tags(self, request, items):
+        # Любое изменение ингредиента очищает этот тег, поэтому теги
+        # отдельных ингредиентов списку не нужны
+        return {INGREDIENT_LIST_TAG}
+
+    def get_item_cache_tags(self, item):
+        return {ingredient_tag(item['id'])}
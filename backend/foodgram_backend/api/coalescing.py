@@ -0,0 +1,130 @@
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from monitoring import metrics
+
+
+COALESCE_LEADER = 'leader'
+COALESCE_FOLLOWER = 'follower'
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class _Call:
+    """Выполняющееся вычисление ответа и ждущие его запросы."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class Coalescer:
+    """
+    Объединяет одинаковые одновременные вычисления в процессе:
+    первый запрос с ключом выполняет функцию, остальные ждут
+    и получают его результат.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, func):
+        """Возвращает пару (результат, выполнил ли функцию этот вызов)."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(self.timeout) and call.result is not None:
+                return call.result, False
+            # Ведущий запрос не уложился в таймаут или упал
+            return func(), True
+
+        try:
+            call.result = func()
+            return call.result, True
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer():
+    global _coalescer
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                _coalescer = Coalescer(settings.REQUEST_COALESCING_TIMEOUT)
+    return _coalescer
+
+
+def _has_credentials(request):
+    return (
+        'HTTP_AUTHORIZATION' in request.META
+        or settings.SESSION_COOKIE_NAME in request.COOKIES
+    )
+
+
+class CoalescingMixin:
+    """
+    Объединяет одновременные одинаковые безопасные запросы к действиям
+    из coalesce_actions: ответ вычисляется и рендерится один раз,
+    остальные запросы получают копию его байтов. Запросы с учётными
+    данными не объединяются, если ответ зависит от пользователя
+    (coalesce_authenticated_requests = False).
+    """
+
+    coalesce_actions = ()
+    coalesce_authenticated_requests = False
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        if (
+            not settings.REQUEST_COALESCING_ENABLED
+            or request.method not in SAFE_METHODS
+            or action not in self.coalesce_actions
+            or (
+                not self.coalesce_authenticated_requests
+                and _has_credentials(request)
+            )
+        ):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = (
+            request.method,
+            request.get_host(),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+        )
+        response, leader = get_coalescer().run(
+            key, lambda: self._rendered_dispatch(request, *args, **kwargs)
+        )
+        view_name = f'{type(self).__name__}.{action}'
+        metrics.COALESCED_REQUESTS.labels(
+            view_name, COALESCE_LEADER if leader else COALESCE_FOLLOWER
+        ).inc()
+        if leader:
+            return response
+        return self._copy_response(response)
+
+    def _rendered_dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def _copy_response(self, response):
+        copy = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            copy[header] = value
+        return copy
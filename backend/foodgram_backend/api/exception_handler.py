@@ -4,17 +4,37 @@ from rest_framework.views import (
 from rest_framework import status
 from django.http import Http404
 from rest_framework.exceptions import (
+    APIException,
     NotAuthenticated,
     PermissionDenied,
     NotFound
 )
 
+from api.uploads import UploadTooLarge
+from users.hashers import PasswordHashingBusy
+
+
+class ServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервис временно недоступен.'
+    default_code = 'service_unavailable'
+
+
+class RequestEntityTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'request_entity_too_large'
+
 
 def custom_exception_handler(exc, context):
     """
     Кастомный обработчик исключений для API.
     Русифицирует стандартные сообщения об ошибках DRF.
     """
+    if isinstance(exc, PasswordHashingBusy):
+        exc = ServiceUnavailable(str(exc), 'password_hashing_busy')
+    elif isinstance(exc, UploadTooLarge):
+        exc = RequestEntityTooLarge(str(exc), 'upload_too_large')
     response = drf_exception_handler(exc, context)
 
     if response is not None:
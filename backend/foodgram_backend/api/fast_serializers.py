@@ -0,0 +1,309 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.response import Response
+
+from constants import RECIPES_LIMIT_IN_SUBSCRIPTION_DEFAULT
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from subscriptions.models import Subscription
+
+from .fieldsets import Fieldset
+
+
+User = get_user_model()
+
+
+def image_url_builder(model, field_name, request):
+    """
+    Функция «имя файла → URL», совпадающая с ImageField
+    (и Base64ImageField) DRF: None для пустого поля, иначе абсолютный
+    URL из хранилища поля.
+    """
+
+    storage = model._meta.get_field(field_name).storage
+
+    def build(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+    return build
+
+
+def _viewer(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+USER_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'avatar',
+    'is_subscribed',
+)
+RECIPE_FIELDS = (
+    'id', 'author', 'ingredients', 'name', 'image', 'text',
+    'cooking_time', 'is_favorited', 'is_in_shopping_cart',
+)
+RECIPE_INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+RECIPE_SHORT_FIELDS = ('id', 'name', 'image', 'cooking_time')
+SUBSCRIPTION_FIELDS = USER_FIELDS + ('recipes_count', 'recipes')
+# Поля моделей, которые не выводятся как есть
+USER_COMPUTED_FIELDS = ('is_subscribed',)
+RECIPE_COMPUTED_FIELDS = (
+    'author', 'ingredients', 'is_favorited', 'is_in_shopping_cart',
+)
+ALL_FIELDS = Fieldset()
+
+
+def _columns(names, computed):
+    return [name for name in names if name not in computed]
+
+
+def users_data(user_ids, request, subscribed=None, fieldset=ALL_FIELDS):
+    """
+    Данные пользователей как у UserSerializer: {id: dict}.
+    subscribed=True подставляет is_subscribed без запроса
+    (для списка подписок).
+    """
+
+    names = fieldset.select(USER_FIELDS)
+    viewer = _viewer(request)
+    values = {}
+    if 'is_subscribed' in names:
+        if subscribed is not None:
+            values['is_subscribed'] = lambda row: subscribed
+        else:
+            following = set()
+            if viewer is not None:
+                following = set(Subscription.objects.filter(
+                    user_id=viewer, author_id__in=user_ids
+                ).values_list('author_id', flat=True))
+            values['is_subscribed'] = lambda row: (
+                row['id'] in following and row['id'] != viewer
+            )
+    if 'avatar' in names:
+        avatar = image_url_builder(User, 'avatar', request)
+        values['avatar'] = lambda row: avatar(row['avatar'])
+
+    return {
+        row['id']: {
+            name: values[name](row) if name in values else row[name]
+            for name in names
+        }
+        for row in User.objects.filter(pk__in=user_ids).values(
+            *_columns(names, USER_COMPUTED_FIELDS)
+        )
+    }
+
+
+def _user_recipes(model, viewer, recipe_ids):
+    if viewer is None:
+        return set()
+    return set(model.objects.filter(
+        user_id=viewer, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+
+
+def _recipe_ingredients(recipe_ids, fieldset):
+    """
+    Ингредиенты рецептов: {id рецепта: [...]}, свёрнутые — списки id.
+    """
+
+    ingredients = {}
+    if not fieldset.expands('ingredients'):
+        for recipe_id, pk in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            ingredients.setdefault(recipe_id, []).append(pk)
+        return ingredients
+
+    names = fieldset.nested('ingredients').select(RECIPE_INGREDIENT_FIELDS)
+    columns = {
+        'id': 'ingredient_id',
+        'name': 'ingredient__name',
+        'measurement_unit': 'ingredient__measurement_unit',
+        'amount': 'amount',
+    }
+    for recipe_id, *values in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', *(columns[name] for name in names)):
+        ingredients.setdefault(recipe_id, []).append(
+            dict(zip(names, values))
+        )
+    return ingredients
+
+
+def recipes_data(recipe_ids, request, fieldset=ALL_FIELDS):
+    """
+    Список рецептов в порядке recipe_ids в том же виде, что
+    RecipeReadSerializer(many=True).data. Число запросов
+    не зависит от размера страницы; данные, которых нет
+    в запрошенной форме (fieldset), не запрашиваются.
+    """
+
+    recipe_ids = list(recipe_ids)
+    names = fieldset.select(RECIPE_FIELDS)
+    columns = _columns(names, RECIPE_COMPUTED_FIELDS)
+    if 'author' in names:
+        columns.append('author_id')
+    rows = {
+        row['id']: row
+        for row in Recipe.objects.filter(pk__in=recipe_ids).values(*columns)
+    }
+
+    viewer = _viewer(request)
+    values = {}
+    if 'author' in names:
+        if fieldset.expands('author'):
+            authors = users_data(
+                {row['author_id'] for row in rows.values()}, request,
+                fieldset=fieldset.nested('author')
+            )
+            values['author'] = lambda row: authors[row['author_id']]
+        else:
+            values['author'] = lambda row: row['author_id']
+    if 'ingredients' in names:
+        ingredients = _recipe_ingredients(recipe_ids, fieldset)
+        values['ingredients'] = lambda row: ingredients.get(row['id'], [])
+    if 'image' in names:
+        image = image_url_builder(Recipe, 'image', request)
+        values['image'] = lambda row: image(row['image'])
+    if 'is_favorited' in names:
+        favorited = _user_recipes(Favorite, viewer, recipe_ids)
+        values['is_favorited'] = lambda row: row['id'] in favorited
+    if 'is_in_shopping_cart' in names:
+        in_cart = _user_recipes(ShoppingCart, viewer, recipe_ids)
+        values['is_in_shopping_cart'] = lambda row: row['id'] in in_cart
+
+    return [
+        {
+            name: values[name](row) if name in values else row[name]
+            for name in names
+        }
+        for row in map(rows.get, recipe_ids)
+        if row is not None
+    ]
+
+
+def recipes_limit(request):
+    """Параметр recipes_limit с теми же правилами, что у подписок."""
+
+    default_limit = RECIPES_LIMIT_IN_SUBSCRIPTION_DEFAULT
+    try:
+        return max(int(request.query_params.get(
+            'recipes_limit', default_limit
+        )), 0)
+    except (ValueError, TypeError):
+        return default_limit
+
+
+def _latest_recipes(author_ids, request, fieldset):
+    """
+    Последние рецепты авторов {id автора: [...]} одним запросом
+    с оконной функцией, свёрнутые — списки id.
+    """
+
+    recipes = {}
+    limit = recipes_limit(request)
+    if not limit:
+        return recipes
+
+    expanded = fieldset.expands('recipes')
+    names = (
+        fieldset.nested('recipes').select(RECIPE_SHORT_FIELDS)
+        if expanded else ['id']
+    )
+    image = image_url_builder(Recipe, 'image', request)
+    for author_id, *values in (
+        Recipe.objects.filter(author_id__in=author_ids).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('pub_date').desc(),
+            )
+        ).filter(position__lte=limit).order_by(
+            'author_id', 'position'
+        ).values_list('author_id', *names)
+    ):
+        recipe = dict(zip(names, values))
+        if 'image' in recipe:
+            recipe['image'] = image(recipe['image'])
+        recipes.setdefault(author_id, []).append(
+            recipe if expanded else recipe['id']
+        )
+    return recipes
+
+
+def subscriptions_data(author_ids, request, fieldset=ALL_FIELDS):
+    """
+    Список авторов в порядке author_ids в том же виде, что
+    SubscriptionSerializer(many=True).data. Последние рецепты всех
+    авторов выбираются одним запросом с оконной функцией.
+    """
+
+    author_ids = list(author_ids)
+    names = fieldset.select(SUBSCRIPTION_FIELDS)
+    authors = users_data(author_ids, request, subscribed=True,
+                         fieldset=fieldset)
+    counts = {}
+    if 'recipes_count' in names:
+        counts = dict(
+            Recipe.objects.filter(author_id__in=author_ids).order_by(
+            ).values('author_id').annotate(
+                count=Count('id')
+            ).values_list('author_id', 'count')
+        )
+    recipes = {}
+    if 'recipes' in names:
+        recipes = _latest_recipes(author_ids, request, fieldset)
+
+    data = []
+    for pk in author_ids:
+        if pk not in authors:
+            continue
+        author = authors[pk]
+        if 'recipes_count' in names:
+            author['recipes_count'] = counts.get(pk, 0)
+        if 'recipes' in names:
+            author['recipes'] = recipes.get(pk, [])
+        data.append(author)
+    return data
+
+
+def paginated_data(view, queryset, build):
+    """
+    Пагинирует только id объектов queryset и строит данные страницы
+    функцией build(ids, request, fieldset) в форме из view.get_fieldset.
+    """
+
+    queryset = queryset.values_list('pk', flat=True)
+    page = view.paginate_queryset(queryset)
+    data = build(
+        queryset if page is None else page,
+        view.request,
+        view.get_fieldset() or ALL_FIELDS,
+    )
+    if page is None:
+        return Response(data)
+    return view.get_paginated_response(data)
+
+
+class FastRecipeListMixin:
+    """
+    Список рецептов без RecipeReadSerializer: данные собираются
+    из values_list функцией recipes_data. Ответ байт в байт совпадает
+    с ответом сериализатора (проверка — check_serializer_parity).
+    Отключается настройкой FAST_SERIALIZATION_ENABLED.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.FAST_SERIALIZATION_ENABLED:
+            return super().list(request, *args, **kwargs)
+        return paginated_data(
+            self, self.filter_queryset(self.get_queryset()), recipes_data
+        )
@@ -0,0 +1,153 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+EXPAND_PARAM = 'expand'
+# Поле, которое выводится всегда: по нему строятся теги кэша ответов
+ALWAYS_INCLUDED = 'id'
+
+
+def _split(value):
+    return [
+        path.strip() for path in value.split(',') if path.strip()
+    ]
+
+
+class Fieldset:
+    """
+    Запрошенная форма объекта: какие поля выводить (fields, omit)
+    и какие вложенные объекты разворачивать (expand). Вложенные поля
+    задаются через точку: fields=name,author.username. Свёрнутый
+    вложенный объект выводится своими id. Если expand не передан,
+    развёрнуты все вложенные объекты, как без параметров. Неизвестные
+    поля игнорируются, id выводится всегда.
+    """
+
+    def __init__(self, fields=None, omit=(), expand=None):
+        self._fields = None if fields is None else list(fields)
+        self._omit = list(omit)
+        self._expand = None if expand is None else list(expand)
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Форма из параметров GET-запроса или None, если параметров нет
+        (или запрос изменяет данные).
+        """
+
+        params = request.query_params
+        if request.method not in SAFE_METHODS or not any(
+            name in params for name in (FIELDS_PARAM, OMIT_PARAM, EXPAND_PARAM)
+        ):
+            return None
+        return cls(
+            fields=(
+                _split(params[FIELDS_PARAM])
+                if FIELDS_PARAM in params else None
+            ),
+            omit=_split(params.get(OMIT_PARAM, '')),
+            expand=(
+                _split(params[EXPAND_PARAM])
+                if EXPAND_PARAM in params else None
+            ),
+        )
+
+    def includes(self, name):
+        """Выводить ли поле name."""
+
+        if name == ALWAYS_INCLUDED:
+            return True
+        if name in self._omit:
+            return False
+        return self._fields is None or any(
+            path == name or path.startswith(f'{name}.')
+            for path in self._fields
+        )
+
+    def expands(self, name):
+        """Разворачивать ли вложенный объект name."""
+
+        return self._expand is None or any(
+            path == name or path.startswith(f'{name}.')
+            for path in self._expand
+        )
+
+    def select(self, names):
+        """Поля из names, которые нужно вывести, в том же порядке."""
+
+        return [name for name in names if self.includes(name)]
+
+    def nested(self, name):
+        """Форма вложенного объекта name."""
+
+        def below(paths):
+            return [
+                path[len(name) + 1:] for path in paths
+                if path.startswith(f'{name}.')
+            ]
+
+        fields = None
+        if self._fields is not None and name not in self._fields:
+            fields = below(self._fields)
+        return Fieldset(
+            fields=fields,
+            omit=below(self._omit),
+            expand=None if self._expand is None else below(self._expand),
+        )
+
+
+class FieldsetSerializerMixin:
+    """
+    Выводит только поля из Fieldset: корневой сериализатор берёт его
+    из context['fieldset'], вложенным его передаёт родитель.
+    collapsed_fields задаёт для вложенных объектов поле, которым
+    они выводятся, если их не разворачивают.
+    """
+
+    collapsed_fields = {}
+
+    def __init__(self, *args, fieldset=None, **kwargs):
+        self.fieldset = fieldset
+        super().__init__(*args, **kwargs)
+
+    def _get_fieldset(self):
+        if self.fieldset is not None:
+            return self.fieldset
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is None:
+            return self.context.get('fieldset')
+        return None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self._get_fieldset()
+        if fieldset is None:
+            return fields
+
+        for name in list(fields):
+            if not fieldset.includes(name):
+                del fields[name]
+            elif name in self.collapsed_fields and not fieldset.expands(name):
+                fields[name] = self.collapsed_fields[name]()
+            else:
+                nested = fields[name]
+                if isinstance(nested, serializers.ListSerializer):
+                    nested = nested.child
+                if isinstance(nested, FieldsetSerializerMixin):
+                    nested.fieldset = fieldset.nested(name)
+        return fields
+
+
+class FieldsetViewMixin:
+    """Передаёт сериализаторам форму ответа из параметров запроса."""
+
+    def get_fieldset(self):
+        return Fieldset.from_request(self.request)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fieldset'] = self.get_fieldset()
+        return context
@@ -1,14 +1,66 @@
+import json
+
 import django_filters
+from django import forms
+from django.db.models.lookups import In
 from recipes.models import Recipe
 from rest_framework import filters as rest_filters
 
 from users.models import User
 
+from .ingredient_index import MATCH_ALL, MATCH_CHOICES, get_ingredient_index
+
+
+# Порядок выдачи рецептов для параметра ordering; каждому
+# соответствует индекс в Recipe.Meta.indexes
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
+class IntegerInFilter(
+    django_filters.rest_framework.BaseInFilter,
+    django_filters.rest_framework.Filter
+):
+    """
+    Список целых чисел через запятую: ?ingredients=1,5,9. Нецелые
+    значения — ошибка 400, а не округление.
+    """
+
+    field_class = forms.IntegerField
+
+
+class ArrayIn(In):
+    """
+    field IN (...) с одним параметром-массивом вместо параметра на
+    каждое значение: в PostgreSQL — field = ANY(%s), в SQLite —
+    выборка из JSON-массива. Для тысяч id из индекса ингредиентов
+    не строится огромный список плейсхолдеров, а план запроса
+    не зависит от их количества. Регистрируется в ApiConfig.ready().
+    """
+
+    lookup_name = 'in_array'
+
+    def as_postgresql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        return f'{lhs} = ANY(%s)', (*params, list(self.rhs))
+
+    def as_sqlite(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        return (
+            f'{lhs} IN (SELECT value FROM json_each(%s))',
+            (*params, json.dumps(list(self.rhs))),
+        )
+
 
 class RecipeFilter(django_filters.rest_framework.FilterSet):
     """
     Фильтры для модели Recipe.
     Позволяет фильтровать по автору, статусу в избранном и списке покупок
+    и упорядочивать по популярности (ordering=popular|trending).
+    Поиск по ингредиентам (ingredients=1,5,9&match=all|any|coverage)
+    выполняется по инвертированному индексу api.ingredient_index.
     """
 
     author = django_filters.rest_framework.ModelChoiceFilter(
@@ -21,6 +73,23 @@ class RecipeFilter(django_filters.rest_framework.FilterSet):
     is_in_shopping_cart = django_filters.rest_framework.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = django_filters.rest_framework.ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'В трендах'),
+        ),
+        method='filter_ordering'
+    )
+    ingredients = IntegerInFilter(method='filter_ingredients')
+    match = django_filters.rest_framework.ChoiceFilter(
+        choices=MATCH_CHOICES,
+        method='filter_ingredient_options'
+    )
+    min_coverage = django_filters.rest_framework.NumberFilter(
+        min_value=0,
+        max_value=1,
+        method='filter_ingredient_options'
+    )
 
     class Meta:
         model = Recipe
@@ -38,6 +107,25 @@ class RecipeFilter(django_filters.rest_framework.FilterSet):
             return queryset.filter(in_shopping_cart__user=user)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
+    def filter_ingredients(self, queryset, name, value):
+        options = self.form.cleaned_data
+        min_coverage = options.get('min_coverage')
+        recipe_ids = get_ingredient_index().match(
+            value,
+            options.get('match') or MATCH_ALL,
+            None if min_coverage is None else float(min_coverage),
+        )
+        if not len(recipe_ids):
+            return queryset.none()
+        return queryset.filter(pk__in_array=recipe_ids.tolist())
+
+    def filter_ingredient_options(self, queryset, name, value):
+        # match и min_coverage учитываются в filter_ingredients
+        return queryset
+
 
 class IngredientNameSearchFilter(rest_filters.SearchFilter):
     """
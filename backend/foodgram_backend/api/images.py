@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+# Расширение файла для формата Pillow
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+# Форматы без прозрачности
+OPAQUE_FORMATS = ('JPEG',)
+
+
+def reencode(source, work_dir, image_format, max_size, quality):
+    """
+    Перекодирует изображение source в image_format, уменьшая его так,
+    чтобы большая сторона была не больше max_size (0 — без уменьшения).
+    Результат пишется во временный файл в work_dir. Возвращает
+    (путь к нему, прочитано байт, записано байт) или None, если
+    изображение уже в нужном виде.
+
+    Выполняется в процессах пула команды reencode_media, поэтому
+    не обращается к Django.
+    """
+
+    read = os.path.getsize(source)
+    with Image.open(source) as image:
+        if image.format == image_format and (
+            not max_size or max(image.size) <= max_size
+        ):
+            return None
+        image = ImageOps.exif_transpose(image)
+        if max_size:
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        if image_format in OPAQUE_FORMATS and image.mode != 'RGB':
+            image = image.convert('RGB')
+        handle, path = tempfile.mkstemp(
+            suffix=FORMAT_EXTENSIONS[image_format], dir=work_dir
+        )
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                image.save(
+                    file, image_format, quality=quality, optimize=True
+                )
+        except BaseException:
+            os.remove(path)
+            raise
+    return path, read, os.path.getsize(path)
+
+
+def resize(source, target, width, height, quality):
+    """
+    Записывает в target изображение source размером width x height
+    (лишнее обрезается по центру) или, если height равна 0, шириной
+    width с сохранением пропорций. Формат остаётся прежним.
+    """
+
+    with Image.open(source) as image:
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        if height:
+            image = ImageOps.fit(
+                image, (width, height), Image.Resampling.LANCZOS
+            )
+        elif image.width > width:
+            image = image.resize(
+                (width, round(image.height * width / image.width)),
+                Image.Resampling.LANCZOS,
+            )
+        if image_format in OPAQUE_FORMATS and image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(target, image_format, quality=quality, optimize=True)
@@ -0,0 +1,171 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from recipes.models import RecipeIngredient
+
+from .cache import recipe_tag
+from .invalidation import RECIPES_SCOPE, register_handler
+
+
+MATCH_ALL = 'all'
+MATCH_ANY = 'any'
+MATCH_COVERAGE = 'coverage'
+MATCH_CHOICES = (
+    (MATCH_ALL, 'Все ингредиенты'),
+    (MATCH_ANY, 'Любой из ингредиентов'),
+    (MATCH_COVERAGE, 'Готовится в основном из этих ингредиентов'),
+)
+RECIPE_ID_DTYPE = np.int64
+RECIPE_TAG_PREFIX = recipe_tag('')
+_EMPTY = np.empty(0, dtype=RECIPE_ID_DTYPE)
+
+
+class IngredientIndex:
+    """
+    Инвертированный индекс «ингредиент → отсортированный массив id
+    рецептов» в памяти воркера.
+
+    Индекс строится при первом запросе одним запросом к
+    RecipeIngredient. Изменённые рецепты приходят из шины инвалидации
+    и пересчитываются перед следующим поиском; событие без тегов
+    (возможно, пропущенные изменения) помечает индекс для перестройки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        # Ингредиенты каждого рецепта, чтобы убрать его из старых списков
+        self._recipe_ingredients = {}
+        # Число ингредиентов рецепта по его id (для покрытия)
+        self._sizes = np.zeros(0, dtype=np.int32)
+        self._dirty = set()
+        self._stale = True
+
+    def mark_dirty(self, recipe_ids):
+        with self._lock:
+            self._dirty.update(recipe_ids)
+
+    def mark_stale(self):
+        with self._lock:
+            self._stale = True
+
+    def _build(self):
+        pairs = np.fromiter(
+            RecipeIngredient.objects.order_by(
+                'ingredient_id', 'recipe_id'
+            ).values_list('ingredient_id', 'recipe_id').iterator(),
+            dtype=np.dtype((RECIPE_ID_DTYPE, 2)),
+        )
+        ingredient_ids, recipe_ids = pairs[:, 0], pairs[:, 1]
+        bounds = np.flatnonzero(np.diff(ingredient_ids)) + 1
+        starts = np.concatenate(([0], bounds)) if len(pairs) else bounds
+        self._postings = dict(zip(
+            ingredient_ids[starts].tolist(), np.split(recipe_ids, bounds)
+        ))
+
+        order = np.argsort(recipe_ids, kind='stable')
+        by_recipe = recipe_ids[order]
+        bounds = np.flatnonzero(np.diff(by_recipe)) + 1
+        starts = np.concatenate(([0], bounds)) if len(pairs) else bounds
+        self._recipe_ingredients = dict(zip(
+            by_recipe[starts].tolist(),
+            map(tuple, np.split(ingredient_ids[order], bounds)),
+        ))
+        self._sizes = np.bincount(by_recipe).astype(np.int32)
+        self._dirty.clear()
+        self._stale = False
+
+    def _refresh(self, recipe_ids):
+        current = {}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'):
+            current.setdefault(recipe_id, []).append(ingredient_id)
+
+        # Массивы не меняются на месте: поиск в другом потоке может
+        # работать со снимком, полученным до обновления
+        sizes = np.zeros(
+            max(len(self._sizes), max(recipe_ids) + 1), dtype=np.int32
+        )
+        sizes[:len(self._sizes)] = self._sizes
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipe_ingredients.pop(recipe_id, ()):
+                posting = self._postings[ingredient_id]
+                self._postings[ingredient_id] = posting[posting != recipe_id]
+            ingredients = tuple(current.get(recipe_id, ()))
+            for ingredient_id in ingredients:
+                posting = self._postings.get(ingredient_id, _EMPTY)
+                self._postings[ingredient_id] = np.insert(
+                    posting, np.searchsorted(posting, recipe_id), recipe_id
+                )
+            if ingredients:
+                self._recipe_ingredients[recipe_id] = ingredients
+            sizes[recipe_id] = len(ingredients)
+        self._sizes = sizes
+
+    def _postings_for(self, ingredient_ids):
+        with self._lock:
+            if self._stale:
+                self._build()
+            elif self._dirty:
+                dirty, self._dirty = self._dirty, set()
+                self._refresh(dirty)
+            return (
+                [self._postings.get(pk, _EMPTY) for pk in ingredient_ids],
+                self._sizes,
+            )
+
+    def match(self, ingredient_ids, mode=MATCH_ALL, min_coverage=None):
+        """
+        Возвращает массив id рецептов:
+
+        all — рецепты, в которых есть все ингредиенты;
+        any — рецепты хотя бы с одним из ингредиентов;
+        coverage — рецепты, не меньше min_coverage ингредиентов
+        которых входят в ingredient_ids (например, что можно
+        приготовить из продуктов в наличии).
+        """
+
+        postings, sizes = self._postings_for(set(ingredient_ids))
+        if not postings:
+            return _EMPTY
+        if mode == MATCH_ALL:
+            # Пересечение от самых коротких списков быстрее сужается
+            result, *rest = sorted(postings, key=len)
+            for posting in rest:
+                result = np.intersect1d(result, posting, assume_unique=True)
+                if not len(result):
+                    break
+            return result
+        if mode == MATCH_ANY:
+            return np.unique(np.concatenate(postings))
+
+        if min_coverage is None:
+            min_coverage = settings.INGREDIENT_MATCH_MIN_COVERAGE
+        candidates, matched = np.unique(
+            np.concatenate(postings), return_counts=True
+        )
+        return candidates[matched >= min_coverage * sizes[candidates]]
+
+
+_index = IngredientIndex()
+
+
+def get_ingredient_index():
+    return _index
+
+
+@register_handler
+def update_ingredient_index(scope, tags, local):
+    if scope != RECIPES_SCOPE:
+        return
+    if tags is None:
+        _index.mark_stale()
+        return
+    _index.mark_dirty(
+        int(tag[len(RECIPE_TAG_PREFIX):])
+        for tag in tags
+        if tag.startswith(RECIPE_TAG_PREFIX)
+    )
@@ -0,0 +1,321 @@
+import atexit
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.db.models import F
+
+from foodgram_backend.db_router import PRIMARY_DB
+
+from .models import CacheVersion
+
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'foodgram_invalidation'
+# Ограничение PostgreSQL на размер payload у NOTIFY — 8000 байт
+MAX_PAYLOAD_BYTES = 7900
+# Сколько секунд ждать уведомлений до проверки соединения
+LISTEN_TIMEOUT = 5
+LISTEN_RECONNECT_DELAY = 1
+LISTEN_RECONNECT_MAX_DELAY = 30
+
+# Области данных, которые может затронуть событие
+RECIPES_SCOPE = 'recipes'
+INGREDIENTS_SCOPE = 'ingredients'
+USERS_SCOPE = 'users'
+# Отозванные JWT (api.revocation)
+TOKENS_SCOPE = 'tokens'
+SCOPES = (RECIPES_SCOPE, INGREDIENTS_SCOPE, USERS_SCOPE, TOKENS_SCOPE)
+
+_handlers = []
+
+
+def register_handler(handler):
+    """
+    Подписывает локальный кэш на события инвалидации.
+
+    handler(scope, tags, local) вызывается для событий этого процесса
+    (local=True) и других воркеров (local=False). tags=None означает,
+    что события могли быть пропущены и нужно сбросить всё в scope.
+    """
+
+    _handlers.append(handler)
+    return handler
+
+
+def _dispatch(scope, tags, local):
+    for handler in _handlers:
+        try:
+            handler(scope, tags, local)
+        except Exception:
+            logger.exception('Ошибка обработчика инвалидации %r', handler)
+
+
+class _Batch:
+    """События одной транзакции, отправляемые одним пакетом."""
+
+    def __init__(self):
+        self.tags = {}
+
+    def add(self, scope, tags):
+        self.tags.setdefault(scope, {}).update(dict.fromkeys(tags))
+
+    def send(self):
+        bus = get_bus()
+        for scope, tags in self.tags.items():
+            tags = list(tags)
+            _dispatch(scope, tags, local=True)
+            bus.publish(scope, tags)
+
+
+def publish(scope, *tags):
+    """
+    Публикует событие после фиксации текущей транзакции: сначала
+    обрабатывает его в своём процессе, затем рассылает остальным
+    воркерам через шину. События одной транзакции (например,
+    удаление всех ингредиентов рецепта) объединяются.
+    """
+
+    connection = connections[PRIMARY_DB]
+    if not connection.in_atomic_block:
+        batch = _Batch()
+        batch.add(scope, tags)
+        batch.send()
+        return
+
+    batch = getattr(connection, '_invalidation_batch', None)
+    # Пакет, чей колбэк отброшен при откате, не переиспользуется
+    if batch is None or not any(
+        callback == batch.send
+        for _, callback, *_ in connection.run_on_commit
+    ):
+        batch = connection._invalidation_batch = _Batch()
+        transaction.on_commit(batch.send, using=PRIMARY_DB)
+    batch.add(scope, tags)
+
+
+class NotifyBus:
+    """
+    Шина на PostgreSQL LISTEN/NOTIFY. События рассылаются через
+    pg_notify, каждый воркер слушает канал в фоновом потоке
+    на отдельном соединении. После переподключения все области
+    сбрасываются, так как события за время разрыва потеряны.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._stopping = threading.Event()
+        # Запись в канал будит поток, ждущий уведомлений в select
+        self._wakeup = None
+
+    def publish(self, scope, tags):
+        with connections[PRIMARY_DB].cursor() as cursor:
+            for payload in self._payloads(scope, tags):
+                cursor.execute(
+                    'SELECT pg_notify(%s, %s)', [CHANNEL, payload]
+                )
+
+    def _payloads(self, scope, tags):
+        chunk = []
+        for tag in tags:
+            chunk.append(tag)
+            payload = self._encode(scope, chunk)
+            if len(payload.encode()) > MAX_PAYLOAD_BYTES and len(chunk) > 1:
+                chunk.pop()
+                yield self._encode(scope, chunk)
+                chunk = [tag]
+        yield self._encode(scope, chunk)
+
+    def _encode(self, scope, tags):
+        return json.dumps(
+            {'p': os.getpid(), 's': scope, 't': tags}, separators=(',', ':')
+        )
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._wakeup = os.pipe()
+            self._thread = threading.Thread(
+                target=self._listen, name='invalidation-listener',
+                daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Останавливает поток и закрывает его соединение."""
+
+        thread = self._thread
+        if thread is None:
+            return
+        self._stopping.set()
+        os.write(self._wakeup[1], b'\0')
+        thread.join(LISTEN_TIMEOUT)
+        if not thread.is_alive():
+            for fd in self._wakeup:
+                os.close(fd)
+        self._thread = self._wakeup = None
+
+    def poll(self):
+        pass
+
+    def _connect(self):
+        wrapper = connections[PRIMARY_DB]
+        connection = wrapper.Database.connect(
+            **wrapper.get_connection_params()
+        )
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return connection
+
+    def _listen(self):
+        delay = LISTEN_RECONNECT_DELAY
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = self._connect()
+                delay = LISTEN_RECONNECT_DELAY
+                for scope in SCOPES:
+                    _dispatch(scope, None, local=False)
+                self._receive(connection)
+            except Exception:
+                logger.warning(
+                    'Соединение шины инвалидации потеряно, повтор через %s с',
+                    delay, exc_info=True
+                )
+            finally:
+                if connection is not None:
+                    connection.close()
+            self._stopping.wait(delay)
+            delay = min(delay * 2, LISTEN_RECONNECT_MAX_DELAY)
+
+    def _receive(self, connection):
+        wakeup = self._wakeup[0]
+        while True:
+            readable, _, _ = select.select(
+                [connection, wakeup], [], [], LISTEN_TIMEOUT
+            )
+            if wakeup in readable:
+                return
+            if not readable:
+                # Проверка, что соединение живо
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                continue
+            connection.poll()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                event = json.loads(notify.payload)
+                if event['p'] != os.getpid():
+                    _dispatch(event['s'], event['t'], local=False)
+
+
+class VersionBus:
+    """
+    Запасная шина для БД без LISTEN: публикация увеличивает счётчик
+    версии области в таблице CacheVersion, а воркер не чаще раза
+    в CACHE_INVALIDATION_POLL_INTERVAL секунд сверяет счётчики
+    и сбрасывает области, версия которых изменилась.
+    """
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._versions = None
+        self._polled_at = 0
+        self._lock = threading.Lock()
+
+    def publish(self, scope, tags):
+        updated = CacheVersion.objects.filter(scope=scope).update(
+            version=F('version') + 1
+        )
+        if not updated:
+            CacheVersion.objects.get_or_create(
+                scope=scope, defaults={'version': 1}
+            )
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def poll(self):
+        now = time.monotonic()
+        if now - self._polled_at < self.poll_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._polled_at = now
+            versions = dict(
+                CacheVersion.objects.using(PRIMARY_DB).values_list(
+                    'scope', 'version'
+                )
+            )
+            if self._versions is not None:
+                for scope in SCOPES:
+                    if versions.get(scope) != self._versions.get(scope):
+                        _dispatch(scope, None, local=False)
+            self._versions = versions
+        finally:
+            self._lock.release()
+
+
+_bus = None
+
+
+def get_bus():
+    global _bus
+    if _bus is None:
+        backend = settings.CACHE_INVALIDATION_BACKEND
+        if backend == 'auto':
+            backend = (
+                'notify'
+                if connections[PRIMARY_DB].vendor == 'postgresql'
+                else 'versions'
+            )
+        if backend == 'notify':
+            _bus = NotifyBus()
+        else:
+            _bus = VersionBus(settings.CACHE_INVALIDATION_POLL_INTERVAL)
+    return _bus
+
+
+@atexit.register
+def stop_bus():
+    """
+    Останавливает шину процесса: поток LISTEN держит своё соединение
+    с БД, которое иначе закрылось бы только вместе с процессом.
+    """
+
+    global _bus
+    if _bus is not None:
+        _bus.stop()
+        _bus = None
+
+
+class InvalidationMiddleware:
+    """
+    Запускает шину инвалидации в воркере. Для LISTEN/NOTIFY это
+    фоновый поток, и middleware больше не нужна; для счётчиков
+    версий — проверка версий перед обработкой запроса.
+    """
+
+    def __init__(self, get_response):
+        bus = get_bus()
+        if isinstance(bus, NotifyBus):
+            bus.start()
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.bus = bus
+
+    def __call__(self, request):
+        self.bus.poll()
+        return self.get_response(request)
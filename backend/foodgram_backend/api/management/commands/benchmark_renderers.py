@@ -0,0 +1,90 @@
+import io
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import recipes_data
+from api.parsers import FastJSONParser, MessagePackParser
+from api.renderers import FastJSONRenderer, MessagePackRenderer
+from recipes.models import Recipe
+
+
+FORMATS = (
+    ('json', JSONRenderer(), JSONParser()),
+    ('orjson', FastJSONRenderer(), FastJSONParser()),
+    ('msgpack', MessagePackRenderer(), MessagePackParser()),
+)
+
+
+class Command(BaseCommand):
+    """
+    Management команда для сравнения форматов ответа: кодирует
+    и разбирает страницу списка рецептов стандартным JSONRenderer,
+    FastJSONRenderer и MessagePackRenderer и выводит медианное время
+    и размер ответа. Заодно проверяет, что FastJSONRenderer выдаёт
+    те же байты, что JSONRenderer.
+    """
+    help = 'Сравнивает скорость и размер ответов JSON и MessagePack'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            nargs='+',
+            default=[10, 100],
+            help='Размеры страниц списка рецептов.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Сколько раз кодировать и разбирать каждую страницу.',
+        )
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+
+        for page_size in options['page_size']:
+            data = recipes_data(
+                Recipe.objects.values_list('pk', flat=True)[:page_size],
+                request,
+            )
+            self.stdout.write(self.style.SQL_KEYWORD(
+                f'Страница из {len(data)} рецептов'
+            ))
+            reference = None
+            for name, renderer, parser in FORMATS:
+                content = renderer.render(data)
+                if name == 'json':
+                    reference = content
+                elif name == 'orjson' and content != reference:
+                    raise CommandError(
+                        'FastJSONRenderer не совпадает с JSONRenderer'
+                    )
+                encode = self._measure(
+                    lambda: renderer.render(data), options['repeat']
+                )
+                decode = self._measure(
+                    lambda: parser.parse(io.BytesIO(content)),
+                    options['repeat']
+                )
+                self.stdout.write(
+                    f'  {name:<8} {len(content):>8} байт, кодирование '
+                    f'{encode * 1000:8.3f} мс, разбор {decode * 1000:8.3f} мс'
+                )
+        self.stdout.write(self.style.SUCCESS('Готово.'))
+
+    def _measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
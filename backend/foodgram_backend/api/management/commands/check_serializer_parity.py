@@ -0,0 +1,178 @@
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import (
+    ALL_FIELDS, recipes_data, subscriptions_data
+)
+from api.fieldsets import Fieldset
+from api.serializers import RecipeReadSerializer, SubscriptionSerializer
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+# Значения recipes_limit, на которых сверяются подписки
+RECIPES_LIMITS = (None, '0', '1', '3', '-1', 'x')
+# Формы ответа (?fields=, ?omit=, ?expand=), на которых сверяются ответы
+RECIPE_FIELDSETS = (
+    '',
+    'fields=name,image,cooking_time',
+    'omit=text,ingredients,author.email',
+    'expand=',
+    'fields=author.username,ingredients.amount,is_favorited&expand=author',
+    'fields=author,ingredients&expand=ingredients',
+)
+SUBSCRIPTION_FIELDSETS = (
+    '',
+    'fields=username,recipes.name',
+    'omit=recipes_count,is_subscribed,avatar',
+    'expand=',
+    'fields=recipes_count',
+)
+
+
+class Command(BaseCommand):
+    """
+    Management команда для проверки быстрой сериализации: сверяет
+    ответы api.fast_serializers с ответами сериализаторов DRF
+    (RecipeReadSerializer, SubscriptionSerializer) для всех рецептов
+    и подписок в разных формах ответа: JSON должен совпадать байт
+    в байт. Выводит время обоих вариантов; сериализаторы получают
+    полный prefetch.
+    """
+    help = 'Проверяет, что быстрая сериализация совпадает с DRF'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=100,
+            help='Сколько объектов сериализовать за раз.',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=5,
+            help=(
+                'Для скольких пользователей сверять (кроме анонимного): '
+                'берутся пользователи с наибольшим числом подписок.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        self.renderer = JSONRenderer()
+        self.timings = {'drf': 0.0, 'fast': 0.0}
+        self.compared = 0
+        self.mismatches = 0
+
+        viewers = [AnonymousUser(), *User.objects.annotate(
+            subscriptions=Count('following')
+        ).order_by('-subscriptions', 'pk')[:options['users']]]
+        for viewer in viewers:
+            self._check_recipes(viewer, options['page_size'])
+            if viewer.is_authenticated:
+                self._check_subscriptions(viewer, options['page_size'])
+
+        self.stdout.write(
+            f"Сверено страниц: {self.compared}; DRF "
+            f"{self.timings['drf'] * 1000:.1f} мс, быстрый путь "
+            f"{self.timings['fast'] * 1000:.1f} мс"
+        )
+        if self.mismatches:
+            raise CommandError(f'Расхождений: {self.mismatches}')
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают.'))
+
+    def _request(self, viewer, path):
+        request = Request(APIRequestFactory().get(path))
+        request.user = viewer
+        return request, Fieldset.from_request(request)
+
+    def _pages(self, queryset, page_size):
+        ids = queryset.values_list('pk', flat=True).iterator()
+        while page := list(islice(ids, page_size)):
+            yield page
+
+    def _compare(self, label, drf, fast):
+        started = time.perf_counter()
+        expected = self.renderer.render(drf())
+        self.timings['drf'] += time.perf_counter() - started
+        started = time.perf_counter()
+        actual = self.renderer.render(fast())
+        self.timings['fast'] += time.perf_counter() - started
+
+        self.compared += 1
+        if expected != actual:
+            self.mismatches += 1
+            position = next(
+                (
+                    index for index, (left, right)
+                    in enumerate(zip(expected, actual)) if left != right
+                ),
+                min(len(expected), len(actual))
+            )
+            self.stdout.write(self.style.ERROR(
+                f'{label}: расхождение с байта {position}:\n'
+                f'  DRF:    {expected[position - 60:position + 60]!r}\n'
+                f'  быстро: {actual[position - 60:position + 60]!r}'
+            ))
+
+    def _check_recipes(self, viewer, page_size):
+        for query in RECIPE_FIELDSETS:
+            request, fieldset = self._request(
+                viewer, f'/api/recipes/?{query}'
+            )
+            for page in self._pages(Recipe.objects.all(), page_size):
+                self._compare(
+                    f'Рецепты для {viewer}, {query or "все поля"}',
+                    lambda: RecipeReadSerializer(
+                        Recipe.objects.filter(pk__in=page).select_related(
+                            'author'
+                        ).prefetch_related('recipe_ingredients__ingredient'),
+                        many=True,
+                        context={'request': request, 'fieldset': fieldset},
+                    ).data,
+                    lambda: recipes_data(
+                        Recipe.objects.filter(pk__in=page).values_list(
+                            'pk', flat=True
+                        ),
+                        request,
+                        fieldset or ALL_FIELDS,
+                    ),
+                )
+
+    def _check_subscriptions(self, viewer, page_size):
+        authors = User.objects.filter(follower__user=viewer)
+        queries = [
+            f'recipes_limit={limit}' if limit is not None else ''
+            for limit in RECIPES_LIMITS
+        ] + list(SUBSCRIPTION_FIELDSETS)
+        for query in queries:
+            request, fieldset = self._request(
+                viewer, f'/api/users/subscriptions/?{query}'
+            )
+            for page in self._pages(authors, page_size):
+                self._compare(
+                    f'Подписки {viewer}, {query or "все поля"}',
+                    lambda: SubscriptionSerializer(
+                        authors.filter(pk__in=page).prefetch_related(
+                            'recipes'
+                        ),
+                        many=True,
+                        context={'request': request, 'fieldset': fieldset},
+                    ).data,
+                    lambda: subscriptions_data(
+                        authors.filter(pk__in=page).values_list(
+                            'pk', flat=True
+                        ),
+                        request,
+                        fieldset or ALL_FIELDS,
+                    ),
+                )
@@ -0,0 +1,202 @@
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import StoredFile
+from api.resize import cache_root
+from api.storage import (
+    is_content_name,
+    is_referenced,
+    iter_referenced_names,
+)
+
+
+def walk_files(root, exclude=()):
+    """
+    Файлы под root: (относительный путь, os.DirEntry) по возрастанию
+    пути, как у str. В памяти держится только содержимое текущих
+    каталогов. Скрытые файлы и каталоги (карантин) и каталоги
+    верхнего уровня из exclude пропускаются.
+    """
+
+    def walk(directory, prefix):
+        with os.scandir(directory) as entries:
+            # Каталог сравнивается с "/" на конце: так порядок внутри
+            # каталога совпадает с порядком полных путей
+            entries = sorted(
+                (
+                    entry.name + '/' if entry.is_dir(follow_symlinks=False)
+                    else entry.name,
+                    entry,
+                )
+                for entry in entries
+                if not entry.name.startswith('.')
+                and (prefix or entry.name not in exclude)
+            )
+        for key, entry in entries:
+            if key.endswith('/'):
+                yield from walk(entry.path, prefix + key)
+            else:
+                yield prefix + key, entry
+
+    if os.path.isdir(root):
+        yield from walk(root, '')
+
+
+def orphan_files(root, stats):
+    """
+    Файлы под root, на которые не ссылается ни один объект. Пути
+    файлов и имена из БД идут по возрастанию и сравниваются слиянием;
+    имена без файлов считаются в stats['missing'].
+    """
+
+    names = iter_referenced_names()
+    name = next(names, None)
+    for path, entry in walk_files(root, (settings.IMAGE_RESIZE_DIR,)):
+        while name is not None and name < path:
+            stats['missing'] += 1
+            name = next(names, None)
+        if name == path:
+            name = next(names, None)
+            continue
+        yield path, entry
+    while name is not None:
+        stats['missing'] += 1
+        name = next(names, None)
+
+
+class Command(BaseCommand):
+    """
+    Management команда для удаления медиафайлов, на которые
+    не ссылаются рецепты и пользователи: остатки удалённых и заменённых
+    изображений, загруженных до хранилища по содержимому, и файлы,
+    которые не удалились из-за сбоя. Файлы моложе --grace-hours
+    не трогаются: их могли только что загрузить.
+    """
+    help = 'Удаляет или переносит в карантин медиафайлы без ссылок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=settings.MEDIA_GC_GRACE_HOURS,
+            help='Не трогать файлы, изменённые за это число часов.',
+        )
+        parser.add_argument(
+            '--quarantine',
+            action='store_true',
+            help=(
+                'Переносить файлы в MEDIA_GC_QUARANTINE_DIR '
+                'вместо удаления.'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы без ссылок.',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        cutoff = time.time() - options['grace_hours'] * 3600
+        stats = dict.fromkeys(
+            ('orphans', 'bytes', 'recent', 'counted', 'missing', 'variants'),
+            0,
+        )
+
+        for path, entry in orphan_files(settings.MEDIA_ROOT, stats):
+            info = entry.stat(follow_symlinks=False)
+            if info.st_mtime > cutoff:
+                stats['recent'] += 1
+                continue
+            if not dry_run and not self.release(path, entry, options):
+                stats['counted'] += 1
+                continue
+            stats['orphans'] += 1
+            stats['bytes'] += info.st_size
+            if options['verbosity'] >= 2:
+                self.stdout.write(path)
+
+        if not dry_run:
+            stats['variants'] = self.clean_variants()
+            self.expire_quarantine()
+
+        action = (
+            'Без ссылок' if dry_run
+            else 'В карантине' if options['quarantine']
+            else 'Удалено'
+        )
+        self.stdout.write(
+            f'Моложе {options["grace_hours"]:g} ч: {stats["recent"]}, '
+            f'пропущено из-за ссылок: {stats["counted"]}, '
+            f'ссылок на отсутствующие файлы: {stats["missing"]}, '
+            f'удалено копий изображений: {stats["variants"]}.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{action}: {stats["orphans"]} файлов, '
+            f'{stats["bytes"] / 2 ** 20:.1f} МБ.'
+        ))
+
+    def release(self, path, entry, options):
+        """
+        Удаляет или переносит в карантин файл без ссылок. Файл
+        хранилища по содержимому удаляется вместе со StoredFile,
+        только если в нём нет ссылок: иначе файл, возможно,
+        загружается прямо сейчас.
+
+        Если записи StoredFile нет, она создаётся на время удаления:
+        ContentAddressedStorage.save того же содержимого ждёт её
+        и не пропускает запись файла, найдя старый файл на диске.
+        """
+
+        with transaction.atomic():
+            stored = None
+            if is_content_name(path):
+                stored, _ = StoredFile.objects.select_for_update(
+                ).get_or_create(name=path)
+                if stored.references:
+                    return False
+            # Ссылку могли добавить после чтения имён из БД
+            if is_referenced(path):
+                # Запись, созданная для блокировки, не нужна
+                transaction.set_rollback(True)
+                return False
+            if stored is not None:
+                stored.delete()
+            if options['quarantine']:
+                target = os.path.join(settings.MEDIA_GC_QUARANTINE_DIR, path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(entry.path, target)
+                # Срок хранения в карантине отсчитывается от переноса
+                os.utime(target)
+            else:
+                os.remove(entry.path)
+        return True
+
+    def clean_variants(self):
+        """
+        Удаляет из кэша копий (api.resize) копии удалённых файлов
+        и размеров, которых больше нет в IMAGE_RESIZE_SIZES.
+        """
+
+        removed = 0
+        for path, entry in walk_files(cache_root()):
+            size, _, name = path.partition('/')
+            if size not in settings.IMAGE_RESIZE_SIZES or not os.path.isfile(
+                os.path.join(settings.MEDIA_ROOT, name)
+            ):
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+    def expire_quarantine(self):
+        """Удаляет файлы, пролежавшие в карантине дольше срока."""
+
+        cutoff = time.time() - settings.MEDIA_GC_QUARANTINE_DAYS * 86400
+        for _, entry in walk_files(settings.MEDIA_GC_QUARANTINE_DIR):
+            if entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                os.remove(entry.path)
@@ -0,0 +1,103 @@
+import os
+import shutil
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.storage import (
+    FILE_FIELDS,
+    ContentAddressedStorage,
+    content_name,
+    is_content_name,
+    recount,
+    referenced_names,
+)
+
+
+class Command(BaseCommand):
+    """
+    Management команда для перевода медиафайлов в хранилище
+    по содержимому (api.storage): файлы, на которые ссылаются рецепты
+    и пользователи, переименовываются по хешу содержимого, одинаковые
+    файлы сливаются в один, ссылки в БД и счётчики ссылок обновляются.
+    Старые файлы удаляются после фиксации транзакции.
+    """
+    help = 'Переносит медиафайлы в хранилище по содержимому без дубликатов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать дубликаты, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Не удалять старые файлы после переноса.',
+        )
+
+    def handle(self, *args, **options):
+        storage = storages['default']
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError(
+                'Хранилище по умолчанию — не ContentAddressedStorage.'
+            )
+
+        renames, sizes = {}, {}
+        for name in sorted(referenced_names()):
+            if is_content_name(name):
+                continue
+            if not storage.exists(name):
+                self.stdout.write(self.style.WARNING(f'Нет файла: {name}'))
+                continue
+            with storage.open(name) as file:
+                renames[name] = content_name(name, file)
+            sizes[name] = storage.size(name)
+
+        # Из каждой группы одинаковых файлов остаётся один, если его
+        # ещё нет в хранилище
+        sources = {}
+        for name, target in renames.items():
+            if not storage.exists(target):
+                sources.setdefault(target, name)
+        total = sum(sizes.values())
+        freed = total - sum(sizes[name] for name in sources.values())
+        self.stdout.write(
+            f'Файлов: {len(renames)}, '
+            f'уникальных: {len(set(renames.values()))}, '
+            f'освободится {freed / 2 ** 20:.1f} МБ '
+            f'из {total / 2 ** 20:.1f} МБ'
+        )
+        if options['dry_run'] or not renames:
+            return
+
+        for target, name in sources.items():
+            path = storage.path(target)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(storage.path(name), path)
+            except OSError:
+                shutil.copyfile(storage.path(name), path)
+
+        by_target = {}
+        for name, target in renames.items():
+            by_target.setdefault(target, []).append(name)
+        with transaction.atomic():
+            for model, fields in FILE_FIELDS.items():
+                for field in fields:
+                    for target, names in by_target.items():
+                        # update() не вызывает сигналы: счётчики ссылок
+                        # пересчитываются ниже целиком
+                        model.objects.filter(
+                            **{f'{field}__in': names}
+                        ).update(**{field: target})
+            recount(storage)
+            if not options['keep_originals']:
+                # Старые файлы удаляются после фиксации транзакции
+                for name in renames:
+                    storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {len(renames)}.'
+        ))
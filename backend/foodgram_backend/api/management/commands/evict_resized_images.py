@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.resize import evict
+
+
+class Command(BaseCommand):
+    """
+    Management команда для вытеснения копий изображений (api.resize):
+    когда кэш копий больше IMAGE_RESIZE_CACHE_MAX_SIZE байт, удаляет
+    копии, которые дольше всего не читали. Обходит весь кэш, поэтому
+    запускается по расписанию, а не в запросах.
+    """
+    help = 'Удаляет давно не читавшиеся копии изображений сверх предела'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-size',
+            type=int,
+            default=settings.IMAGE_RESIZE_CACHE_MAX_SIZE,
+            help='Предельный размер кэша копий в байтах.',
+        )
+
+    def handle(self, *args, **options):
+        removed = evict(options['max_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено копий изображений: {removed}.'
+        ))
@@ -0,0 +1,267 @@
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from api.cache import author_tag, recipe_tag
+from api.images import FORMAT_EXTENSIONS, reencode
+from api.invalidation import RECIPES_SCOPE, USERS_SCOPE, publish
+from api.models import StoredFile
+from api.storage import FILE_FIELDS, is_content_name
+from recipes.models import Recipe
+
+
+User = get_user_model()
+
+# Каталог временных файлов в MEDIA_ROOT (скрытый: его пропускает
+# clean_media)
+WORK_DIR = '.reencode'
+# Область и тег кэша ответов для объекта модели
+CACHE_TAGS = {
+    Recipe: (RECIPES_SCOPE, recipe_tag),
+    User: (USERS_SCOPE, author_tag),
+}
+
+
+class Command(BaseCommand):
+    """
+    Management команда для перекодирования изображений рецептов
+    и аватаров (новый формат или размер). Объекты перебираются
+    по возрастанию id пачками, изображения пачки перекодируются
+    в пуле процессов, ссылки в БД обновляются одним запросом на пачку.
+    После каждой пачки позиция сохраняется в MEDIA_REENCODE_CHECKPOINT,
+    и прерванная команда продолжает с неё. Скорость чтения и записи
+    файлов ограничивается --max-mb-per-second.
+    """
+    help = 'Перекодирует изображения рецептов и аватары'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=sorted(FORMAT_EXTENSIONS),
+            default=settings.MEDIA_REENCODE_FORMAT,
+            help='Формат изображений.',
+        )
+        parser.add_argument(
+            '--max-size',
+            type=int,
+            default=settings.MEDIA_REENCODE_MAX_SIZE,
+            help='Наибольшая сторона изображения в пикселях, 0 — любая.',
+        )
+        parser.add_argument(
+            '--quality',
+            type=int,
+            default=settings.MEDIA_REENCODE_QUALITY,
+            help='Качество сжатия (1-100).',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число процессов.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.MEDIA_REENCODE_BATCH_SIZE,
+            help='Объектов в пачке.',
+        )
+        parser.add_argument(
+            '--max-mb-per-second',
+            type=float,
+            default=settings.MEDIA_REENCODE_MAX_MB_PER_SECOND,
+            help='Ограничение чтения и записи файлов, 0 — без ограничения.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Начать сначала, не используя сохранённую позицию.',
+        )
+
+    def handle(self, *args, **options):
+        self.storage = storages['default']
+        self.options = options
+        params = {
+            'format': options['format'],
+            'max_size': options['max_size'],
+            'quality': options['quality'],
+        }
+        self.checkpoint = self.load_checkpoint(params, options['restart'])
+        self.stats = dict.fromkeys(
+            ('checked', 'reencoded', 'failed', 'read', 'written'), 0
+        )
+
+        # Временные файлы — на том же диске, что и хранилище. Остатки
+        # прерванного запуска удаляются
+        self.work_dir = os.path.join(settings.MEDIA_ROOT, WORK_DIR)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        os.makedirs(self.work_dir)
+        try:
+            # spawn: процессы пула не наследуют соединения с БД
+            # и потоки шины инвалидации
+            with ProcessPoolExecutor(
+                options['workers'],
+                mp_context=multiprocessing.get_context('spawn'),
+            ) as executor:
+                for model, fields in FILE_FIELDS.items():
+                    for field in fields:
+                        self.process_field(executor, model, field)
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+        stats = self.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено: {stats["checked"]}, '
+            f'перекодировано: {stats["reencoded"]}, '
+            f'ошибок: {stats["failed"]}. '
+            f'Прочитано {stats["read"] / 2 ** 20:.1f} МБ, '
+            f'записано {stats["written"] / 2 ** 20:.1f} МБ.'
+        ))
+
+    def load_checkpoint(self, params, restart):
+        """Сохранённая позиция, если она для тех же параметров."""
+
+        path = settings.MEDIA_REENCODE_CHECKPOINT
+        if not restart and os.path.exists(path):
+            with open(path) as file:
+                checkpoint = json.load(file)
+            if checkpoint.get('params') == params:
+                return checkpoint
+        return {'params': params, 'positions': {}}
+
+    def save_checkpoint(self):
+        path = settings.MEDIA_REENCODE_CHECKPOINT
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.checkpoint, file)
+        os.replace(temp_path, path)
+
+    def process_field(self, executor, model, field):
+        key = f'{model._meta.label}.{field}'
+        positions = self.checkpoint['positions']
+        while True:
+            rows = list(
+                model.objects.filter(pk__gt=positions.get(key, 0)).exclude(
+                    **{field: ''}
+                ).exclude(**{f'{field}__isnull': True}).order_by(
+                    'pk'
+                ).values_list('pk', field)[:self.options['batch_size']]
+            )
+            if not rows:
+                return
+            started = time.monotonic()
+            io_bytes = self.process_batch(executor, model, field, rows)
+            positions[key] = rows[-1][0]
+            self.save_checkpoint()
+            if self.options['verbosity'] >= 2:
+                self.stdout.write(f'{key}: до id {rows[-1][0]}')
+            self.throttle(started, io_bytes)
+
+    def process_batch(self, executor, model, field, rows):
+        """
+        Перекодирует изображения пачки и переводит на них объекты.
+        Возвращает число прочитанных и записанных байт.
+        """
+
+        options = self.options
+        futures = {
+            name: executor.submit(
+                reencode, self.storage.path(name), self.work_dir,
+                options['format'], options['max_size'], options['quality'],
+            )
+            for name in {name for _, name in rows}
+        }
+        encoded, io_bytes = {}, 0
+        for name, future in futures.items():
+            try:
+                result = future.result()
+            except Exception as error:
+                self.stats['failed'] += 1
+                self.stdout.write(self.style.WARNING(f'{name}: {error}'))
+                continue
+            if result is None:
+                continue
+            path, read, written = result
+            encoded[name] = path
+            io_bytes += read + written
+            self.stats['read'] += read
+            self.stats['written'] += written
+        self.stats['checked'] += len(rows)
+
+        try:
+            with transaction.atomic():
+                self.replace_files(model, field, rows, encoded)
+        finally:
+            for path in encoded.values():
+                os.remove(path)
+        return io_bytes
+
+    def replace_files(self, model, field, rows, encoded):
+        """
+        Сохраняет перекодированные файлы в хранилище и переводит
+        на них объекты, у которых файл не сменился за время
+        перекодирования. Счётчики ссылок StoredFile меняются
+        на число переведённых объектов.
+        """
+
+        current = dict(
+            model.objects.select_for_update().filter(
+                pk__in=[pk for pk, name in rows if name in encoded]
+            ).values_list('pk', field)
+        )
+        replaced = {}
+        for pk, name in rows:
+            if name in encoded and current.get(pk) == name:
+                replaced.setdefault(name, []).append(pk)
+
+        objects = []
+        for name, path in encoded.items():
+            pks = replaced.get(name, [])
+            base = os.path.splitext(os.path.basename(name))[0]
+            with open(path, 'rb') as file:
+                # save добавляет одну ссылку на новый файл
+                new_name = self.storage.save(
+                    f'{base}{FORMAT_EXTENSIONS[self.options["format"]]}',
+                    File(file),
+                )
+            if not pks:
+                self.storage.delete(new_name)
+                continue
+            if len(pks) > 1:
+                StoredFile.objects.filter(name=new_name).update(
+                    references=F('references') + len(pks) - 1
+                )
+            # Старые файлы вне хранилища по содержимому могут быть
+            # у объектов следующих пачек, их удаляет clean_media
+            if is_content_name(name):
+                for _ in pks:
+                    self.storage.delete(name)
+            objects.extend(model(pk=pk, **{field: new_name}) for pk in pks)
+
+        # bulk_update не вызывает сигналы: кэш ответов сбрасывается здесь
+        model.objects.bulk_update(objects, [field])
+        if objects:
+            scope, tag = CACHE_TAGS[model]
+            publish(scope, *(tag(obj.pk) for obj in objects))
+        self.stats['reencoded'] += len(objects)
+
+    def throttle(self, started, io_bytes):
+        """Ждёт, если пачка обработана быстрее ограничения скорости."""
+
+        limit = self.options['max_mb_per_second']
+        if not limit:
+            return
+        delay = io_bytes / (limit * 2 ** 20) - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.19 on 2026-10-19 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0002_stored_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jti', models.CharField(blank=True, max_length=255, null=True, unique=True, verbose_name='Идентификатор токена')),
+                ('auth_hash', models.CharField(blank=True, max_length=128, verbose_name='Хеш пароля после смены')),
+                ('revoked_date', models.DateTimeField(auto_now_add=True, verbose_name='Дата отзыва')),
+                ('expires_date', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Отозванный токен',
+                'verbose_name_plural': 'Отозванные токены',
+            },
+        ),
+    ]
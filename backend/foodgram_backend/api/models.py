@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db import models
+
+
+class CacheVersion(models.Model):
+    """
+    Счётчик версии области данных для запасной шины инвалидации
+    (api.invalidation.VersionBus).
+    """
+
+    scope = models.CharField(
+        verbose_name='Область',
+        max_length=32,
+        primary_key=True
+    )
+    version = models.PositiveBigIntegerField(
+        verbose_name='Версия',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Версия кэша'
+        verbose_name_plural = 'Версии кэша'
+
+    def __str__(self):
+        return f'{self.scope}: {self.version}'
+
+
+class StoredFile(models.Model):
+    """
+    Файл хранилища с адресацией по содержимому (api.storage.
+    ContentAddressedStorage) и число ссылающихся на него объектов.
+    """
+
+    name = models.CharField(
+        verbose_name='Имя файла',
+        max_length=255,
+        primary_key=True
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name='Размер',
+        default=0
+    )
+    references = models.PositiveIntegerField(
+        verbose_name='Ссылок',
+        default=0
+    )
+    created_date = models.DateTimeField(
+        verbose_name='Дата загрузки',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Файл в хранилище'
+        verbose_name_plural = 'Файлы в хранилище'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
+
+
+class RevokedToken(models.Model):
+    """
+    Отзыв access-токенов JWT до истечения их срока (api.revocation):
+    одного токена по jti (выход) или всех токенов пользователя
+    со старым паролем: после смены пароля действуют только токены
+    с новым auth_hash. После expires_date отозванные токены истекли
+    сами и запись не нужна.
+    """
+
+    jti = models.CharField(
+        verbose_name='Идентификатор токена',
+        max_length=255,
+        unique=True,
+        null=True,
+        blank=True
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True
+    )
+    auth_hash = models.CharField(
+        verbose_name='Хеш пароля после смены',
+        max_length=128,
+        blank=True
+    )
+    revoked_date = models.DateTimeField(
+        verbose_name='Дата отзыва',
+        auto_now_add=True
+    )
+    expires_date = models.DateTimeField(
+        verbose_name='Действует до',
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Отозванный токен'
+        verbose_name_plural = 'Отозванные токены'
+
+    def __str__(self):
+        return self.jti or f'Все токены пользователя {self.user_id}'
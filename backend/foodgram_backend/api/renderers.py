@@ -0,0 +1,94 @@
+import re
+
+import msgpack
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Типы, которых нет в JSON (datetime, Decimal, UUID, ленивые строки,
+# QuerySet...), преобразуются так же, как в JSONRenderer DRF
+_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if orjson is not None else 0
+)
+# orjson пишет числа с порядком иначе, чем json (1e16 и 1e-7 вместо
+# 1e+16 и 1e-07), а числа меньше 1e-4 — без порядка (0.00002 вместо
+# 2e-05). Такие числа ищутся по концу порядка, за которым в JSON
+# идёт разделитель, и по нулям после точки; совпадение внутри строки
+# только отправляет ответ в стандартный json
+EXPONENT_FLOAT = re.compile(rb'e-?\d+(?:[,}\]]|\Z)')
+SMALL_FLOAT = b'0.0000'
+# JSONRenderer экранирует разделители строк, недопустимые в JavaScript
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: ответ совпадает с ответом JSONRenderer
+    байт в байт. Без orjson, при FAST_JSON_ENABLED=False, при запросе
+    с отступами, для данных, которые orjson не кодирует (например,
+    целых больше 64 бит), и для чисел, которые он записывает иначе
+    (EXPONENT_FLOAT, SMALL_FLOAT), используется стандартный json. Исключение —
+    NaN и Infinity: orjson записывает их как null, а JSONRenderer
+    отвечает ошибкой ValueError.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or not settings.FAST_JSON_ENABLED
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            content = orjson.dumps(
+                data, default=_encoder.default, option=ORJSON_OPTIONS
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if SMALL_FLOAT in content or EXPONENT_FLOAT.search(content):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        for separator, escaped in LINE_SEPARATORS:
+            if separator in content:
+                content = content.replace(separator, escaped)
+        return content
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Ответ в MessagePack (Accept: application/msgpack или ?format=msgpack)
+    для мобильного клиента. Значения, которых нет в MessagePack,
+    преобразуются так же, как в JSON.
+    """
+
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data, default=_encoder.default, use_bin_type=True, datetime=False
+        )
@@ -0,0 +1,145 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .images import resize
+from .storage import is_referenced
+
+# Служебный каталог в кэше (скрытый: nginx его не ищет,
+# а вытеснение пропускает)
+LOCKS_DIR = '.locks'
+# Блокировки — по хешу пути копии, одна из LOCK_STRIPES: генерация
+# разных копий почти никогда не ждёт друг друга, а число файлов
+# блокировок не растёт
+LOCK_STRIPES = 256
+# Вытеснение освобождает место с запасом, чтобы кэш не упирался
+# в предел сразу после него
+EVICTION_LOW_WATER = 0.9
+
+
+def cache_root():
+    return os.path.join(settings.MEDIA_ROOT, settings.IMAGE_RESIZE_DIR)
+
+
+def variant_path(size, name):
+    return os.path.join(cache_root(), size, name)
+
+
+def is_valid_name(name):
+    """Имя файла хранилища без выхода за MEDIA_ROOT и скрытых частей."""
+
+    return (
+        os.path.normpath(name) == name
+        and not os.path.isabs(name)
+        and not any(part.startswith('.') for part in name.split('/'))
+    )
+
+
+@contextmanager
+def _locked(path, blocking=True):
+    """
+    Межпроцессная блокировка для path (flock). С blocking=False,
+    если блокировка занята, выдаёт False и не ждёт.
+    """
+
+    locks = os.path.join(cache_root(), LOCKS_DIR)
+    os.makedirs(locks, exist_ok=True)
+    stripe = int(hashlib.sha1(path.encode()).hexdigest(), 16) % LOCK_STRIPES
+    with open(os.path.join(locks, f'{stripe}.lock'), 'a') as lock:
+        try:
+            fcntl.flock(
+                lock, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB)
+            )
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_variant(width, height, name):
+    """
+    Путь к копии изображения name размером width x height в кэше
+    или None, если размера нет в IMAGE_RESIZE_SIZES или на файл
+    не ссылается ни один объект. Копия создаётся при первом запросе;
+    одновременные запросы одной копии ждут, пока её создаст первый.
+    """
+
+    size = f'{width}x{height}'
+    if size not in settings.IMAGE_RESIZE_SIZES or not is_valid_name(name):
+        return None
+    path = variant_path(size, name)
+    if os.path.exists(path):
+        return path
+    source = os.path.join(settings.MEDIA_ROOT, name)
+    if not os.path.isfile(source) or not is_referenced(name):
+        return None
+
+    with _locked(path):
+        if not os.path.exists(path):
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # Копия появляется в кэше целиком: nginx не отдаст
+            # недописанный файл
+            handle, temp_path = tempfile.mkstemp(prefix='.', dir=directory)
+            os.close(handle)
+            try:
+                resize(
+                    source, temp_path, width, height,
+                    settings.IMAGE_RESIZE_QUALITY,
+                )
+                os.chmod(temp_path, 0o644)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+    return path
+
+
+def evict(max_size):
+    """
+    Удаляет копии, которые дольше всего не читали, пока их суммарный
+    размер больше max_size. Возвращает число удалённых файлов.
+
+    Копии из кэша отдаёт nginx, поэтому о чтении знает только
+    файловая система: порядок берётся по времени доступа к файлу.
+    С relatime оно обновляется не чаще раза в сутки, с noatime
+    не обновляется, и копии удаляются в порядке создания.
+    """
+
+    files, total = [], 0
+    for directory, subdirectories, names in os.walk(cache_root()):
+        subdirectories[:] = [
+            name for name in subdirectories if not name.startswith('.')
+        ]
+        for name in names:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((info.st_atime, info.st_size, path))
+            total += info.st_size
+    if total <= max_size:
+        return 0
+
+    files.sort()
+    removed = 0
+    for _, file_size, path in files:
+        if total <= max_size * EVICTION_LOW_WATER:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= file_size
+        removed += 1
+    return removed
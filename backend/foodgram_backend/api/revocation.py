@@ -0,0 +1,127 @@
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from foodgram_backend.db_router import PRIMARY_DB
+
+from .invalidation import TOKENS_SCOPE, publish, register_handler
+from .models import RevokedToken
+
+# Производный от хеша пароля (как у сессий Django): после смены пароля
+# токены со старым значением отзываются
+AUTH_HASH_CLAIM = 'auth_hash'
+
+
+class RevocationList:
+    """
+    Отозванные и ещё не истёкшие access-токены в памяти воркера:
+    множество jti и, для пользователей, недавно сменивших пароль,
+    auth_hash нового пароля.
+
+    Список читается из RevokedToken при первой проверке и заново
+    после любого события области TOKENS_SCOPE в шине инвалидации,
+    поэтому отзыв в одном воркере действует во всех, а проверка
+    токена обходится без запроса к БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = (frozenset(), {})
+        self._stale = True
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _load(self):
+        jtis, users = set(), {}
+        # Более поздняя смена пароля перезаписывает раннюю
+        for jti, user_id, auth_hash in RevokedToken.objects.using(
+            PRIMARY_DB
+        ).filter(expires_date__gt=timezone.now()).order_by(
+            'revoked_date', 'pk'
+        ).values_list('jti', 'user_id', 'auth_hash'):
+            if jti:
+                jtis.add(jti)
+            else:
+                users[user_id] = auth_hash
+        return frozenset(jtis), users
+
+    def is_revoked(self, token):
+        if self._stale:
+            with self._lock:
+                if self._stale:
+                    # Событие во время чтения снова пометит список
+                    self._stale = False
+                    try:
+                        self._revoked = self._load()
+                    except BaseException:
+                        self._stale = True
+                        raise
+        jtis, users = self._revoked
+        if token['jti'] in jtis:
+            return True
+        auth_hash = users.get(token.get(jwt_settings.USER_ID_CLAIM))
+        return auth_hash is not None and (
+            token.get(AUTH_HASH_CLAIM) != auth_hash
+        )
+
+
+_revocation_list = RevocationList()
+
+
+def is_revoked(token):
+    return _revocation_list.is_revoked(token)
+
+
+@register_handler
+def reload_revocations(scope, tags, local):
+    if scope == TOKENS_SCOPE:
+        _revocation_list.mark_stale()
+
+
+def _revoked():
+    RevokedToken.objects.filter(expires_date__lte=timezone.now()).delete()
+    publish(TOKENS_SCOPE)
+
+
+def revoke_access_token(token):
+    """Отзывает access-токен до истечения его срока."""
+
+    expires_date = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    if expires_date <= timezone.now():
+        return
+    RevokedToken.objects.get_or_create(
+        jti=token['jti'], defaults={'expires_date': expires_date}
+    )
+    _revoked()
+
+
+def revoke_user_tokens(user):
+    """
+    Отзывает все выданные пользователю JWT со старым паролем:
+    access-токены — записью с auth_hash нового пароля, refresh-токены —
+    занесением в blacklist.
+    """
+
+    now = timezone.now()
+    RevokedToken.objects.create(
+        user=user,
+        auth_hash=user.get_session_auth_hash(),
+        expires_date=now + jwt_settings.ACCESS_TOKEN_LIFETIME,
+    )
+    BlacklistedToken.objects.bulk_create(
+        [
+            BlacklistedToken(token=token)
+            for token in OutstandingToken.objects.filter(
+                user=user, expires_at__gt=now, blacklistedtoken__isnull=True
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    _revoked()
@@ -1,8 +1,15 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.fields import CurrentUserDefault
 from drf_extra_fields.fields import Base64ImageField
+from rest_framework_simplejwt import serializers as jwt_serializers
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 from constants import (
     RECIPES_LIMIT_IN_SUBSCRIPTION_DEFAULT,
@@ -10,6 +17,7 @@ from constants import (
     MIN_AMOUNT_VALUE
 )
 
+from recipes import similarity
 from recipes.models import (
     Ingredient,
     Recipe,
@@ -20,11 +28,15 @@ from recipes.models import (
 
 from subscriptions.models import Subscription
 
+from .authentication import set_user_claims
+from .fieldsets import FieldsetSerializerMixin
+from .uploads import ImageUploadField
+
 
 User = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(FieldsetSerializerMixin, serializers.ModelSerializer):
     """
     Сериализатор для отображения данных пользователей.
     Включает поле is_subscribed для проверки
@@ -60,15 +72,19 @@ class UserSerializer(serializers.ModelSerializer):
         if request.user == obj:
             return False
 
+        # Аннотация из UserViewSet.get_queryset
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return obj.follower.filter(user=request.user).exists()
 
 
 class AvatarSerializer(serializers.ModelSerializer):
     """
-    Сериализатор для обновления аватара пользователя через Base64 JSON.
+    Сериализатор для обновления аватара пользователя: файлом
+    (multipart или тело запроса) или строкой Base64 в JSON.
     """
 
-    avatar = Base64ImageField(required=True, allow_null=False)
+    avatar = ImageUploadField(required=True, allow_null=False)
 
     class Meta:
         model = User
@@ -84,7 +100,9 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class RecipeIngredientReadSerializer(serializers.ModelSerializer):
+class RecipeIngredientReadSerializer(
+    FieldsetSerializerMixin, serializers.ModelSerializer
+):
     """
     Сериализатор для чтения ингредиентов в рецепте.
     Показывает id, name, measurement_unit из связанной модели
@@ -102,8 +120,13 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сериализатор для чтения рецептов"""
+class RecipeReadSerializer(
+    FieldsetSerializerMixin, serializers.ModelSerializer
+):
+    """
+    Сериализатор для чтения рецептов. Если передан expand, автор
+    и ингредиенты, не указанные в нём, выводятся своими id.
+    """
 
     author = UserSerializer(read_only=True)
     ingredients = RecipeIngredientReadSerializer(
@@ -116,6 +139,17 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     image = Base64ImageField(read_only=True)
 
+    collapsed_fields = {
+        'author': partial(serializers.PrimaryKeyRelatedField, read_only=True),
+        'ingredients': partial(
+            serializers.SlugRelatedField,
+            many=True,
+            read_only=True,
+            source='recipe_ingredients',
+            slug_field='ingredient_id',
+        ),
+    }
+
     class Meta:
         model = Recipe
         fields = (
@@ -130,12 +164,15 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart'
         )
 
-    def _get_user_recipe_relation(self, obj, related_model):
+    def _get_user_recipe_relation(self, obj, related_model, annotation):
         """Вспомогательный метод для проверки связи User-Recipe"""
 
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
+        # Аннотация из RecipeViewSet.get_queryset
+        if hasattr(obj, annotation):
+            return getattr(obj, annotation)
         return related_model.objects.filter(
             user=request.user, recipe=obj
         ).exists()
@@ -146,7 +183,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         пользователя
         """
 
-        return self._get_user_recipe_relation(obj, Favorite)
+        return self._get_user_recipe_relation(obj, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, obj):
         """
@@ -154,7 +191,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         пользователя
         """
 
-        return self._get_user_recipe_relation(obj, ShoppingCart)
+        return self._get_user_recipe_relation(
+            obj, ShoppingCart, 'is_in_shopping_cart'
+        )
 
 
 class IngredientAmountWriteSerializer(serializers.Serializer):
@@ -177,7 +216,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     ingredients = IngredientAmountWriteSerializer(many=True,
                                                   required=True)
-    image = Base64ImageField(required=True, allow_null=False)
+    image = ImageUploadField(required=True, allow_null=False)
     author = serializers.HiddenField(default=CurrentUserDefault())
 
     class Meta:
@@ -242,6 +281,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ingredients_data = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(**validated_data)
         self._create_ingredients(recipe, ingredients_data)
+        similarity.update_recipes([recipe.pk])
         return recipe
 
     @transaction.atomic
@@ -254,6 +294,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         if ingredients_data is not None:
             recipe.recipe_ingredients.all().delete()
             self._create_ingredients(recipe, ingredients_data)
+            similarity.update_recipes([recipe.pk])
 
         return recipe
 
@@ -275,7 +316,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         ).data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(
+    FieldsetSerializerMixin, serializers.ModelSerializer
+):
     """Краткий сериализатор для рецепта (для списка подписок)"""
 
     image = Base64ImageField(read_only=True)
@@ -290,13 +333,19 @@ class SubscriptionSerializer(UserSerializer):
     """
     Сериализатор для отображения авторов, на которых подписан пользователь.
     Наследуется от UserSerializer, добавляет кол-во рецептов и их
-    сокращенный список
+    сокращенный список (если передан expand без recipes — список id)
     """
 
     is_subscribed = serializers.BooleanField(default=True)
     recipes_count = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
 
+    collapsed_fields = {
+        'recipes': partial(
+            serializers.SerializerMethodField, method_name='get_recipe_ids'
+        ),
+    }
+
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + ('recipes_count', 'recipes')
         read_only_fields = fields
@@ -304,10 +353,13 @@ class SubscriptionSerializer(UserSerializer):
     def get_recipes_count(self, obj):
         """Возвращает общее количество рецептов автора."""
 
+        # Аннотация из UserViewSet.subscriptions
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
-    def get_recipes(self, obj):
-        """Возвращает краткий список рецептов"""
+    def _get_recipes_queryset(self, obj):
+        """Последние рецепты автора с учётом параметра recipes_limit."""
 
         request = self.context.get('request')
 
@@ -321,12 +373,25 @@ class SubscriptionSerializer(UserSerializer):
         except (ValueError, TypeError):
             limit = default_limit
 
-        recipes_queryset = obj.recipes.all()[:limit]
+        return obj.recipes.all()[:limit]
+
+    def get_recipes(self, obj):
+        """Возвращает краткий список рецептов"""
+
+        fieldset = self._get_fieldset()
         serializer = RecipeShortSerializer(
-            recipes_queryset, many=True, context=self.context
+            self._get_recipes_queryset(obj),
+            many=True,
+            context=self.context,
+            fieldset=fieldset and fieldset.nested('recipes'),
         )
         return serializer.data
 
+    def get_recipe_ids(self, obj):
+        """Возвращает id рецептов краткого списка."""
+
+        return [recipe.pk for recipe in self._get_recipes_queryset(obj)]
+
 
 class SubscriptionCreateDeleteSerializer(serializers.ModelSerializer):
     """
@@ -440,3 +505,54 @@ class UserRecipeRelationSerializer(serializers.Serializer):
             'recipe': recipe_to_interact_with,
             'model_class': model_class
         }
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """
+    Выдаёт пару JWT (access и refresh) по email и паролю.
+    В токены кладутся поля пользователя, чтобы запросы с access-токеном
+    обходились без обращения к БД.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        set_user_claims(token, user)
+        return token
+
+
+class TokenRefreshSerializer(jwt_serializers.TokenRefreshSerializer):
+    """
+    Выдаёт новый access-токен по refresh-токену.
+    Claims пользователя заполняются заново из БД, поэтому изменения
+    профиля попадают в токен не позже чем через время жизни access.
+    """
+
+    def validate(self, attrs):
+        try:
+            data = super().validate(attrs)
+            access = AccessToken(data['access'])
+            user = User.objects.get(pk=access[jwt_settings.USER_ID_CLAIM])
+        except User.DoesNotExist:
+            raise AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account'
+            )
+
+        set_user_claims(access, user)
+        data['access'] = str(access)
+        return data
+
+
+class TokenLogoutSerializer(serializers.Serializer):
+    """Принимает refresh-токен, который нужно отозвать."""
+
+    refresh = serializers.CharField()
+
+    def validate_refresh(self, value):
+        try:
+            return RefreshToken(value)
+        except TokenError:
+            raise serializers.ValidationError(
+                'Недействительный или уже отозванный refresh-токен.'
+            )
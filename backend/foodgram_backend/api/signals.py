@@ -0,0 +1,151 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from subscriptions.models import Subscription
+
+from .cache import (
+    INGREDIENT_LIST_TAG,
+    RECIPE_LIST_TAG,
+    author_list_tag,
+    author_tag,
+    ingredient_tag,
+    recipe_tag,
+    subscriptions_tag,
+)
+from .invalidation import (
+    INGREDIENTS_SCOPE,
+    RECIPES_SCOPE,
+    USERS_SCOPE,
+    publish,
+)
+from .revocation import revoke_user_tokens
+from .storage import FILE_FIELDS
+
+
+User = get_user_model()
+
+# Поля пользователя, которые не выводятся в ответах API
+USER_PRIVATE_FIELDS = frozenset(('last_login', 'password'))
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(sender, instance, **kwargs):
+    """
+    Новый рецепт сдвигает страницы ленты. Изменённый может попасть
+    в списки с фильтрами, поиском и сортировкой, в которые раньше
+    не входил и которые поэтому не помечены его тегом, — списки
+    очищаются в обоих случаях. Ингредиенты рецепта пишутся в той же
+    транзакции, поэтому события публикуются после фиксации.
+    """
+
+    # Тег самого рецепта нужен и индексу ингредиентов
+    publish(
+        RECIPES_SCOPE,
+        recipe_tag(instance.pk),
+        RECIPE_LIST_TAG,
+        author_list_tag(instance.author_id),
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_deleted_recipe(sender, instance, **kwargs):
+    publish(
+        RECIPES_SCOPE,
+        recipe_tag(instance.pk),
+        RECIPE_LIST_TAG,
+        author_list_tag(instance.author_id),
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredients(sender, instance, **kwargs):
+    publish(RECIPES_SCOPE, recipe_tag(instance.recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient(sender, instance, **kwargs):
+    recipe_ids = RecipeIngredient.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True)
+    publish(
+        INGREDIENTS_SCOPE,
+        INGREDIENT_LIST_TAG,
+        ingredient_tag(instance.pk),
+        *map(recipe_tag, recipe_ids)
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user(sender, instance, created, update_fields, **kwargs):
+    if created or (
+        update_fields is not None and update_fields <= USER_PRIVATE_FIELDS
+    ):
+        return
+    publish(USERS_SCOPE, author_tag(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def revoke_tokens_on_password_change(sender, instance, created, raw=False,
+                                     **kwargs):
+    """
+    После смены пароля отзывает все JWT пользователя. Новый пароль
+    AbstractBaseUser хранит в _password до конца save, то есть
+    и во время post_save.
+    """
+
+    if not created and not raw and instance._password is not None:
+        revoke_user_tokens(instance)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_subscription(sender, instance, **kwargs):
+    publish(USERS_SCOPE, subscriptions_tag(instance.user_id))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_stored_files(sender, instance, raw=False, update_fields=None,
+                          **kwargs):
+    """
+    Запоминает файлы объекта в БД до сохранения и то, загружен ли
+    в поле новый файл: поля сохраняют файлы после этого сигнала.
+    """
+
+    fields = FILE_FIELDS[sender]
+    if update_fields is not None:
+        fields = [field for field in fields if field in update_fields]
+    if raw or instance._state.adding or not fields:
+        return
+    stored = sender.objects.filter(
+        pk=instance.pk
+    ).values(*fields).first() or {}
+    instance._stored_files = {
+        field: (name, not getattr(instance, field)._committed)
+        for field, name in stored.items()
+    }
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def release_replaced_files(sender, instance, **kwargs):
+    stored_files = instance.__dict__.pop('_stored_files', {})
+    for field, (name, uploaded) in stored_files.items():
+        file = getattr(instance, field)
+        # Файл с тем же содержимым получает то же имя, но сохранение
+        # всё равно добавило на него ссылку
+        if name and (name != file.name or uploaded):
+            file.storage.delete(name)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_deleted_files(sender, instance, **kwargs):
+    for field in FILE_FIELDS[sender]:
+        file = getattr(instance, field)
+        if file:
+            file.storage.delete(file.name)
@@ -0,0 +1,191 @@
+import hashlib
+import heapq
+import os
+from collections import Counter
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from recipes.models import Recipe
+
+from .models import StoredFile
+
+
+User = get_user_model()
+
+BLOBS_DIR = 'blobs'
+# Поля моделей с файлами в хранилище: ссылки на файлы снимаются
+# сигналами api.signals при их замене и удалении объекта
+FILE_FIELDS = {
+    Recipe: ('image',),
+    User: ('avatar',),
+}
+
+
+def content_name(name, content):
+    """
+    Имя файла по SHA-256 содержимого: blobs/<2 символа>/<хеш>.<расширение
+    из name>. Содержимое читается частями.
+    """
+
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    hexdigest = digest.hexdigest()
+    extension = os.path.splitext(name)[1].lower()
+    return f'{BLOBS_DIR}/{hexdigest[:2]}/{hexdigest}{extension}'
+
+
+def is_content_name(name):
+    return name.startswith(f'{BLOBS_DIR}/')
+
+
+def referenced_names():
+    """Сколько объектов ссылается на каждый файл: Counter по именам."""
+
+    references = Counter()
+    for model, fields in FILE_FIELDS.items():
+        for field in fields:
+            references.update(
+                model.objects.exclude(**{field: ''}).exclude(
+                    **{f'{field}__isnull': True}
+                ).values_list(field, flat=True).iterator()
+            )
+    return references
+
+
+def is_referenced(name):
+    """Ссылается ли на файл name хотя бы один объект."""
+
+    return any(
+        model.objects.filter(**{field: name}).exists()
+        for model, fields in FILE_FIELDS.items()
+        for field in fields
+    )
+
+
+def iter_referenced_names(chunk_size=2000):
+    """
+    Имена файлов, на которые ссылаются объекты, по возрастанию
+    (побайтно, как сортирует str) и без повторов. Имена читаются
+    из БД частями, в памяти их не накапливается.
+    """
+
+    streams = []
+    for model, fields in FILE_FIELDS.items():
+        for field in fields:
+            # В PostgreSQL порядок строк зависит от правил сортировки
+            # базы, побайтный даёт только "C"
+            order = (
+                Collate(field, 'C') if connection.vendor == 'postgresql'
+                else F(field)
+            )
+            streams.append(
+                model.objects.exclude(**{field: ''}).exclude(
+                    **{f'{field}__isnull': True}
+                ).order_by(order).values_list(field, flat=True).iterator(
+                    chunk_size=chunk_size
+                )
+            )
+    previous = None
+    for name in heapq.merge(*streams):
+        if name != previous:
+            yield name
+            previous = name
+
+
+def recount(storage):
+    """
+    Приводит StoredFile в соответствие со ссылками из БД: недостающие
+    записи создаются, у файлов без ссылок счётчик обнуляется.
+    """
+
+    references = {
+        name: count for name, count in referenced_names().items()
+        if is_content_name(name)
+    }
+    stored = StoredFile.objects.in_bulk(list(references))
+    StoredFile.objects.bulk_create([
+        StoredFile(name=name, size=storage.size(name), references=count)
+        for name, count in references.items()
+        if name not in stored and storage.exists(name)
+    ])
+    changed = []
+    for name, file in stored.items():
+        if file.references != references[name]:
+            file.references = references[name]
+            changed.append(file)
+    StoredFile.objects.bulk_update(changed, ['references'])
+    StoredFile.objects.exclude(name__in=list(references)).exclude(
+        references=0
+    ).update(references=0)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — хеш его содержимого: одинаковые
+    файлы хранятся один раз, а файл по имени никогда не меняется
+    (nginx отдаёт blobs/ с Cache-Control: immutable).
+
+    save добавляет ссылку на файл, delete снимает её, а сам файл
+    удаляется после фиксации транзакции, когда ссылок не осталось.
+    Ссылки на старые файлы при замене и удалении объектов снимают
+    сигналы api.signals, поэтому FieldFile.delete() для полей
+    с этим хранилищем не вызывают.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = content_name(name, content)
+
+        # Блокировка строки не даёт удалить файл, пока на него
+        # добавляется ссылка
+        with transaction.atomic():
+            stored, _ = StoredFile.objects.select_for_update(
+            ).get_or_create(name=name)
+            if not self.exists(name):
+                saved_name = self._save(name, content)
+                if saved_name != name:
+                    # Файл появился после проверки; содержимое то же,
+                    # копия под другим именем не нужна
+                    FileSystemStorage.delete(self, saved_name)
+                stored.size = content.size
+            elif not stored.size:
+                # Запись создана для уже лежащего на диске файла
+                stored.size = self.size(name)
+            stored.references = F('references') + 1
+            stored.save(update_fields=('size', 'references'))
+        return name
+
+    def delete(self, name):
+        if not is_content_name(name):
+            # Файлы, загруженные до перехода на это хранилище
+            transaction.on_commit(
+                partial(FileSystemStorage.delete, self, name)
+            )
+            return
+        StoredFile.objects.filter(name=name, references__gt=0).update(
+            references=F('references') - 1
+        )
+        transaction.on_commit(partial(self.purge, name))
+
+    def purge(self, name):
+        """Удаляет файл, если на него не осталось ссылок."""
+
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(
+                name=name, references=0
+            ).first()
+            if stored is None:
+                return False
+            super().delete(name)
+            stored.delete()
+        return True
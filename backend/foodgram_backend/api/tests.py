@@ -0,0 +1,407 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from api.management.commands.check_serializer_parity import (
+    RECIPE_FIELDSETS,
+    RECIPES_LIMITS,
+    SUBSCRIPTION_FIELDSETS,
+)
+from api.models import StoredFile
+from recipes import popularity
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    TrendingDecay,
+)
+from subscriptions.models import Subscription
+
+
+User = get_user_model()
+
+
+@override_settings(
+    RESPONSE_CACHE_ENABLED=False,
+    REQUEST_COALESCING_ENABLED=False,
+)
+class FastSerializationParityTests(APITestCase):
+    """
+    Ответы списка рецептов и подписок из api.fast_serializers
+    совпадают байт в байт с ответами сериализаторов DRF
+    (FAST_SERIALIZATION_ENABLED=False) для анонимного
+    и авторизованных пользователей, разных recipes_limit и форм ответа.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='Password123!',
+            )
+            for number in range(4)
+        ]
+        cls.users[1].avatar = 'avatars/user1.png'
+        cls.users[1].save(update_fields=('avatar',))
+
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        )
+        now = timezone.now()
+        recipes = []
+        for number in range(9):
+            recipe = Recipe.objects.create(
+                author=cls.users[number % 3],
+                name=f'Рецепт {number}',
+                image=f'recipes/recipe{number}.jpg',
+                text='Описание',
+                cooking_time=number + 1,
+            )
+            # Разные даты: порядок рецептов автора однозначен
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=now - timedelta(hours=number)
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[number % 3:number % 3 + 3]
+            )
+            recipes.append(recipe)
+
+        viewer = cls.users[3]
+        for author in cls.users[:3]:
+            Subscription.objects.create(user=viewer, author=author)
+        Subscription.objects.create(user=cls.users[0], author=cls.users[1])
+        for recipe in recipes[::2]:
+            Favorite.objects.create(user=viewer, recipe=recipe)
+        for recipe in recipes[1::3]:
+            ShoppingCart.objects.create(user=viewer, recipe=recipe)
+
+    def assertSameResponse(self, viewer, url):
+        self.client.force_authenticate(viewer)
+        contents = []
+        for enabled in (False, True):
+            with self.settings(FAST_SERIALIZATION_ENABLED=enabled):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            contents.append(response.content)
+        self.assertEqual(*contents)
+
+    def test_recipe_list(self):
+        queries = [*RECIPE_FIELDSETS, 'limit=4&page=2']
+        for viewer in (None, self.users[3], self.users[0]):
+            for query in queries:
+                with self.subTest(viewer=str(viewer), query=query):
+                    self.assertSameResponse(viewer, f'/api/recipes/?{query}')
+
+    def test_subscriptions(self):
+        queries = [
+            f'recipes_limit={limit}' if limit is not None else ''
+            for limit in RECIPES_LIMITS
+        ] + list(SUBSCRIPTION_FIELDSETS)
+        for viewer in (self.users[3], self.users[0], self.users[2]):
+            for query in queries:
+                with self.subTest(viewer=str(viewer), query=query):
+                    self.assertSameResponse(
+                        viewer, f'/api/users/subscriptions/?{query}'
+                    )
+        # Вторая страница: у users[3] три подписки
+        self.assertSameResponse(
+            self.users[3], '/api/users/subscriptions/?limit=2&page=2'
+        )
+
+
+class TokenRevocationTests(APITestCase):
+    """
+    Отозванные JWT отклоняются: после выхода — access-токен запроса,
+    после смены пароля — все токены пользователя со старым паролем.
+    """
+
+    password = 'Password123!'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='user@example.com',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+            password=self.password,
+        )
+
+    def obtain_tokens(self):
+        response = self.client.post(
+            '/api/auth/jwt/create/',
+            {'email': self.user.email, 'password': self.password},
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def get_me(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get('/api/users/me/').status_code
+
+    def test_logout_revokes_access_token(self):
+        tokens = self.obtain_tokens()
+        self.assertEqual(self.get_me(tokens['access']), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/auth/jwt/logout/', {'refresh': tokens['refresh']}
+            )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(tokens['access']), 401)
+        self.assertEqual(self.get_me(self.obtain_tokens()['access']), 200)
+
+    def test_password_change_revokes_tokens(self):
+        tokens = self.obtain_tokens()
+        self.assertEqual(self.get_me(tokens['access']), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/users/set_password/',
+                {
+                    'current_password': self.password,
+                    'new_password': self.password,
+                },
+            )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me(tokens['access']), 401)
+        self.client.credentials()
+        response = self.client.post(
+            '/api/auth/jwt/refresh/', {'refresh': tokens['refresh']}
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.get_me(self.obtain_tokens()['access']), 200)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ContentAddressedStorageTests(APITestCase):
+    """
+    Счётчик ссылок StoredFile при загрузке, замене и удалении
+    аватаров: одинаковые файлы хранятся один раз, файл удаляется
+    после фиксации транзакции, когда ссылок не осталось.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='Password123!',
+            )
+            for number in range(2)
+        ]
+
+    def image(self, color='red'):
+        content = io.BytesIO()
+        Image.new('RGB', (8, 8), color).save(content, 'PNG')
+        return content.getvalue()
+
+    def put_avatar(self, user, content):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                '/api/users/me/avatar/', content, content_type='image/png'
+            )
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        return user.avatar.name
+
+    def delete_avatar(self, user):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete('/api/users/me/avatar/')
+        self.assertEqual(response.status_code, 204)
+
+    def references(self, name):
+        stored = StoredFile.objects.filter(name=name).first()
+        return stored.references if stored else None
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(settings.MEDIA_ROOT, name))
+
+    def test_same_content_is_stored_once(self):
+        content = self.image()
+        name = self.put_avatar(self.users[0], content)
+        self.assertEqual(self.put_avatar(self.users[1], content), name)
+        self.assertEqual(self.references(name), 2)
+        self.assertEqual(StoredFile.objects.get(name=name).size, len(content))
+
+    def test_reupload_of_same_content_keeps_references(self):
+        content = self.image()
+        name = self.put_avatar(self.users[0], content)
+        self.put_avatar(self.users[0], content)
+        self.put_avatar(self.users[0], content)
+        self.assertEqual(self.references(name), 1)
+
+    def test_replaced_file_is_purged(self):
+        old_name = self.put_avatar(self.users[0], self.image('red'))
+        new_name = self.put_avatar(self.users[0], self.image('blue'))
+        self.assertNotEqual(old_name, new_name)
+        self.assertIsNone(self.references(old_name))
+        self.assertFalse(self.exists(old_name))
+        self.assertEqual(self.references(new_name), 1)
+
+    def test_delete_releases_reference(self):
+        content = self.image()
+        name = self.put_avatar(self.users[0], content)
+        self.put_avatar(self.users[1], content)
+
+        self.delete_avatar(self.users[0])
+        self.assertEqual(self.references(name), 1)
+        self.assertTrue(self.exists(name))
+
+        self.delete_avatar(self.users[1])
+        self.assertIsNone(self.references(name))
+        self.assertFalse(self.exists(name))
+
+    def test_purge_waits_for_commit(self):
+        name = self.put_avatar(self.users[0], self.image())
+        self.client.force_authenticate(self.users[0])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.delete('/api/users/me/avatar/')
+        # До фиксации файл и запись на месте: откат вернул бы ссылку
+        self.assertTrue(self.exists(name))
+        self.assertTrue(StoredFile.objects.filter(name=name).exists())
+        for callback in callbacks:
+            callback()
+        self.assertFalse(self.exists(name))
+
+    def test_existing_file_gets_its_size(self):
+        content = self.image()
+        name = self.put_avatar(self.users[0], content)
+        StoredFile.objects.filter(name=name).delete()
+        self.put_avatar(self.users[1], content)
+        self.assertEqual(StoredFile.objects.get(name=name).size, len(content))
+
+
+@override_settings(TRENDING_HALF_LIFE_HOURS=1)
+class RecipePopularityTests(TestCase):
+    """
+    Сохранение рецепта не затирает счётчики популярности, а затухание
+    трендов идёт по времени, прошедшему с прошлого затухания.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Password123!',
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image='recipes/recipe.jpg',
+            text='Описание',
+            cooking_time=5,
+        )
+
+    def test_save_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        popularity.add_event(recipe.pk, 3)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.popularity, 3)
+        self.assertEqual(recipe.trending_score, 3)
+
+    def test_save_of_deferred_recipe_reads_nothing(self):
+        # author нужен обработчику post_save для тегов кеша
+        recipe = Recipe.objects.only('name', 'author').get(
+            pk=self.recipe.pk
+        )
+        recipe.name = 'Новое название'
+        # Только UPDATE загруженных полей, без дочитывания отложенных
+        with self.assertNumQueries(1):
+            recipe.save()
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.pk).name, 'Новое название'
+        )
+
+    def test_save_of_deleted_recipe_inserts_it(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=recipe.pk).delete()
+        recipe.save()
+        self.assertTrue(Recipe.objects.filter(pk=recipe.pk).exists())
+
+    def test_decay_uses_elapsed_time(self):
+        # Первый запуск только запоминает время
+        self.assertEqual(popularity.decay(), 0)
+        popularity.add_event(self.recipe.pk, 8)
+        TrendingDecay.objects.update(
+            decayed_date=timezone.now() - timedelta(hours=2)
+        )
+        self.assertEqual(popularity.decay(), 1)
+        self.recipe.refresh_from_db()
+        self.assertAlmostEqual(self.recipe.trending_score, 2, places=2)
+        self.assertEqual(self.recipe.popularity, 8)
+
+        # Сразу повторный запуск почти ничего не меняет
+        popularity.decay()
+        self.recipe.refresh_from_db()
+        self.assertAlmostEqual(self.recipe.trending_score, 2, places=2)
+
+    def test_rebuild_resets_decay_time(self):
+        before = timezone.now()
+        popularity.rebuild()
+        self.assertGreaterEqual(
+            TrendingDecay.objects.get().decayed_date, before
+        )
+
+
+class ArrayInLookupTests(TestCase):
+    """
+    pk__in_array (api.filters) выбирает те же строки, что и pk__in,
+    передавая id одним параметром.
+    """
+
+    def test_matches_in_lookup(self):
+        author = User.objects.create_user(
+            email='author@example.com',
+            username='author',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='Password123!',
+        )
+        recipes = [
+            Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}',
+                image=f'recipes/recipe{number}.jpg',
+                text='Описание',
+                cooking_time=number + 1,
+            )
+            for number in range(5)
+        ]
+        ids = [recipes[0].pk, recipes[3].pk, recipes[4].pk + 100]
+        with self.assertNumQueries(1):
+            found = set(
+                Recipe.objects.filter(pk__in_array=ids)
+                .values_list('pk', flat=True)
+            )
+        self.assertEqual(found, {recipes[0].pk, recipes[3].pk})
@@ -0,0 +1,123 @@
+import filetype
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.datastructures import MultiValueDict
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+from rest_framework.parsers import DataAndFiles, FileUploadParser
+
+# Имя файла, если клиент не передал Content-Disposition: файл всё
+# равно переименовывается в ImageUploadField
+DEFAULT_UPLOAD_NAME = 'upload'
+# Сколько первых байт файла нужно filetype для определения формата
+FILE_SIGNATURE_SIZE = 261
+
+
+def _megabytes(size):
+    return f'{size / 2 ** 20:g} МБ'
+
+
+class UploadTooLarge(RequestDataTooBig):
+    """
+    Загружаемый файл больше IMAGE_UPLOAD_MAX_SIZE. LimitedUploadHandler
+    работает для всех запросов (и в админке), поэтому исключение
+    не из DRF: Django отвечает на него 400, а в API ответ 413 даёт
+    api.exception_handler.
+    """
+
+    def __init__(self):
+        super().__init__(
+            'Размер файла больше '
+            f'{_megabytes(settings.IMAGE_UPLOAD_MAX_SIZE)}.'
+        )
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """
+    Первый обработчик в FILE_UPLOAD_HANDLERS: считает байты каждого
+    загружаемого файла и прерывает загрузку, как только их больше
+    IMAGE_UPLOAD_MAX_SIZE. Данные передаёт дальше по цепочке
+    (TemporaryFileUploadHandler пишет их во временный файл).
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        super().new_file(
+            field_name, file_name, content_type, content_length,
+            charset, content_type_extra
+        )
+        # Для тела запроса без multipart размер известен заранее
+        if (content_length or 0) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise UploadTooLarge()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            raise UploadTooLarge()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class ImageUploadParser(FileUploadParser):
+    """
+    Изображение в теле запроса (Content-Type: image/*). Файл попадает
+    в request.data под именем upload_field_name из view.
+    """
+
+    media_type = 'image/*'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        field_name = getattr(
+            parser_context.get('view'), 'upload_field_name', 'file'
+        )
+        files = MultiValueDict({field_name: [result.files['file']]})
+        # Как DRF делает для multipart: Django закроет (и удалит)
+        # временный файл по окончании запроса
+        parser_context['request']._request._files = files
+        return DataAndFiles(MultiValueDict(), files)
+
+    def get_filename(self, stream, media_type, parser_context):
+        return (
+            super().get_filename(stream, media_type, parser_context)
+            or DEFAULT_UPLOAD_NAME
+        )
+
+
+class ImageUploadField(Base64ImageField):
+    """
+    Изображение из multipart-запроса или тела запроса (файл уже
+    лежит во временном файле) либо, для совместимости, строкой Base64.
+    Допустимые форматы и имена файлов — как у Base64ImageField.
+    """
+
+    def to_internal_value(self, data):
+        max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        if isinstance(data, str):
+            # Base64 кодирует 3 байта четырьмя символами
+            if len(data) // 4 * 3 > max_size:
+                raise serializers.ValidationError(
+                    f'Размер изображения больше {_megabytes(max_size)}.'
+                )
+            return super().to_internal_value(data)
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+
+        if data.size > max_size:
+            raise serializers.ValidationError(
+                f'Размер изображения больше {_megabytes(max_size)}.'
+            )
+        # Формат определяется по сигнатуре, а не по имени от клиента
+        data.seek(0)
+        extension = filetype.guess_extension(data.read(FILE_SIGNATURE_SIZE))
+        data.seek(0)
+        if extension is None:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        data.name = f'{self.get_file_name(data)}.{extension}'
+        return serializers.ImageField.to_internal_value(self, data)
@@ -1,10 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import (
+    TokenObtainPairView,
+    TokenRefreshView
+)
 
 from .views import (
     UserViewSet,
     IngredientViewSet,
     RecipeViewSet,
+    TokenLogoutView,
 )
 
 
@@ -28,7 +33,14 @@ router_v1.register(
     basename='recipes'
 )
 
+jwt_urlpatterns = [
+    path('create/', TokenObtainPairView.as_view(), name='jwt_create'),
+    path('refresh/', TokenRefreshView.as_view(), name='jwt_refresh'),
+    path('logout/', TokenLogoutView.as_view(), name='jwt_logout'),
+]
+
 urlpatterns = [
     path('', include(router_v1.urls)),
+    path('auth/jwt/', include(jwt_urlpatterns)),
 
 ]
@@ -1,20 +1,27 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import Http404, HttpResponse
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import get_object_or_404, redirect
-from django.db.models import Sum
+from django.db.models import Count, Exists, OuterRef, Sum
 from django.views import View
 
 from rest_framework import (
     status, viewsets, permissions, filters
 )
 from rest_framework.decorators import action
-from rest_framework.parsers import JSONParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
 
 from djoser.views import UserViewSet as DjoserUserViewSet
 
 from django_filters.rest_framework import DjangoFilterBackend
 
+from users.models import TokenUser
+from recipes.similarity import similar_recipe_ids
 from recipes.models import (
     Ingredient,
     Recipe,
@@ -22,7 +29,10 @@ from recipes.models import (
     ShoppingCart,
     RecipeIngredient
 )
-from subscriptions.models import Subscription
+from subscriptions.feed import (
+    InvalidCursor, decode_cursor, encode_cursor, feed_page
+)
+from subscriptions.models import AuthorRecommendation, Subscription
 
 from .serializers import (
     RecipeShortSerializer,
@@ -33,9 +43,20 @@ from .serializers import (
     RecipeWriteSerializer,
     SubscriptionSerializer,
     SubscriptionCreateDeleteSerializer,
-    UserRecipeRelationSerializer
+    UserRecipeRelationSerializer,
+    TokenLogoutSerializer
+)
+from .revocation import revoke_access_token
+from .cache import IngredientResponseCacheMixin, RecipeResponseCacheMixin
+from .coalescing import CoalescingMixin
+from .fast_serializers import (
+    ALL_FIELDS, FastRecipeListMixin, paginated_data, subscriptions_data
 )
+from .fieldsets import FieldsetViewMixin
+from .parsers import FastJSONParser
+from .uploads import ImageUploadParser
 from .permissions import IsAuthorOrReadOnly
+from .resize import get_variant
 from .filters import RecipeFilter, IngredientNameSearchFilter
 from .utils import (
     encode_base62, decode_base62, generate_shopping_list_content
@@ -45,15 +66,52 @@ from .utils import (
 User = get_user_model()
 
 
-class UserViewSet(DjoserUserViewSet):
+class UserViewSet(FieldsetViewMixin, DjoserUserViewSet):
     """
     ViewSet для модели User. Наследуется от Djoser для сохранения
     стандартных эндпоинтов. Добавляет действия для управления аватаром.
+    Форма ответа задаётся параметрами fields, omit и expand.
     """
 
     serializer_class = UserSerializer
     queryset = User.objects.all()
 
+    # Поле, в которое ImageUploadParser кладёт изображение из тела
+    # запроса (для действия avatar)
+    upload_field_name = 'avatar'
+
+    # Действия, которым нужен полный пользователь из БД,
+    # а не TokenUser из claims JWT
+    DB_USER_ACTIONS = ('me', 'avatar', 'set_password', 'set_username')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self.action in self.DB_USER_ACTIONS
+            and isinstance(request.user, TokenUser)
+        ):
+            request.user = User.objects.get(pk=request.user.pk)
+
+    def get_queryset(self):
+        """
+        Для list и retrieve подписка текущего пользователя
+        вычисляется в том же запросе, если is_subscribed запрошено.
+        """
+
+        queryset = super().get_queryset()
+        user = self.request.user
+        if (
+            self.action in ('list', 'retrieve')
+            and user.is_authenticated
+            and (self.get_fieldset() or ALL_FIELDS).includes('is_subscribed')
+        ):
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user_id=user.pk, author=OuterRef('pk')
+                )
+            ))
+        return queryset
+
     def get_permissions(self):
         """
         Возвращает IsAuthenticatedOrReadOnly для list и retrieve,
@@ -70,11 +128,12 @@ class UserViewSet(DjoserUserViewSet):
         detail=False,
         url_path='me/avatar',
         permission_classes=[permissions.IsAuthenticated],
-        parser_classes=[JSONParser]
+        parser_classes=[FastJSONParser, MultiPartParser, ImageUploadParser]
     )
     def avatar(self, request, *args, **kwargs):
         """
-        PUT - загрузка аватара через Base64.
+        PUT - загрузка аватара: multipart (поле avatar), изображение
+        в теле запроса (Content-Type: image/*) или Base64 в JSON.
         DELETE - удаление аватара.
         """
 
@@ -97,7 +156,9 @@ class UserViewSet(DjoserUserViewSet):
 
         elif request.method == 'DELETE':
             if user.avatar:
-                user.avatar.delete(save=True)
+                # Ссылку на файл снимает api.signals.release_replaced_files
+                user.avatar = None
+                user.save(update_fields=('avatar',))
 
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -157,23 +218,66 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(
-            follower__user=user
-        ).prefetch_related('recipes')
+        queryset = User.objects.filter(follower__user=user)
+        if settings.FAST_SERIALIZATION_ENABLED:
+            return paginated_data(self, queryset, subscriptions_data)
+
+        fieldset = self.get_fieldset() or ALL_FIELDS
+        if fieldset.includes('recipes_count'):
+            # Meta.ordering не применяется к запросам с GROUP BY
+            queryset = queryset.annotate(
+                recipes_count=Count('recipes')
+            ).order_by(*User._meta.ordering)
+        if fieldset.includes('recipes'):
+            queryset = queryset.prefetch_related('recipes')
+        context = self.get_serializer_context()
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = SubscriptionSerializer(
-                page, many=True, context={'request': request}
+                page, many=True, context=context
             )
             return self.get_paginated_response(serializer.data)
 
         serializer = SubscriptionSerializer(
-            queryset, many=True, context={'request': request}
+            queryset, many=True, context=context
         )
         return Response(serializer.data)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='recommendations',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def recommendations(self, request):
+        """
+        Авторы, на которых стоит подписаться: на них подписаны те,
+        на кого подписан пользователь, или их рецепты у него
+        в избранном (subscriptions.recommendations).
+        """
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+        queryset = AuthorRecommendation.objects.filter(
+            user_id=request.user.pk
+        ).select_related('author').order_by('-score', 'author_id')
+        page = self.paginate_queryset(queryset)
+        serializer = UserSerializer(
+            [
+                recommendation.author
+                for recommendation in (queryset if page is None else page)
+            ],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+
+class IngredientViewSet(
+    CoalescingMixin,
+    IngredientResponseCacheMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """
     ViewSet для просмотра ингредиентов.
     Доступен всем ролям пользователей.
@@ -186,16 +290,64 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
     filter_backends = [IngredientNameSearchFilter]
     search_fields = ['^name']
+    coalesce_actions = ('list', 'retrieve')
+    coalesce_authenticated_requests = True
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    """ViewSet для управления рецептами"""
+class RecipeViewSet(
+    CoalescingMixin,
+    RecipeResponseCacheMixin,
+    FieldsetViewMixin,
+    FastRecipeListMixin,
+    viewsets.ModelViewSet
+):
+    """
+    ViewSet для управления рецептами. Форма ответа list и retrieve
+    задаётся параметрами fields, omit и expand.
+    """
+
+    coalesce_actions = ('list', 'retrieve')
 
     queryset = Recipe.objects.all()
     permission_classes = [IsAuthorOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """
+        Для list и retrieve загружаются только данные запрошенных
+        полей: автор, ингредиенты, текст и связи с текущим
+        пользователем.
+        """
+
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+
+        fieldset = self.get_fieldset() or ALL_FIELDS
+        if fieldset.includes('author') and fieldset.expands('author'):
+            queryset = queryset.select_related('author')
+        if fieldset.includes('ingredients'):
+            queryset = queryset.prefetch_related(
+                'recipe_ingredients__ingredient'
+                if fieldset.expands('ingredients') else 'recipe_ingredients'
+            )
+        if not fieldset.includes('text'):
+            queryset = queryset.defer('text')
+        user = self.request.user
+        if user.is_authenticated:
+            for name, model in (
+                ('is_favorited', Favorite),
+                ('is_in_shopping_cart', ShoppingCart),
+            ):
+                if fieldset.includes(name):
+                    queryset = queryset.annotate(**{name: Exists(
+                        model.objects.filter(
+                            user_id=user.pk, recipe=OuterRef('pk')
+                        )
+                    )})
+        return queryset
+
     def get_serializer_class(self, *args, **kwargs):
         """Выбор сериализатора в зависимости от действия"""
 
@@ -276,6 +428,62 @@ class RecipeViewSet(viewsets.ModelViewSet):
             status=status.HTTP_200_OK
         )
 
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='similar',
+        permission_classes=[permissions.AllowAny]
+    )
+    def similar(self, request, pk=None):
+        """
+        Рецепты с наиболее похожими наборами ингредиентов
+        (MinHash и LSH, recipes.similarity). Количество — параметр limit.
+        """
+
+        recipe = get_object_or_404(Recipe, pk=pk)
+        recipe_ids = similar_recipe_ids(
+            recipe.pk, self.paginator.get_page_size(request)
+        )
+        recipes = Recipe.objects.in_bulk(recipe_ids)
+        serializer = RecipeShortSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='feed',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def feed(self, request):
+        """
+        Лента новых рецептов авторов, на которых подписан пользователь.
+        Пагинация по курсору: ссылка на следующую страницу — в next.
+        """
+
+        cursor = request.query_params.get('cursor')
+        try:
+            position = decode_cursor(cursor) if cursor else None
+        except InvalidCursor as error:
+            raise ValidationError({'cursor': [str(error)]})
+
+        recipes, next_position = feed_page(
+            request.user.pk, self.paginator.get_page_size(request), position
+        )
+        next_url = None
+        if next_position is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'cursor',
+                encode_cursor(*next_position)
+            )
+        serializer = RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response({'next': next_url, 'results': serializer.data})
+
     @action(
         detail=False,
         methods=['get'],
@@ -313,6 +521,25 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return response
 
 
+class TokenLogoutView(APIView):
+    """
+    Выход для JWT: отзывает переданный refresh-токен (blacklist)
+    и access-токен текущего запроса до истечения его срока.
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        serializer = TokenLogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.validated_data['refresh'].blacklist()
+
+        if isinstance(request.auth, AccessToken):
+            revoke_access_token(request.auth)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class RecipeShortLinkRedirectView(View):
     """
     View для обработки коротких ссылок
@@ -338,3 +565,26 @@ class RecipeShortLinkRedirectView(View):
         )
 
         return redirect(absolute_frontend_url)
+
+
+class ResizedImageView(View):
+    """
+    View для копий изображений рецептов и аватаров
+    /media/r/<ширина>x<высота>/<имя файла>. Копия создаётся при первом
+    запросе и сохраняется в кэш, повторные запросы nginx отдаёт
+    из кэша сам.
+    """
+
+    def get(self, request, width, height, name):
+        try:
+            path = get_variant(width, height, name)
+        except OSError:
+            # Файл не изображение или повреждён
+            path = None
+        if path is None:
+            raise Http404('Изображение не найдено.')
+        try:
+            return FileResponse(open(path, 'rb'))
+        except FileNotFoundError:
+            # Копию удалило вытеснение
+            raise Http404('Изображение не найдено.')
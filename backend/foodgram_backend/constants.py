@@ -8,6 +8,12 @@ USER_LAST_NAME_MAX_LENGTH = 150
 RECIPE_NAME_MAX_LENGTH = 200
 MIN_COOKING_TIME_VALUE = 1
 MIN_AMOUNT_VALUE = 1
+# Вклад добавления в избранное и в список покупок в популярность рецепта
+FAVORITE_SCORE_WEIGHT = 2
+SHOPPING_CART_SCORE_WEIGHT = 1
+# Вклад подписки знакомого и рецепта в избранном в рекомендацию автора
+RECOMMENDATION_FOLLOW_WEIGHT = 1
+RECOMMENDATION_FAVORITE_WEIGHT = 1
 
 # --- Ingredients ---
 INGREDIENT_NAME_MAX_LENGTH = 200
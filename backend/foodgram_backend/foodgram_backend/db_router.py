@@ -0,0 +1,120 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+
+
+PRIMARY_DB = 'default'
+PIN_COOKIE = 'db_primary_pin'
+PIN_COOKIE_SALT = 'foodgram.db_router'
+PIN_CACHE_PREFIX = 'db-primary-pin:'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Можно ли в текущем запросе читать с реплики
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def use_primary():
+    """Временно направляет все чтения на основную БД."""
+
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replicas_enabled():
+    return bool(settings.DATABASE_REPLICAS)
+
+
+class PrimaryReplicaRouter:
+    """
+    Роутер БД: запись — всегда в default, чтение — с случайной реплики,
+    если ReplicaRoutingMiddleware разрешила это для текущего запроса.
+    Вне HTTP-запросов (команды, фоновые задачи) всё идёт в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
+
+
+def _auth_pin_key(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    if not authorization:
+        return None
+    digest = hashlib.sha256(authorization.encode()).hexdigest()
+    return f'{PIN_CACHE_PREFIX}{digest}'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик для безопасных запросов (GET, HEAD,
+    OPTIONS). Клиент, который только что успешно что-то записал,
+    на DB_PRIMARY_PIN_SECONDS закрепляется за основной БД, чтобы видеть
+    собственные изменения несмотря на задержку репликации.
+    Закрепление хранится в подписанной cookie (работает между
+    воркерами) и в кэше по заголовку Authorization (для API-клиентов
+    без cookie; между воркерами — при общем бэкенде кэша).
+    """
+
+    def __init__(self, get_response):
+        if not replicas_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.pin_seconds = settings.DB_PRIMARY_PIN_SECONDS
+
+    def __call__(self, request):
+        use_replica = (
+            request.method in SAFE_METHODS and not self._is_pinned(request)
+        )
+        token = _use_replica.set(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            self._pin(request, response)
+        return response
+
+    def _is_pinned(self, request):
+        if request.get_signed_cookie(
+            PIN_COOKIE,
+            default=None,
+            salt=PIN_COOKIE_SALT,
+            max_age=self.pin_seconds,
+        ):
+            return True
+        key = _auth_pin_key(request)
+        return key is not None and cache.get(key) is not None
+
+    def _pin(self, request, response):
+        response.set_signed_cookie(
+            PIN_COOKIE,
+            'primary',
+            salt=PIN_COOKIE_SALT,
+            max_age=self.pin_seconds,
+            httponly=True,
+            samesite='Lax',
+        )
+        key = _auth_pin_key(request)
+        if key is not None:
+            cache.set(key, True, self.pin_seconds)
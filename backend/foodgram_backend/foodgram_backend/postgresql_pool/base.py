@@ -0,0 +1,55 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from .creation import DatabaseCreation
+from .pool import get_pool
+
+
+DEFAULT_POOL_OPTIONS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 1800,
+    'HEALTH_CHECK_AFTER': 30,
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Бэкенд PostgreSQL, который берёт соединения из пула процесса
+    вместо открытия нового соединения на каждый запрос.
+    Настройки пула задаются ключом POOL в DATABASES.
+    """
+
+    creation_class = DatabaseCreation
+
+    @property
+    def pool(self):
+        options = {
+            **DEFAULT_POOL_OPTIONS,
+            **self.settings_dict.get('POOL', {}),
+        }
+        key = tuple(
+            self.settings_dict.get(name)
+            for name in ('HOST', 'PORT', 'NAME', 'USER')
+        )
+        return get_pool(key, options)
+
+    def get_new_connection(self, conn_params):
+        connection = self.pool.checkout(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+        )
+        # Родительский метод выставляет isolation_level только
+        # при открытии нового соединения
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get(
+                'isolation_level', IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
@@ -0,0 +1,12 @@
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """
+    Перед удалением тестовой БД закрывает свободные соединения пула
+    с ней: иначе PostgreSQL не даёт удалить базу.
+    """
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        self.connection.pool.close_all()
+        super()._destroy_test_db(test_database_name, verbosity)
@@ -0,0 +1,181 @@
+import atexit
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeout(OperationalError):
+    """Все соединения пула заняты дольше TIMEOUT секунд."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений psycopg2 на процесс (воркер gunicorn).
+
+    Соединения выдаются потокам, которые ASGI-обработчик Django
+    создаёт под каждый запрос, и возвращаются в пул при закрытии
+    соединения Django в конце запроса. Одновременно открыто
+    не больше max_size соединений; остальные потоки ждут до timeout.
+    Перед выдачей соединение, простоявшее дольше health_check_after
+    секунд, проверяется запросом SELECT 1; соединения старше
+    max_lifetime закрываются при возврате.
+    """
+
+    def __init__(self, max_size, timeout, max_lifetime, health_check_after):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._condition = threading.Condition()
+
+    @property
+    def idle_count(self):
+        return len(self._idle)
+
+    @property
+    def size(self):
+        return self._size
+
+    def checkout(self, connect):
+        """
+        Выдаёт свободное соединение или открывает новое через
+        connect(), если пул ещё не заполнен.
+        """
+
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            'Нет свободных соединений в пуле '
+                            f'(максимум {self.max_size}).'
+                        )
+                    self._condition.wait(remaining)
+                if self._idle:
+                    connection, released_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    connection = None
+
+            if connection is None:
+                return self._open(connect)
+            if self._is_healthy(connection, released_at):
+                return connection
+            self._discard(connection)
+
+    def checkin(self, connection):
+        """Возвращает соединение в пул или закрывает его."""
+
+        if not self._reset(connection) or self._is_expired(connection):
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        """
+        Закрывает свободные соединения. Выданные потокам соединения
+        возвращаются в пул как обычно.
+        """
+
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def _open(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def _reset(self, connection):
+        """Откатывает незавершённую транзакцию перед возвратом в пул."""
+
+        if connection.closed:
+            return False
+        try:
+            if connection.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    def _is_expired(self, connection):
+        created_at = self._created_at.get(id(connection), 0)
+        return time.monotonic() - created_at >= self.max_lifetime
+
+    def _is_healthy(self, connection, released_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - released_at < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Exception:
+            return False
+        return True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, options):
+    """
+    Возвращает пул процесса для ключа (адрес и имя БД),
+    создавая его при надобности.
+    """
+
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    max_size=options['MAX_SIZE'],
+                    timeout=options['TIMEOUT'],
+                    max_lifetime=options['MAX_LIFETIME'],
+                    health_check_after=options['HEALTH_CHECK_AFTER'],
+                )
+    return pool
+
+
+@atexit.register
+def close_pools():
+    """
+    Закрывает свободные соединения всех пулов процесса: при выходе
+    воркера, чтобы PostgreSQL не ждал разрыва соединений.
+    """
+
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
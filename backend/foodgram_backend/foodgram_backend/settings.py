@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
 
     'rest_framework',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'djoser',
     'django_filters',
 
@@ -33,17 +35,23 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'subscriptions.apps.SubscriptionsConfig',
     'recipes.apps.RecipesConfig',
+    'monitoring.apps.MonitoringConfig',
 
 ]
 
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'monitoring.middleware.QuerySamplerMiddleware',
+    'api.invalidation.InvalidationMiddleware',
+    'foodgram_backend.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram_backend.urls'
@@ -85,6 +93,119 @@ DATABASES = {
     # }
 }
 
+# Режим соединений с БД:
+# none — новое соединение на каждый запрос;
+# persistent — CONN_MAX_AGE и CONN_HEALTH_CHECKS (для синхронных
+# воркеров: под ASGI каждый запрос выполняется в новом потоке,
+# и постоянные соединения не переиспользуются);
+# pool — пул соединений в каждом воркере (для ASGI).
+DB_CONNECTION_MODE = os.getenv('DB_CONNECTION_MODE', 'pool')
+
+if DB_CONNECTION_MODE == 'persistent':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+    })
+elif DB_CONNECTION_MODE == 'pool':
+    DATABASES['default'].update({
+        'ENGINE': 'foodgram_backend.postgresql_pool',
+        'POOL': {
+            # На воркер; суммарно по воркерам не должно превышать
+            # max_connections PostgreSQL
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': int(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+            'HEALTH_CHECK_AFTER': int(
+                os.getenv('DB_POOL_HEALTH_CHECK_AFTER', 30)
+            ),
+        },
+    })
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1:5432,host2:5432.
+# Для локальной проверки можно указать адрес основной БД —
+# алиас replica_1 будет смотреть в ту же базу.
+DATABASE_REPLICAS = []
+for number, replica_host in enumerate(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')), start=1
+):
+    host, _, port = replica_host.strip().partition(':')
+    alias = f'replica_{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['foodgram_backend.db_router.PrimaryReplicaRouter']
+
+# Сколько секунд после записи клиент читает только с основной БД
+DB_PRIMARY_PIN_SECONDS = int(os.getenv('DB_PRIMARY_PIN_SECONDS', 5))
+
+# Кэши: по умолчанию — память процесса; в продакшене нужен общий
+# бэкенд (например, django.core.cache.backends.redis.RedisCache),
+# чтобы привязка к основной БД и кэш ответов были общими для воркеров.
+# Для тестов подходит FileBasedCache с каталогом в CACHE_LOCATION.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
+    'responses': {
+        'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', CACHE_BACKEND),
+        # Отдельное хранилище LocMemCache, а не то же, что у default
+        'LOCATION': os.getenv(
+            'RESPONSE_CACHE_LOCATION', CACHE_LOCATION or 'responses'
+        ),
+        'KEY_PREFIX': 'responses',
+    },
+}
+
+# Кэш ответов рецептов для анонимных пользователей и справочника
+# ингредиентов (api.cache). TIMEOUT — мягкий срок жизни, после которого
+# запись ещё STALE_TIMEOUT секунд отдаётся, пока один запрос её
+# пересчитывает, и при недоступности БД
+RESPONSE_CACHE_ENABLED = os.getenv(
+    'RESPONSE_CACHE_ENABLED', 'True'
+).lower() == 'true'
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+RESPONSE_CACHE_STALE_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_STALE_TIMEOUT', 3600)
+)
+# Блокировка пересчёта ответа и сколько секунд ждёт её запрос,
+# которому нечего отдать из кэша
+RESPONSE_CACHE_LOCK_TIMEOUT = 30
+RESPONSE_CACHE_LOCK_WAIT = 2
+# Коэффициент досрочного обновления (XFetch), 0 — отключить
+RESPONSE_CACHE_EARLY_REFRESH_BETA = float(
+    os.getenv('RESPONSE_CACHE_EARLY_REFRESH_BETA', 1)
+)
+
+# Объединение одинаковых одновременных GET-запросов в воркере
+# (api.coalescing); TIMEOUT — сколько секунд запрос ждёт чужой ответ,
+# прежде чем вычислить свой
+REQUEST_COALESCING_ENABLED = os.getenv(
+    'REQUEST_COALESCING_ENABLED', 'True'
+).lower() == 'true'
+REQUEST_COALESCING_TIMEOUT = float(
+    os.getenv('REQUEST_COALESCING_TIMEOUT', 10)
+)
+
+# Шина инвалидации локальных кэшей между воркерами (api.invalidation):
+# notify — PostgreSQL LISTEN/NOTIFY, versions — опрос счётчиков версий
+# в БД не чаще раза в CACHE_INVALIDATION_POLL_INTERVAL секунд,
+# auto — notify для PostgreSQL, иначе versions
+CACHE_INVALIDATION_BACKEND = os.getenv('CACHE_INVALIDATION_BACKEND', 'auto')
+CACHE_INVALIDATION_POLL_INTERVAL = float(
+    os.getenv('CACHE_INVALIDATION_POLL_INTERVAL', 1)
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,20 +222,87 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Хешеры паролей (users.hashers): первый в списке используется для новых
+# паролей, остальные — для проверки старых хешей. Хеш другого алгоритма
+# или с другими параметрами пересчитывается при успешном входе.
+PASSWORD_HASHER_POLICY = os.getenv('PASSWORD_HASHER_POLICY', 'pbkdf2')
+PASSWORD_HASHERS_BY_POLICY = {
+    'pbkdf2': 'users.hashers.PBKDF2PasswordHasher',
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+    'scrypt': 'users.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [
+    PASSWORD_HASHERS_BY_POLICY.pop(PASSWORD_HASHER_POLICY),
+    *PASSWORD_HASHERS_BY_POLICY.values(),
+]
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.getenv('PASSWORD_PBKDF2_ITERATIONS', 600000)
+)
+PASSWORD_ARGON2_TIME_COST = int(os.getenv('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.getenv('PASSWORD_ARGON2_MEMORY_COST', 102400)
+)
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.getenv('PASSWORD_ARGON2_PARALLELISM', 8)
+)
+PASSWORD_SCRYPT_WORK_FACTOR = int(
+    os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14)
+)
+
+# Пул потоков для хеширования паролей в каждом воркере: сколько
+# паролей хешируется одновременно, сколько ждёт в очереди и сколько
+# секунд запрос ждёт результата, прежде чем получить 503
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 1))
+PASSWORD_HASHING_QUEUE_SIZE = int(
+    os.getenv('PASSWORD_HASHING_QUEUE_SIZE', 16)
+)
+PASSWORD_HASHING_TIMEOUT = float(os.getenv('PASSWORD_HASHING_TIMEOUT', 10))
+# Значение nice для потоков пула (Linux), 0 — не менять приоритет
+PASSWORD_HASHING_NICENESS = int(os.getenv('PASSWORD_HASHING_NICENESS', 5))
+
 
 # Настройки Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.StatelessJWTAuthentication',
+        'api.authentication.TokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.FastJSONParser',
+        'api.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.CustomPageNumberPagination',
     'PAGE_SIZE': 10,
     'EXCEPTION_HANDLER': 'api.exception_handler.custom_exception_handler'
 }
 
+# Настройки JWT (api/auth/jwt/). Работают параллельно с токенами
+# djoser (api/auth/token/login/): заголовок "Bearer <access>"
+# проверяется без обращения к БД, "Token <key>" — как раньше.
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_TOKEN_MINUTES', 5))
+    ),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_TOKEN_DAYS', 7))
+    ),
+    'ROTATE_REFRESH_TOKENS': True,
+    'BLACKLIST_AFTER_ROTATION': True,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.TokenRefreshSerializer',
+}
+
 # Настройки Djoser
 DJOSER = {
     'LOGIN_FIELD': 'email',
@@ -151,3 +339,145 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Сборщик статистики SQL-запросов (monitoring.query_sampler)
+QUERY_SAMPLER_ENABLED = os.getenv(
+    'QUERY_SAMPLER_ENABLED', 'True'
+).lower() == 'true'
+# Порог, начиная с которого для запроса сохраняется образец стека
+QUERY_SAMPLER_SLOW_MS = float(os.getenv('QUERY_SAMPLER_SLOW_MS', 100))
+QUERY_SAMPLER_MAX_FINGERPRINTS = 1000
+QUERY_SAMPLER_DIR = os.getenv(
+    'QUERY_SAMPLER_DIR', BASE_DIR / 'var/query_sampler'
+)
+QUERY_SAMPLER_FLUSH_INTERVAL = 10
+
+# Метрики Prometheus (monitoring.metrics), эндпоинт /metrics.
+# Для агрегации по воркерам gunicorn нужна переменная окружения
+# PROMETHEUS_MULTIPROC_DIR (см. gunicorn.conf.py и Dockerfile).
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+
+# Профилирование запросов staff-пользователей по заголовку X-Profile
+# или параметру ?_profile (monitoring.profiling)
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True').lower() == 'true'
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'var/profiles')
+PROFILING_MAX_FILES = 50
+PROFILING_TOP_LIMIT = 20
+
+# Период полураспада рейтинга рецептов в трендах (recipes.popularity)
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+
+# Лента подписок (subscriptions.feed): авторам с большим числом
+# подписчиков рецепты не рассылаются по лентам, а подмешиваются
+# при чтении; при подписке в ленту добавляются последние рецепты автора
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 1000)
+)
+FEED_BACKFILL_PER_AUTHOR = 50
+FEED_BATCH_SIZE = 1000
+
+# Поиск рецептов по ингредиентам (api.ingredient_index): доля
+# ингредиентов рецепта, которые должны быть в наличии, для match=coverage
+INGREDIENT_MATCH_MIN_COVERAGE = float(
+    os.getenv('INGREDIENT_MATCH_MIN_COVERAGE', 0.75)
+)
+
+# Похожие рецепты (recipes.similarity): MinHash-сигнатура из
+# MINHASH_PERMUTATIONS значений делится на MINHASH_BANDS полос LSH
+# (должно делиться нацело). После изменения нужно выполнить
+# rebuild_similarity
+MINHASH_PERMUTATIONS = int(os.getenv('MINHASH_PERMUTATIONS', 64))
+MINHASH_BANDS = int(os.getenv('MINHASH_BANDS', 16))
+SIMILAR_RECIPES_MAX_CANDIDATES = 1000
+SIMILARITY_REBUILD_BATCH_SIZE = 500
+
+# Рекомендации авторов (subscriptions.recommendations): сколько
+# авторов хранить для пользователя и скольким подписчикам автора
+# пересчитывать рекомендации сразу после его новой подписки
+# (остальным — при запуске update_recommendations)
+AUTHOR_RECOMMENDATIONS_LIMIT = 20
+AUTHOR_RECOMMENDATIONS_REFRESH_MAX_FOLLOWERS = 100
+AUTHOR_RECOMMENDATIONS_BATCH_SIZE = 500
+
+# Списки рецептов и подписок собираются из values() без сериализаторов
+# DRF (api.fast_serializers); ответ совпадает байт в байт
+FAST_SERIALIZATION_ENABLED = os.getenv(
+    'FAST_SERIALIZATION_ENABLED', 'True'
+).lower() == 'true'
+
+# JSON кодируется и разбирается orjson, если он установлен
+# (api.renderers, api.parsers); ответ совпадает со стандартным json,
+# кроме NaN и Infinity (orjson пишет null, json — ошибка)
+FAST_JSON_ENABLED = os.getenv('FAST_JSON_ENABLED', 'True').lower() == 'true'
+
+# Загрузка изображений (api.uploads): файлы из multipart-запросов
+# и тела запроса пишутся во временные файлы частями, загрузка больше
+# IMAGE_UPLOAD_MAX_SIZE байт прерывается (client_max_body_size в nginx
+# должен быть не меньше). FILE_UPLOAD_MAX_MEMORY_SIZE ограничивает
+# и буфер тела запроса в памяти под ASGI
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 2 ** 20)
+)
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv('FILE_UPLOAD_MAX_MEMORY_SIZE', 256 * 2 ** 10)
+)
+FILE_UPLOAD_HANDLERS = [
+    'api.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Медиафайлы хранятся по хешу содержимого (api.storage): одинаковые
+# файлы — один раз, с подсчётом ссылок в api.StoredFile. Файлы,
+# загруженные раньше, переносит команда dedupe_media
+STORAGES = {
+    'default': {
+        'BACKEND': 'api.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Удаление медиафайлов без ссылок (команда clean_media): файлы моложе
+# MEDIA_GC_GRACE_HOURS часов не трогаются, с --quarantine файлы
+# переносятся в MEDIA_GC_QUARANTINE_DIR и удаляются оттуда через
+# MEDIA_GC_QUARANTINE_DAYS дней
+MEDIA_GC_GRACE_HOURS = float(os.getenv('MEDIA_GC_GRACE_HOURS', 24))
+MEDIA_GC_QUARANTINE_DIR = os.getenv(
+    'MEDIA_GC_QUARANTINE_DIR', MEDIA_ROOT / '.quarantine'
+)
+MEDIA_GC_QUARANTINE_DAYS = float(os.getenv('MEDIA_GC_QUARANTINE_DAYS', 30))
+
+# Перекодирование изображений (команда reencode_media): формат
+# и наибольшая сторона, позиция прерванного запуска хранится
+# в MEDIA_REENCODE_CHECKPOINT
+MEDIA_REENCODE_FORMAT = os.getenv('MEDIA_REENCODE_FORMAT', 'WEBP')
+MEDIA_REENCODE_MAX_SIZE = int(os.getenv('MEDIA_REENCODE_MAX_SIZE', 1600))
+MEDIA_REENCODE_QUALITY = int(os.getenv('MEDIA_REENCODE_QUALITY', 85))
+MEDIA_REENCODE_BATCH_SIZE = 100
+MEDIA_REENCODE_MAX_MB_PER_SECOND = float(
+    os.getenv('MEDIA_REENCODE_MAX_MB_PER_SECOND', 50)
+)
+MEDIA_REENCODE_CHECKPOINT = os.getenv(
+    'MEDIA_REENCODE_CHECKPOINT', BASE_DIR / 'var/reencode_media.json'
+)
+
+# Копии изображений нужных размеров (api.resize):
+# /media/r/<ширина>x<высота>/<имя файла>, высота 0 — с сохранением
+# пропорций. Копии создаются при первом запросе в MEDIA_ROOT/r,
+# дальше их отдаёт nginx. Давно не читавшиеся (по atime) копии
+# удаляет команда evict_resized_images, когда кэш больше
+# IMAGE_RESIZE_CACHE_MAX_SIZE байт
+IMAGE_RESIZE_DIR = 'r'
+IMAGE_RESIZE_SIZES = os.getenv(
+    'IMAGE_RESIZE_SIZES', '160x160,320x320,640x480,1280x0'
+).split(',')
+IMAGE_RESIZE_QUALITY = int(os.getenv('IMAGE_RESIZE_QUALITY', 85))
+IMAGE_RESIZE_CACHE_MAX_SIZE = int(
+    os.getenv('IMAGE_RESIZE_CACHE_MAX_SIZE', 2 * 2 ** 30)
+)
+
+# Тесты запускаются с foodgram_backend.test_runner: он останавливает
+# шину инвалидации до удаления тестовой БД
+TEST_RUNNER = 'foodgram_backend.test_runner.TestRunner'
@@ -0,0 +1,15 @@
+from django.test.runner import DiscoverRunner
+
+from api.invalidation import stop_bus
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Останавливает шину инвалидации перед удалением тестовых БД:
+    поток LISTEN держит соединение с тестовой базой, и PostgreSQL
+    не даёт её удалить.
+    """
+
+    def teardown_databases(self, old_config, **kwargs):
+        stop_bus()
+        super().teardown_databases(old_config, **kwargs)
@@ -3,10 +3,31 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from api.views import RecipeShortLinkRedirectView
+from api.views import RecipeShortLinkRedirectView, ResizedImageView
+from monitoring.views import (
+    ProfileListView,
+    SlowQueriesView,
+    metrics_view,
+    profile_download_view
+)
 
 
 urlpatterns = [
+    path(
+        'admin/slow-queries/',
+        SlowQueriesView.as_view(),
+        name='slow_queries'
+    ),
+    path(
+        'admin/profiles/',
+        ProfileListView.as_view(),
+        name='profiles'
+    ),
+    path(
+        'admin/profiles/<slug:profile_id>/',
+        profile_download_view,
+        name='profile_download'
+    ),
     path('admin/', admin.site.urls),
 
     path(
@@ -15,6 +36,15 @@ urlpatterns = [
         name='short_link_redirect'
     ),
 
+    path(
+        f'{settings.MEDIA_URL.lstrip("/")}{settings.IMAGE_RESIZE_DIR}/'
+        '<int:width>x<int:height>/<path:name>',
+        ResizedImageView.as_view(),
+        name='resized_image'
+    ),
+
+    path('metrics', metrics_view, name='metrics'),
+
     path('api/auth/', include('djoser.urls.authtoken')),
     path('api/', include('api.urls')),
 
@@ -0,0 +1,102 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.postgresql.base import (
+    DatabaseWrapper as PostgresDatabaseWrapper
+)
+
+from foodgram_backend.postgresql_pool.base import (
+    DatabaseWrapper as PooledDatabaseWrapper
+)
+
+
+class Command(BaseCommand):
+    """
+    Management команда для сравнения накладных расходов на соединение
+    с БД: новое соединение на каждый запрос против пула.
+
+    Каждый «запрос» моделирует то, что делает ASGI-обработчик Django:
+    в новом потоке создаётся свой DatabaseWrapper, выполняется запрос
+    и соединение закрывается в конце.
+    """
+    help = 'Сравнивает задержку запроса без пула и с пулом соединений'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Количество моделируемых запросов на режим.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Количество одновременно выполняемых запросов.',
+        )
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Алиас БД из DATABASES.',
+        )
+        parser.add_argument(
+            '--query',
+            default='SELECT 1',
+            help='SQL-запрос, выполняемый в каждом запросе.',
+        )
+
+    def handle(self, *args, **options):
+        settings_dict = connections[options['database']].settings_dict
+        modes = (
+            ('без пула', PostgresDatabaseWrapper),
+            ('пул', PooledDatabaseWrapper),
+        )
+        results = {}
+        for label, wrapper_class in modes:
+            results[label] = self._run(
+                wrapper_class, settings_dict, options
+            )
+            self._write_stats(label, results[label])
+
+        saved = (
+            statistics.mean(results['без пула'])
+            - statistics.mean(results['пул'])
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Экономия на запрос (среднее): {saved * 1000:.2f} мс'
+        ))
+
+    def _run(self, wrapper_class, settings_dict, options):
+        query = options['query']
+
+        def simulate_request(_):
+            started = time.perf_counter()
+            connection = wrapper_class(
+                {**settings_dict, 'CONN_MAX_AGE': 0}, alias='benchmark'
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                cursor.fetchall()
+            connection.close()
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            # Прогрев: пул заполняется до размера concurrency
+            list(executor.map(simulate_request, range(
+                options['concurrency']
+            )))
+            return list(executor.map(
+                simulate_request, range(options['requests'])
+            ))
+
+    def _write_stats(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f'{label}: среднее {statistics.mean(timings) * 1000:.2f} мс, '
+            f'медиана {statistics.median(timings) * 1000:.2f} мс, '
+            f'p95 {p95 * 1000:.2f} мс'
+        )
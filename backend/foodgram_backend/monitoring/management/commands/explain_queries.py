@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from monitoring import query_audit
+
+
+class Command(BaseCommand):
+    """
+    Management команда для проверки планов горячих запросов:
+    выполняет EXPLAIN (ANALYZE, BUFFERS) для каталога запросов
+    monitoring.query_audit и отмечает последовательные чтения таблиц
+    и сортировки. С --seed запросы выполняются на синтетических данных,
+    которые удаляются откатом транзакции.
+    """
+    help = 'Ищет Seq Scan и Sort в планах горячих запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help=(
+                'Сколько синтетических пользователей (с рецептами, '
+                'избранным и подписками) создать перед проверкой.'
+            ),
+        )
+        parser.add_argument(
+            '--min-rows',
+            type=int,
+            default=1000,
+            help='Не отмечать узлы, обработавшие меньше строк.',
+        )
+        parser.add_argument(
+            '--plans',
+            action='store_true',
+            help='Выводить планы целиком.',
+        )
+        parser.add_argument(
+            '--fail',
+            action='store_true',
+            help='Завершиться с ошибкой, если найдены проблемы (для CI).',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError(
+                'EXPLAIN (ANALYZE, BUFFERS) есть только в PostgreSQL.'
+            )
+
+        with transaction.atomic():
+            if options['seed']:
+                query_audit.seed(options['seed'])
+            problems = self._audit(options)
+            transaction.set_rollback(True)
+
+        if problems:
+            message = f'Запросов с проблемами: {problems}'
+            if options['fail']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('Проблем не найдено.'))
+
+    def _audit(self, options):
+        problems = 0
+        for name, queryset in query_audit.catalogue():
+            result = query_audit.explain(queryset)
+            plan = result['Plan']
+            found = query_audit.findings(plan, options['min_rows'])
+            problems += bool(found)
+
+            self.stdout.write(self.style.SQL_KEYWORD(name))
+            self.stdout.write(
+                f"  {result['Execution Time']:.2f} мс, буферы: "
+                f"hit {plan.get('Shared Hit Blocks', 0)}, "
+                f"read {plan.get('Shared Read Blocks', 0)}"
+            )
+            for finding in found:
+                self.stdout.write(self.style.WARNING(f'  {finding}'))
+            if options['plans']:
+                self.stdout.write(queryset.explain(analyze=True))
+        return problems
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitoring.query_sampler import (
+    load_snapshots, merge_snapshots, request_reset, top_queries
+)
+
+
+class Command(BaseCommand):
+    """
+    Management команда для вывода статистики SQL-запросов,
+    которую воркеры сбрасывают в QUERY_SAMPLER_DIR.
+    """
+    help = 'Выводит самые тяжёлые SQL-запросы по отпечаткам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько отпечатков вывести.',
+        )
+        parser.add_argument(
+            '--order',
+            choices=('total', 'max', 'count'),
+            default='total',
+            help='Поле для сортировки.',
+        )
+        parser.add_argument(
+            '--view',
+            help='Учитывать только вызовы из указанного view.',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Обнулить статистику во всех воркерах.',
+        )
+
+    def handle(self, *args, **options):
+        snapshot_dir = settings.QUERY_SAMPLER_DIR
+
+        if options['reset']:
+            request_reset(snapshot_dir)
+            self.stdout.write(self.style.SUCCESS('Статистика сброшена.'))
+            return
+
+        stats = merge_snapshots(load_snapshots(snapshot_dir))
+        rows = top_queries(
+            stats, options['limit'], options['order'], options['view']
+        )
+        if not rows:
+            self.stdout.write(self.style.WARNING(
+                f'Нет данных в "{snapshot_dir}".'
+            ))
+            return
+
+        for row in rows:
+            self.stdout.write(self.style.SQL_KEYWORD(row['fingerprint']))
+            self.stdout.write(
+                f"  кол-во: {row['count']}, "
+                f"всего: {row['total_ms']:.1f} мс, "
+                f"среднее: {row['avg_ms']:.2f} мс, "
+                f"макс.: {row['max_ms']:.1f} мс"
+            )
+            for view_name, timing in row['views']:
+                self.stdout.write(
+                    f"  {view_name}: {timing['count']} раз, "
+                    f"{timing['total'] * 1000:.1f} мс"
+                )
+            sample = row['sample']
+            if sample:
+                self.stdout.write(
+                    f"  образец стека ({sample['duration'] * 1000:.1f} мс, "
+                    f"{sample['view']}):"
+                )
+                for frame in sample['stack']:
+                    self.stdout.write(f'    {frame}')
+            self.stdout.write('')
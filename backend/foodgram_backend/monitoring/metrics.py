@@ -0,0 +1,98 @@
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+
+# Маршрут для запросов, не сопоставленных ни с одним URL
+UNMATCHED_ROUTE = '<unmatched>'
+# Исходы обращения к кэшу
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+CACHE_STALE = 'stale'
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки HTTP-запроса',
+    ['method', 'route'],
+)
+REQUESTS_TOTAL = Counter(
+    'foodgram_http_requests_total',
+    'Количество HTTP-запросов по маршрутам и кодам ответа',
+    ['method', 'route', 'status'],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'foodgram_http_requests_in_flight',
+    'Количество запросов, обрабатываемых в данный момент',
+    multiprocess_mode='livesum',
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Количество SQL-запросов на один HTTP-запрос',
+    ['route'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшам приложения (result: hit, stale или miss)',
+    ['cache', 'result'],
+)
+
+COALESCED_REQUESTS = Counter(
+    'foodgram_coalesced_requests_total',
+    'Запросы, объединённые с одинаковыми одновременными запросами '
+    '(role: leader вычислил ответ, follower получил его копию)',
+    ['view', 'role'],
+)
+PASSWORD_HASHING_IN_PROGRESS = Gauge(
+    'foodgram_password_hashing_in_progress',
+    'Количество паролей, хешируемых в данный момент',
+    multiprocess_mode='livesum',
+)
+PASSWORD_HASHING_QUEUED = Gauge(
+    'foodgram_password_hashing_queued',
+    'Количество паролей в очереди на хеширование',
+    multiprocess_mode='livesum',
+)
+PASSWORD_HASHING_WAIT = Histogram(
+    'foodgram_password_hashing_wait_seconds',
+    'Время ожидания в очереди на хеширование пароля',
+)
+PASSWORD_HASHING_DURATION = Histogram(
+    'foodgram_password_hashing_duration_seconds',
+    'Время хеширования пароля',
+    ['algorithm'],
+)
+PASSWORD_HASHING_REJECTED = Counter(
+    'foodgram_password_hashing_rejected_total',
+    'Запросы, отклонённые из-за переполненной очереди хеширования',
+)
+
+
+def record_cache(cache_name, result):
+    """Учитывает обращение к кэшу cache_name с исходом result."""
+
+    CACHE_REQUESTS.labels(cache_name, result).inc()
+
+
+def render_metrics():
+    """
+    Возвращает метрики в текстовом формате Prometheus и content type.
+    При заданной PROMETHEUS_MULTIPROC_DIR значения собираются из файлов
+    всех воркеров gunicorn, иначе — только текущего процесса.
+    """
+
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
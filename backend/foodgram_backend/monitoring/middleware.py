@@ -0,0 +1,154 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import metrics, profiling
+from .query_sampler import current_view, get_sampler
+
+
+class QuerySamplerMiddleware:
+    """
+    Оборачивает выполнение SQL на всех соединениях запроса
+    в QuerySampler и помечает запросы именем view.
+    При QUERY_SAMPLER_ENABLED = False отключается полностью.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_SAMPLER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sampler = get_sampler()
+
+    def __call__(self, request):
+        token = current_view.set(request.path)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(self.sampler)
+                    )
+                return self.get_response(request)
+        finally:
+            current_view.reset(token)
+            self.sampler.maybe_flush()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        current_view.set(match.view_name if match else request.path)
+
+
+class QueryCounter:
+    """execute_wrapper, считающий SQL-запросы в рамках HTTP-запроса."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Собирает метрики Prometheus: время ответа и коды статусов
+    по маршрутам, количество SQL-запросов и число запросов в работе.
+    Маршрутом считается имя URL (view_name), чтобы не плодить метки
+    на каждый id в пути.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        metrics.REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                response = self.get_response(request)
+        finally:
+            metrics.REQUESTS_IN_FLIGHT.dec()
+
+        match = request.resolver_match
+        route = match.view_name if match else metrics.UNMATCHED_ROUTE
+        metrics.REQUEST_LATENCY.labels(request.method, route).observe(
+            time.perf_counter() - started
+        )
+        metrics.REQUESTS_TOTAL.labels(
+            request.method, route, response.status_code
+        ).inc()
+        metrics.DB_QUERIES.labels(route).observe(counter.count)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует отдельный запрос staff-пользователя под cProfile
+    и tracemalloc, если передан заголовок X-Profile или параметр
+    ?_profile. Профиль сохраняется в PROFILING_DIR, сводка
+    возвращается в заголовках X-Profile-* и видна в админке.
+    Обычные запросы проходят без какой-либо дополнительной работы.
+    """
+
+    QUERY_PARAM = '_profile'
+    HEADER = 'HTTP_X_PROFILE'
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (
+            self.HEADER not in request.META
+            and self.QUERY_PARAM not in request.GET
+        ):
+            return self.get_response(request)
+
+        user = self._get_staff_user(request)
+        if user is None or not profiling.try_acquire():
+            return self.get_response(request)
+
+        try:
+            with profiling.RequestProfile(request, user) as profile:
+                response = self.get_response(request)
+        finally:
+            profiling.release()
+
+        for header, value in profile.headers().items():
+            response[header] = value
+        return response
+
+    def _get_staff_user(self, request):
+        """
+        Определяет пользователя по сессии или, как это сделает DRF,
+        по классам аутентификации API. Возвращает его, только если
+        он staff.
+        """
+
+        user = request.user
+        if not user.is_authenticated:
+            drf_request = Request(request)
+            for authenticator_class in (
+                api_settings.DEFAULT_AUTHENTICATION_CLASSES
+            ):
+                try:
+                    result = authenticator_class().authenticate(drf_request)
+                except APIException:
+                    return None
+                if result is not None:
+                    user = result[0]
+                    break
+        if user.is_authenticated and user.is_staff:
+            return user
+        return None
@@ -0,0 +1,194 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import sysconfig
+import threading
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SUFFIX = '.prof'
+SUMMARY_SUFFIX = '.json'
+
+# Сколько кадров хранить tracemalloc для мест аллокаций
+TRACEMALLOC_FRAMES = 5
+
+# tracemalloc глобален для процесса, поэтому одновременно
+# профилируется только один запрос на воркер
+_profiling_lock = threading.Lock()
+
+
+def _function_label(func):
+    filename, lineno, name = func
+    base_dir = str(settings.BASE_DIR)
+    stdlib_dir = sysconfig.get_paths()['stdlib']
+    if 'site-packages/' in filename:
+        filename = filename.rpartition('site-packages/')[2]
+    elif filename.startswith(base_dir):
+        filename = filename[len(base_dir) + 1:]
+    elif filename.startswith(stdlib_dir):
+        filename = filename[len(stdlib_dir) + 1:]
+    return f'{filename}:{lineno}({name})'
+
+
+def _top_functions(profiler, limit):
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    rows = []
+    for func, (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': _function_label(func),
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['tottime_ms'], reverse=True)
+    return rows[:limit]
+
+
+def _top_allocations(snapshot, limit):
+    rows = []
+    for stat in snapshot.statistics('lineno')[:limit]:
+        frame = stat.traceback[0]
+        rows.append({
+            'location': _function_label((frame.filename, frame.lineno, '')),
+            'size_kb': round(stat.size / 1024, 1),
+            'count': stat.count,
+        })
+    return rows
+
+
+class RequestProfile:
+    """
+    Профиль одного запроса: cProfile по функциям и tracemalloc
+    по местам аллокаций. Используется как контекстный менеджер.
+    """
+
+    def __init__(self, request, user):
+        self.request = request
+        self.user = user
+        self.profile_id = (
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        )
+        self.profiler = cProfile.Profile()
+        self.summary = None
+
+    def __enter__(self):
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        self._started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.disable()
+        total = time.perf_counter() - self._started
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        limit = settings.PROFILING_TOP_LIMIT
+        self.summary = {
+            'id': self.profile_id,
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'user': str(self.user),
+            'created': time.time(),
+            'total_ms': round(total * 1000, 3),
+            'peak_memory_kb': round(peak / 1024, 1),
+            'functions': _top_functions(self.profiler, limit),
+            'allocations': _top_allocations(snapshot, limit),
+        }
+        try:
+            self._save()
+        except OSError:
+            # Профиль не должен ломать сам запрос
+            logger.exception(
+                'Не удалось сохранить профиль %s', self.profile_id
+            )
+        return False
+
+    def _save(self):
+        profile_dir = Path(settings.PROFILING_DIR)
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(
+            profile_dir / f'{self.profile_id}{PROFILE_SUFFIX}'
+        )
+        with open(
+            profile_dir / f'{self.profile_id}{SUMMARY_SUFFIX}', 'w',
+            encoding='utf-8'
+        ) as file:
+            json.dump(self.summary, file, ensure_ascii=False)
+        _prune(profile_dir)
+
+    def headers(self):
+        """Краткая сводка для заголовков ответа (только ASCII)."""
+
+        functions = ', '.join(
+            f"{row['function']}={row['tottime_ms']}ms"
+            for row in self.summary['functions'][:3]
+        )
+        allocations = ', '.join(
+            f"{row['location']}={row['size_kb']}KB"
+            for row in self.summary['allocations'][:3]
+        )
+        headers = {
+            'X-Profile-Id': self.profile_id,
+            'X-Profile-Total-Ms': str(self.summary['total_ms']),
+            'X-Profile-Peak-Memory-Kb': str(
+                self.summary['peak_memory_kb']
+            ),
+            'X-Profile-Top-Functions': functions,
+            'X-Profile-Top-Allocations': allocations,
+        }
+        return {
+            header: value.encode('ascii', 'replace').decode('ascii')
+            for header, value in headers.items()
+        }
+
+
+def try_acquire():
+    return _profiling_lock.acquire(blocking=False)
+
+
+def release():
+    _profiling_lock.release()
+
+
+def _prune(profile_dir):
+    """Оставляет на диске только PROFILING_MAX_FILES последних профилей."""
+
+    summaries = sorted(profile_dir.glob(f'*{SUMMARY_SUFFIX}'))
+    for summary_path in summaries[:-settings.PROFILING_MAX_FILES]:
+        summary_path.unlink(missing_ok=True)
+        summary_path.with_suffix(PROFILE_SUFFIX).unlink(missing_ok=True)
+
+
+def list_profiles():
+    """Сводки сохранённых профилей, от новых к старым."""
+
+    profiles = []
+    profile_dir = Path(settings.PROFILING_DIR)
+    for path in sorted(profile_dir.glob(f'*{SUMMARY_SUFFIX}'), reverse=True):
+        try:
+            with open(path, encoding='utf-8') as file:
+                profiles.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id):
+    """Путь к файлу .prof или None, если профиль не найден."""
+
+    profile_dir = Path(settings.PROFILING_DIR)
+    path = profile_dir / f'{profile_id}{PROFILE_SUFFIX}'
+    if path.parent != profile_dir or not path.is_file():
+        return None
+    return path
@@ -0,0 +1,284 @@
+import json
+import random
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count, Sum
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from recipes.popularity import MIN_TRENDING_SCORE
+from subscriptions.models import Subscription, TimelineEntry
+
+
+User = get_user_model()
+
+SEQ_SCAN_NODES = ('Seq Scan',)
+SORT_NODES = ('Sort', 'Incremental Sort')
+SEED_PREFIX = 'explain-seed'
+SEED_RECIPES_PER_USER = 5
+SEED_INGREDIENTS_PER_RECIPE = 8
+SEED_FAVORITES_PER_USER = 10
+SEED_CART_PER_USER = 5
+SEED_SUBSCRIPTIONS_PER_USER = 10
+SEED_INGREDIENTS = 500
+# У первого синтетического пользователя столько рецептов, избранного,
+# покупок и подписок, и на него подписаны все остальные: планы
+# запросов для «тяжёлых» пользователей отличаются от средних
+SEED_HEAVY_ROWS = 2000
+SEED_TRENDING_SHARE = 0.05
+SEED_BATCH_SIZE = 5000
+
+
+def seed(users, rng_seed=0):
+    """
+    Заполняет БД синтетическими пользователями, рецептами и связями
+    между ними (без сигналов). Вызывается внутри транзакции, которую
+    потом откатывают.
+    """
+
+    rng = random.Random(rng_seed)
+    User.objects.bulk_create(
+        [
+            User(
+                email=f'{SEED_PREFIX}-{number}@example.com',
+                username=f'{SEED_PREFIX}-{number}',
+                first_name='Seed',
+                last_name='User',
+                password='!',
+            )
+            for number in range(users)
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    user_ids = list(User.objects.filter(
+        username__startswith=SEED_PREFIX
+    ).order_by('pk').values_list('pk', flat=True))
+    heavy = user_ids[0]
+
+    if Ingredient.objects.count() < SEED_INGREDIENTS:
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(
+                    name=f'{SEED_PREFIX}-{number}', measurement_unit='г'
+                )
+                for number in range(SEED_INGREDIENTS)
+            ],
+            batch_size=SEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+    ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+
+    Recipe.objects.bulk_create(
+        [
+            Recipe(
+                author_id=author_id,
+                name=f'{SEED_PREFIX}-{number}',
+                image='recipes/seed.png',
+                text='Seed',
+                cooking_time=rng.randint(1, 120),
+                # Рейтинг в трендах есть только у свежих рецептов
+                trending_score=(
+                    rng.random() * 10
+                    if rng.random() < SEED_TRENDING_SHARE else 0
+                ),
+            )
+            for number, author_id in enumerate(
+                [heavy] * SEED_HEAVY_ROWS
+                + user_ids * SEED_RECIPES_PER_USER
+            )
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    recipe_ids = list(Recipe.objects.filter(
+        author_id__in=user_ids
+    ).values_list('pk', flat=True))
+
+    def sample(population, size, always=()):
+        return {*always, *rng.sample(population, min(size, len(population)))}
+
+    # Первый ингредиент есть во всех рецептах
+    RecipeIngredient.objects.bulk_create(
+        [
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id, amount=1
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in sample(
+                ingredient_ids[1:], SEED_INGREDIENTS_PER_RECIPE - 1,
+                always=ingredient_ids[:1]
+            )
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    for model, per_user in (
+        (Favorite, SEED_FAVORITES_PER_USER),
+        (ShoppingCart, SEED_CART_PER_USER),
+    ):
+        model.objects.bulk_create(
+            [
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in sample(
+                    recipe_ids,
+                    SEED_HEAVY_ROWS if user_id == heavy else per_user
+                )
+            ],
+            batch_size=SEED_BATCH_SIZE,
+        )
+    Subscription.objects.bulk_create(
+        [
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in sample(
+                user_ids,
+                SEED_HEAVY_ROWS if user_id == heavy
+                else SEED_SUBSCRIPTIONS_PER_USER,
+                always=[heavy]
+            )
+            if author_id != user_id
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def _busiest(queryset, field):
+    """Значение field, у которого больше всего строк в queryset."""
+
+    return queryset.values(field).annotate(
+        rows=Count('pk')
+    ).order_by('-rows').values_list(field, flat=True).first()
+
+
+def catalogue():
+    """
+    Горячие запросы проекта в том виде, в каком их строят view,
+    сериализаторы и фоновые задачи: список пар (название, queryset).
+    Параметры берутся у самых «тяжёлых» объектов в БД.
+    """
+
+    fan = _busiest(Favorite.objects, 'user')
+    buyer = _busiest(ShoppingCart.objects, 'user')
+    author = _busiest(Recipe.objects, 'author')
+    followed = _busiest(Subscription.objects, 'author')
+    follower = _busiest(Subscription.objects, 'user')
+    ingredient = _busiest(RecipeIngredient.objects, 'ingredient')
+    return [
+        ('Лента рецептов', Recipe.objects.all()[:10]),
+        (
+            'Избранное пользователя',
+            Favorite.objects.filter(user_id=fan)[:10],
+        ),
+        (
+            'Рецепты в избранном (?is_favorited=1)',
+            Recipe.objects.filter(favorited_by__user_id=fan)[:10],
+        ),
+        (
+            'Список покупок пользователя',
+            ShoppingCart.objects.filter(user_id=buyer)[:10],
+        ),
+        (
+            'Скачивание списка покупок',
+            RecipeIngredient.objects.filter(
+                recipe__in_shopping_cart__user_id=buyer
+            ).values(
+                'ingredient__name', 'ingredient__measurement_unit'
+            ).annotate(total_amount=Sum('amount')).order_by(
+                'ingredient__name'
+            ),
+        ),
+        (
+            'Рецепты автора (?author=, подписки)',
+            Recipe.objects.filter(author_id=author)[:10],
+        ),
+        (
+            'Последние рецепты автора для ленты',
+            Recipe.objects.filter(author_id=author).order_by(
+                '-pub_date', '-id'
+            ).values_list('id', 'pub_date')[:50],
+        ),
+        (
+            'Подписчики автора',
+            Subscription.objects.filter(
+                author_id=followed
+            ).order_by().values_list('user_id', flat=True),
+        ),
+        (
+            'Подписки пользователя',
+            User.objects.filter(follower__user_id=follower)[:10],
+        ),
+        (
+            'Лента подписок',
+            TimelineEntry.objects.filter(user_id=follower).order_by(
+                '-pub_date', '-recipe_id'
+            )[:11],
+        ),
+        (
+            'Проверка PROTECT при удалении ингредиента',
+            RecipeIngredient.objects.filter(ingredient_id__in=[ingredient]),
+        ),
+        (
+            'Популярные рецепты',
+            Recipe.objects.order_by('-popularity', '-id')[:10],
+        ),
+        (
+            'Затухание трендов',
+            Recipe.objects.filter(
+                trending_score__gte=MIN_TRENDING_SCORE
+            ).order_by().values_list('id', flat=True),
+        ),
+    ]
+
+
+def _walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _walk(child)
+
+
+def _rows(node):
+    return node.get('Actual Rows', 0) * node.get('Actual Loops', 1)
+
+
+def findings(plan, min_rows):
+    """
+    Проблемные узлы плана: последовательное чтение таблицы
+    и сортировка не меньше min_rows строк.
+    """
+
+    found = []
+    for node in _walk(plan):
+        node_type = node['Node Type']
+        if node_type in SEQ_SCAN_NODES:
+            scanned = _rows(node) + node.get(
+                'Rows Removed by Filter', 0
+            ) * node.get('Actual Loops', 1)
+            if scanned >= min_rows:
+                found.append(
+                    f"{node_type} on {node['Relation Name']} "
+                    f'({scanned:.0f} строк)'
+                )
+        elif node_type in SORT_NODES:
+            sorted_rows = sum(map(_rows, node.get('Plans', ())))
+            if sorted_rows >= min_rows:
+                found.append(
+                    f"{node_type} by {', '.join(node['Sort Key'])} "
+                    f'({sorted_rows:.0f} строк)'
+                )
+    return found
+
+
+def explain(queryset):
+    """Выполняет EXPLAIN (ANALYZE, BUFFERS) и возвращает план в JSON."""
+
+    return json.loads(
+        queryset.explain(analyze=True, buffers=True, format='json')
+    )[0]
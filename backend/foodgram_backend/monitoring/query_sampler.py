@@ -0,0 +1,315 @@
+import json
+import os
+import re
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+
+
+# Имя view, в рамках которого сейчас выполняется запрос к БД
+current_view = ContextVar('current_view', default=None)
+
+NO_VIEW = '<вне запроса>'
+SNAPSHOT_SUFFIX = '.json'
+RESET_MARKER = 'RESET'
+# Сколько ближайших к ORM кадров сохранять в образце стека
+STACK_CALLER_FRAMES = 4
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|\?')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_VALUES_LIST_RE = re.compile(r'VALUES\s*\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))*')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Нормализует SQL в отпечаток: литералы и плейсхолдеры заменяются
+    на ?, списки IN (...) и VALUES схлопываются, пробелы сжимаются.
+    Запросы, отличающиеся только параметрами, дают один отпечаток.
+    """
+
+    sql = _STRING_LITERAL_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(...)', sql)
+    sql = _VALUES_LIST_RE.sub('VALUES (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def _short_path(filename, base_dir):
+    if filename.startswith(base_dir) and 'site-packages' not in filename:
+        return os.path.relpath(filename, base_dir)
+    _, _, tail = filename.rpartition('site-packages' + os.sep)
+    return tail or filename
+
+
+def _sample_stack():
+    """
+    Возвращает образец стека для медленного запроса: все кадры кода
+    проекта и несколько ближайших к ORM кадров сторонних библиотек
+    (например, поле DRF, которое сделало ленивый запрос).
+    """
+
+    base_dir = str(settings.BASE_DIR)
+    own_dir = os.path.dirname(__file__)
+    orm_dir = os.path.join('django', 'db') + os.sep
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if os.path.dirname(frame.filename) != own_dir
+        and orm_dir not in frame.filename
+    ]
+    innermost = frames[-STACK_CALLER_FRAMES:]
+    sample = []
+    for frame in frames:
+        is_project = (
+            frame.filename.startswith(base_dir)
+            and 'site-packages' not in frame.filename
+        )
+        if is_project or frame in innermost:
+            sample.append(
+                f'{_short_path(frame.filename, base_dir)}:{frame.lineno} '
+                f'в {frame.name}'
+            )
+    return sample
+
+
+def _empty_stats():
+    return {'count': 0, 'total': 0.0, 'max': 0.0}
+
+
+def _add_timing(stats, duration):
+    stats['count'] += 1
+    stats['total'] += duration
+    if duration > stats['max']:
+        stats['max'] = duration
+
+
+def _merge_timing(target, source):
+    target['count'] += source['count']
+    target['total'] += source['total']
+    target['max'] = max(target['max'], source['max'])
+
+
+class QuerySampler:
+    """
+    Внутрипроцессный сборщик статистики SQL-запросов.
+
+    Подключается к соединению через connection.execute_wrapper,
+    агрегирует количество, суммарное и максимальное время по отпечатку
+    запроса и по view, из которого он был вызван. Для запросов
+    медленнее порога сохраняет образец стека вызовов.
+    Периодически сбрасывает снимок на диск, чтобы команда
+    slow_queries и админка видели данные всех воркеров.
+    """
+
+    def __init__(self, threshold_ms, max_fingerprints, snapshot_dir,
+                 flush_interval):
+        self.threshold = threshold_ms / 1000
+        self.max_fingerprints = max_fingerprints
+        self.snapshot_dir = Path(snapshot_dir)
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stats = {}
+        self._started_at = time.time()
+        self._flushed_at = time.monotonic()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - started)
+
+    def record(self, sql, duration):
+        key = fingerprint(sql)
+        view = current_view.get() or NO_VIEW
+        stack = _sample_stack() if duration >= self.threshold else None
+
+        with self._lock:
+            entry = self._stats.get(key)
+            if entry is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    return
+                entry = self._stats[key] = {
+                    **_empty_stats(),
+                    'views': {},
+                    'sample': None,
+                }
+            _add_timing(entry, duration)
+            _add_timing(
+                entry['views'].setdefault(view, _empty_stats()), duration
+            )
+            sample = entry['sample']
+            if stack is not None and (
+                sample is None or duration >= sample['duration']
+            ):
+                entry['sample'] = {
+                    'duration': duration,
+                    'view': view,
+                    'stack': stack,
+                }
+
+    def snapshot(self):
+        """Возвращает копию накопленной статистики."""
+
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self._started_at = time.time()
+
+    def maybe_flush(self):
+        """
+        Сбрасывает снимок на диск, если с прошлого сброса прошло
+        больше flush_interval секунд. Одновременно сбрасывает только
+        один поток; ошибки записи не должны ломать обработку запроса.
+        """
+
+        now = time.monotonic()
+        if now - self._flushed_at < self.flush_interval:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._flushed_at = now
+            self.flush()
+        except OSError:
+            pass
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        marker = self.snapshot_dir / RESET_MARKER
+        if marker.exists() and marker.stat().st_mtime > self._started_at:
+            self.reset()
+
+        path = self.snapshot_dir / f'{os.getpid()}{SNAPSHOT_SUFFIX}'
+        tmp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+def merge_snapshots(snapshots):
+    """Объединяет снимки нескольких воркеров в одну статистику."""
+
+    merged = {}
+    for snapshot in snapshots:
+        for key, entry in snapshot.items():
+            target = merged.setdefault(
+                key, {**_empty_stats(), 'views': {}, 'sample': None}
+            )
+            _merge_timing(target, entry)
+            for view, stats in entry['views'].items():
+                _merge_timing(
+                    target['views'].setdefault(view, _empty_stats()), stats
+                )
+            sample = entry.get('sample')
+            if sample and (
+                target['sample'] is None
+                or sample['duration'] >= target['sample']['duration']
+            ):
+                target['sample'] = sample
+    return merged
+
+
+def load_snapshots(snapshot_dir, exclude=None):
+    """Читает снимки всех воркеров из директории."""
+
+    snapshots = []
+    for path in sorted(Path(snapshot_dir).glob(f'*{SNAPSHOT_SUFFIX}')):
+        if path == exclude:
+            continue
+        try:
+            with open(path, encoding='utf-8') as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def request_reset(snapshot_dir):
+    """
+    Просит все воркеры обнулить статистику: удаляет снимки и ставит
+    маркер, который воркеры проверяют при следующем сбросе на диск.
+    """
+
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    for path in snapshot_dir.glob(f'*{SNAPSHOT_SUFFIX}'):
+        path.unlink(missing_ok=True)
+    (snapshot_dir / RESET_MARKER).touch()
+
+
+def top_queries(stats, limit, order_by='total', view=None):
+    """
+    Сортирует агрегированную статистику по total/max/count.
+    Если указан view, учитываются только его вызовы.
+    """
+
+    rows = []
+    for key, entry in stats.items():
+        timing = entry
+        if view is not None:
+            timing = entry['views'].get(view)
+            if timing is None:
+                continue
+        rows.append({
+            'fingerprint': key,
+            'count': timing['count'],
+            'total_ms': timing['total'] * 1000,
+            'avg_ms': timing['total'] * 1000 / timing['count'],
+            'max_ms': timing['max'] * 1000,
+            'views': sorted(
+                entry['views'].items(),
+                key=lambda item: item[1]['total'],
+                reverse=True
+            ),
+            'sample': entry['sample'],
+        })
+    sort_key = {
+        'total': 'total_ms', 'max': 'max_ms', 'count': 'count'
+    }[order_by]
+    rows.sort(key=lambda row: row[sort_key], reverse=True)
+    return rows[:limit]
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler():
+    """Возвращает сборщик текущего процесса, создавая его при надобности."""
+
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = QuerySampler(
+                    threshold_ms=settings.QUERY_SAMPLER_SLOW_MS,
+                    max_fingerprints=settings.QUERY_SAMPLER_MAX_FINGERPRINTS,
+                    snapshot_dir=settings.QUERY_SAMPLER_DIR,
+                    flush_interval=settings.QUERY_SAMPLER_FLUSH_INTERVAL,
+                )
+    return _sampler
+
+
+def collected_stats():
+    """Статистика всех воркеров вместе с текущим процессом."""
+
+    sampler = get_sampler()
+    # Собственный снимок на диске может отставать — берём данные из памяти
+    own_path = sampler.snapshot_dir / f'{os.getpid()}{SNAPSHOT_SUFFIX}'
+    snapshots = load_snapshots(sampler.snapshot_dir, exclude=own_path)
+    snapshots.append(sampler.snapshot())
+    return merge_snapshots(snapshots)
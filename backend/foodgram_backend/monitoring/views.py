@@ -0,0 +1,85 @@
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.views import View
+
+from .metrics import render_metrics
+from .profiling import list_profiles, profile_path
+from .query_sampler import collected_stats, top_queries
+
+
+ORDER_CHOICES = ('total', 'max', 'count')
+DEFAULT_LIMIT = 50
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class SlowQueriesView(View):
+    """
+    Страница админки со статистикой SQL-запросов, собранной
+    QuerySampler во всех воркерах.
+    Параметры: order (total|max|count), view, limit.
+    """
+
+    template_name = 'monitoring/slow_queries.html'
+
+    def get(self, request):
+        order_by = request.GET.get('order', 'total')
+        if order_by not in ORDER_CHOICES:
+            order_by = 'total'
+        view_name = request.GET.get('view') or None
+        try:
+            limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            limit = DEFAULT_LIMIT
+
+        stats = collected_stats()
+        view_names = sorted({
+            name for entry in stats.values() for name in entry['views']
+        })
+        context = {
+            **admin.site.each_context(request),
+            'title': 'Статистика SQL-запросов',
+            'rows': top_queries(stats, limit, order_by, view_name),
+            'order_by': order_by,
+            'order_choices': ORDER_CHOICES,
+            'view_name': view_name,
+            'view_names': view_names,
+        }
+        return render(request, self.template_name, context)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ProfileListView(View):
+    """
+    Страница админки со сводками профилей запросов:
+    самые затратные функции и места аллокаций памяти.
+    """
+
+    template_name = 'monitoring/profiles.html'
+
+    def get(self, request):
+        context = {
+            **admin.site.each_context(request),
+            'title': 'Профили запросов',
+            'profiles': list_profiles(),
+        }
+        return render(request, self.template_name, context)
+
+
+@staff_member_required
+def profile_download_view(request, profile_id):
+    """Отдаёт файл профиля cProfile для анализа в pstats/snakeviz."""
+
+    path = profile_path(profile_id)
+    if path is None:
+        raise Http404('Профиль не найден.')
+    return FileResponse(open(path, 'rb'), as_attachment=True)
+
+
+def metrics_view(request):
+    """Отдаёт метрики в текстовом формате Prometheus."""
+
+    payload, content_type = render_metrics()
+    return HttpResponse(payload, content_type=content_type)
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 
 from .models import (
@@ -44,16 +45,25 @@ class RecipeAdmin(BaseAdminSettings):
     """Админ-панель для модели Recipe"""
 
     list_display = (
-        'id', 'name', 'author', 'get_image_preview', 'favorited_count'
+        'id', 'name', 'author', 'get_image_preview', 'favorited_count',
+        'popularity'
     )
 
-    readonly_fields = ('get_image_preview', 'favorited_count')
+    readonly_fields = (
+        'get_image_preview', 'favorited_count', 'popularity',
+        'trending_score'
+    )
     search_fields = ('name', 'author__username')
     list_filter = ('author', 'name')
     inlines = [RecipeIngredientInline]
 
     ordering = ('-pub_date',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorited_total=Count('favorited_by')
+        )
+
     def get_image_preview(self, obj):
         if obj.image:
             return format_html(
@@ -64,10 +74,10 @@ class RecipeAdmin(BaseAdminSettings):
     get_image_preview.short_description = 'Первью изображения'
 
     def favorited_count(self, obj):
-        return obj.favorited_by.count()
+        return obj.favorited_total
 
     favorited_count.short_description = 'В избранном (раз)'
-    favorited_count.admin_order_field = 'favorited_by__count'
+    favorited_count.admin_order_field = 'favorited_total'
 
 
 @admin.register(Favorite)
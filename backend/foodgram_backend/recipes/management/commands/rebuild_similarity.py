@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes import similarity
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает MinHash-сигнатуры и корзины LSH всех рецептов.
+    Нужна после первого развёртывания и после изменения
+    MINHASH_PERMUTATIONS или MINHASH_BANDS; новые и изменённые
+    рецепты обновляются при сохранении.
+    """
+
+    help = 'Пересчитывает сигнатуры похожих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.SIMILARITY_REBUILD_BATCH_SIZE,
+            help='Сколько рецептов пересчитывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        count = similarity.rebuild(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано рецептов: {count}')
+        )
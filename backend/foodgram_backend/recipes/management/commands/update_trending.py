@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from recipes import popularity
+
+
+class Command(BaseCommand):
+    """
+    Затухание рейтинга рецептов в трендах за время с прошлого запуска.
+    Запускается периодически (например, cron раз в час) или с --rebuild
+    для полного пересчёта популярности по избранному и спискам покупок.
+    """
+
+    help = 'Обновляет рейтинг рецептов в трендах'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help=(
+                'Пересчитать популярность и рейтинг заново. Одновременные '
+                'добавления в избранное могут потеряться, лучше запускать '
+                'при низкой нагрузке.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = popularity.rebuild()
+            self.stdout.write(
+                self.style.SUCCESS(f'Пересчитано рецептов: {count}')
+            )
+            return
+
+        count = popularity.decay()
+        self.stdout.write(
+            self.style.SUCCESS(f'Рейтинг затух у рецептов: {count}')
+        )
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.19 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_ingredient_ordering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingDecay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decayed_date', models.DateTimeField(verbose_name='Время последнего затухания')),
+            ],
+            options={
+                'verbose_name': 'Затухание трендов',
+                'verbose_name_plural': 'Затухание трендов',
+            },
+        ),
+    ]
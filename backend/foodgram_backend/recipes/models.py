@@ -46,11 +46,13 @@ class Ingredient(models.Model):
 class Recipe(models.Model):
     """Модель рецепта"""
 
+    # Отдельный индекс не нужен: его заменяет recipe_author_pub_date_idx
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
-        verbose_name='Автор рецепта'
+        verbose_name='Автор рецепта',
+        db_index=False
     )
 
     name = models.CharField(
@@ -92,14 +94,69 @@ class Recipe(models.Model):
         db_index=True
     )
 
+    # Счётчики обновляются сигналами Favorite и ShoppingCart
+    # (recipes.popularity), рейтинг в трендах ещё и затухает со временем
+    popularity = models.PositiveIntegerField(
+        verbose_name='Популярность',
+        default=0,
+        editable=False
+    )
+    trending_score = models.FloatField(
+        verbose_name='Рейтинг в трендах',
+        default=0,
+        editable=False
+    )
+
+    # Меняются только запросами UPDATE (recipes.popularity)
+    COUNTER_FIELDS = ('popularity', 'trending_score')
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-popularity', '-id'],
+                name='recipe_popularity_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-id'],
+                name='recipe_trending_idx'
+            ),
+            # Рецепты автора по дате: ?author=, подписки, лента
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+            # Затухание трендов обновляет только рецепты с рейтингом
+            models.Index(
+                fields=['trending_score'],
+                condition=models.Q(trending_score__gt=0),
+                name='recipe_trending_nonzero_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} (Автор: {self.author.username})'
 
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        """
+        UPDATE при сохранении рецепта не записывает счётчики
+        популярности: их значения, прочитанные до сохранения, затёрли бы
+        одновременные прибавления F() из recipes.popularity. Остальное
+        поведение save() не меняется: отложенные поля (.only(), .defer())
+        не перечитываются, а удалённая строка вставляется заново.
+        """
+
+        values = [
+            value for value in values
+            if value[0].name not in self.COUNTER_FIELDS
+        ]
+        return super()._do_update(
+            base_qs, using, pk_val, values, update_fields, forced_update
+        )
+
 
 class RecipeIngredient(models.Model):
     """
@@ -113,11 +170,13 @@ class RecipeIngredient(models.Model):
         verbose_name='Рецепт'
     )
 
+    # Отдельный индекс не нужен: его заменяет recipe_ingredient_reverse_idx
     ingredient = models.ForeignKey(
         Ingredient,
         on_delete=models.PROTECT,
         related_name='ingredient_recipes',
-        verbose_name='Ингредиент'
+        verbose_name='Ингредиент',
+        db_index=False
     )
 
     amount = models.PositiveSmallIntegerField(
@@ -132,12 +191,22 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
+        # Ингредиенты выводятся в порядке, в котором их указал автор
+        ordering = ('id',)
         constraints = [
             models.UniqueConstraint(
                 fields=['recipe', 'ingredient'],
                 name='unique_recipe_ingredient'
             )
         ]
+        indexes = [
+            # Проверки PROTECT при удалении ингредиента и построение
+            # индекса ингредиентов читают только этот индекс
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='recipe_ingredient_reverse_idx'
+            ),
+        ]
 
     def __str__(self):
         return (f'{self.ingredient.name} - {self.amount} '
@@ -148,10 +217,13 @@ class RecipeIngredient(models.Model):
 class UserRecipeRelationBase(models.Model):
     """Абстрактная базовая модель для Favorite и ShoppingCart"""
 
+    # Отдельный индекс не нужен: поиск по пользователю идёт по
+    # уникальному ограничению и индексу user_added_idx
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        verbose_name='Пользователь'
+        verbose_name='Пользователь',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -172,6 +244,12 @@ class UserRecipeRelationBase(models.Model):
                 name='%(app_label)s_%(class)s_unique_user_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', '-added_date'],
+                name='%(class)s_user_added_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
@@ -193,3 +271,80 @@ class ShoppingCart(UserRecipeRelationBase):
         default_related_name = 'in_shopping_cart'
         verbose_name = 'Рецепт в списке покупок'
         verbose_name_plural = 'Рецепты в списке покупок'
+
+
+class RecipeSignature(models.Model):
+    """
+    MinHash-сигнатура набора ингредиентов рецепта (recipes.similarity):
+    массив uint32 длиной MINHASH_PERMUTATIONS в виде байтов.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    signature = models.BinaryField(verbose_name='Сигнатура')
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class RecipeBucket(models.Model):
+    """
+    Корзина LSH: хеш одной полосы сигнатуры рецепта. Рецепты
+    с общей корзиной — кандидаты в похожие.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    bucket = models.BigIntegerField(verbose_name='Корзина')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'band'],
+                name='unique_recipe_bucket_band'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['band', 'bucket'],
+                name='recipe_bucket_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band}/{self.bucket}'
+
+
+class TrendingDecay(models.Model):
+    """
+    Время последнего затухания рейтинга в трендах (одна строка).
+    По нему update_trending считает, сколько времени прошло на самом
+    деле, даже если запуски cron пропускались или накладывались.
+    """
+
+    decayed_date = models.DateTimeField(
+        verbose_name='Время последнего затухания'
+    )
+
+    class Meta:
+        verbose_name = 'Затухание трендов'
+        verbose_name_plural = 'Затухание трендов'
+
+    def __str__(self):
+        return str(self.decayed_date)
@@ -0,0 +1,110 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from constants import FAVORITE_SCORE_WEIGHT, SHOPPING_CART_SCORE_WEIGHT
+
+from .models import Favorite, Recipe, ShoppingCart, TrendingDecay
+
+
+# Рейтинг ниже этого значения обнуляется при затухании, чтобы старые
+# рецепты не переписывались каждым запуском
+MIN_TRENDING_SCORE = 0.01
+
+EVENT_WEIGHTS = {
+    Favorite: FAVORITE_SCORE_WEIGHT,
+    ShoppingCart: SHOPPING_CART_SCORE_WEIGHT,
+}
+
+
+def decay_factor(seconds):
+    """Во сколько раз затухает рейтинг в трендах за seconds секунд."""
+
+    half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+    return 0.5 ** (seconds / half_life)
+
+
+def add_event(recipe_id, weight):
+    Recipe.objects.filter(pk=recipe_id).update(
+        popularity=F('popularity') + weight,
+        trending_score=F('trending_score') + weight,
+    )
+
+
+def remove_event(recipe_id, weight, added):
+    """
+    Отменяет вклад события. Вклад в рейтинг в трендах к этому моменту
+    уже затух, поэтому вычитается с учётом возраста события.
+    """
+
+    age = (timezone.now() - added).total_seconds()
+    Recipe.objects.filter(pk=recipe_id).update(
+        popularity=Greatest(F('popularity') - weight, Value(0)),
+        trending_score=Greatest(
+            F('trending_score') - weight * decay_factor(age), Value(0.0)
+        ),
+    )
+
+
+def decay():
+    """
+    Затухание рейтинга в трендах за время, прошедшее с прошлого
+    затухания (TrendingDecay). Строка блокируется до конца транзакции,
+    поэтому одновременные запуски не затухают за один промежуток дважды.
+    Первый запуск только запоминает время. Возвращает количество
+    обновлённых рецептов.
+    """
+
+    with transaction.atomic():
+        state, created = TrendingDecay.objects.select_for_update(
+        ).get_or_create(pk=1, defaults={'decayed_date': timezone.now()})
+        if created:
+            return 0
+        now = timezone.now()
+        seconds = max((now - state.decayed_date).total_seconds(), 0)
+        updated = Recipe.objects.filter(
+            trending_score__gte=MIN_TRENDING_SCORE
+        ).update(trending_score=F('trending_score') * decay_factor(seconds))
+        Recipe.objects.filter(
+            trending_score__gt=0, trending_score__lt=MIN_TRENDING_SCORE
+        ).update(trending_score=0)
+        state.decayed_date = now
+        state.save(update_fields=('decayed_date',))
+    return updated
+
+
+def rebuild(batch_size=1000):
+    """
+    Пересчитывает популярность и рейтинг в трендах всех рецептов
+    по таблицам избранного и списков покупок.
+    """
+
+    now = timezone.now()
+    scores = defaultdict(lambda: [0, 0.0])
+    for model, weight in EVENT_WEIGHTS.items():
+        events = model.objects.values_list('recipe_id', 'added_date')
+        for recipe_id, added in events.iterator():
+            score = scores[recipe_id]
+            score[0] += weight
+            score[1] += weight * decay_factor(
+                (now - added).total_seconds()
+            )
+
+    recipes = []
+    for recipe in Recipe.objects.only('id').iterator():
+        recipe.popularity, recipe.trending_score = scores.get(
+            recipe.pk, (0, 0.0)
+        )
+        recipes.append(recipe)
+    Recipe.objects.bulk_update(
+        recipes, ['popularity', 'trending_score'], batch_size=batch_size
+    )
+    # Рейтинг посчитан на момент now, затухать дальше нужно с него
+    TrendingDecay.objects.update_or_create(
+        pk=1, defaults={'decayed_date': now}
+    )
+    return len(recipes)
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Favorite, ShoppingCart
+from .popularity import EVENT_WEIGHTS, add_event, remove_event
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def add_popularity(sender, instance, created, **kwargs):
+    if created:
+        add_event(instance.recipe_id, EVENT_WEIGHTS[sender])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def remove_popularity(sender, instance, **kwargs):
+    remove_event(
+        instance.recipe_id, EVENT_WEIGHTS[sender], instance.added_date
+    )
@@ -0,0 +1,155 @@
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Recipe, RecipeBucket, RecipeIngredient, RecipeSignature
+
+
+# Простое число Мерсенна 2^31 - 1: a * x + b для id до 2^32
+# помещается в uint64 без переполнения
+MINHASH_PRIME = (1 << 31) - 1
+MINHASH_SEED = 20240601
+SIGNATURE_DTYPE = np.dtype('<u4')
+# Множитель полиномиального хеша полосы (по модулю 2^64)
+BAND_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+
+
+def _permutations():
+    """Коэффициенты хеш-функций (a, b); одинаковы во всех процессах."""
+
+    rng = np.random.default_rng(MINHASH_SEED)
+    size = settings.MINHASH_PERMUTATIONS
+    return (
+        rng.integers(1, MINHASH_PRIME, size, dtype=np.uint64),
+        rng.integers(0, MINHASH_PRIME, size, dtype=np.uint64),
+    )
+
+
+def signatures(ingredient_ids, starts):
+    """
+    MinHash-сигнатуры нескольких рецептов сразу: ingredient_ids —
+    ингредиенты рецептов подряд, starts — индексы начала каждого
+    рецепта. Возвращает матрицу (рецепты × MINHASH_PERMUTATIONS).
+    """
+
+    a, b = _permutations()
+    hashes = (
+        a * np.asarray(ingredient_ids, dtype=np.uint64)[:, None] + b
+    ) % MINHASH_PRIME
+    return np.minimum.reduceat(hashes, starts, axis=0).astype(
+        SIGNATURE_DTYPE
+    )
+
+
+def band_buckets(signature_matrix):
+    """Хеши полос сигнатур: матрица (рецепты × MINHASH_BANDS) int64."""
+
+    bands = settings.MINHASH_BANDS
+    rows = signature_matrix.reshape(len(signature_matrix), bands, -1)
+    buckets = np.broadcast_to(
+        np.arange(bands, dtype=np.uint64), rows.shape[:2]
+    ).copy()
+    # Переполнение uint64 здесь ожидаемо: хеш считается по модулю 2^64
+    for column in range(rows.shape[2]):
+        buckets = buckets * BAND_HASH_MULTIPLIER + rows[:, :, column]
+    return buckets.view(np.int64)
+
+
+def update_recipes(recipe_ids):
+    """Пересчитывает сигнатуры и корзины LSH рецептов recipe_ids."""
+
+    recipe_ids = list(recipe_ids)
+    pairs = np.array(
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+    with transaction.atomic():
+        RecipeBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+        if not len(pairs):
+            return
+        starts = np.flatnonzero(
+            np.diff(pairs[:, 0], prepend=pairs[0, 0] - 1)
+        )
+        owners = pairs[starts, 0].tolist()
+        signature_matrix = signatures(pairs[:, 1], starts)
+        RecipeSignature.objects.bulk_create(
+            RecipeSignature(recipe_id=recipe_id, signature=row.tobytes())
+            for recipe_id, row in zip(owners, signature_matrix)
+        )
+        RecipeBucket.objects.bulk_create(
+            RecipeBucket(recipe_id=recipe_id, band=band, bucket=bucket)
+            for recipe_id, row in zip(
+                owners, band_buckets(signature_matrix).tolist()
+            )
+            for band, bucket in enumerate(row)
+        )
+
+
+def rebuild(batch_size):
+    """Пересчитывает сигнатуры всех рецептов пачками по batch_size."""
+
+    recipe_ids = Recipe.objects.order_by('pk').values_list(
+        'pk', flat=True
+    ).iterator(chunk_size=batch_size)
+    count = 0
+    while batch := list(islice(recipe_ids, batch_size)):
+        update_recipes(batch)
+        count += len(batch)
+    return count
+
+
+def _signature(raw):
+    signature = np.frombuffer(raw, dtype=SIGNATURE_DTYPE)
+    # Сигнатура, посчитанная с другим MINHASH_PERMUTATIONS, не годится
+    if len(signature) != settings.MINHASH_PERMUTATIONS:
+        return None
+    return signature
+
+
+def similar_recipe_ids(recipe_id, limit):
+    """
+    id рецептов с наиболее похожими наборами ингредиентов по убыванию
+    оценки сходства Жаккара. Сравниваются только рецепты, попавшие
+    с recipe_id хотя бы в одну корзину LSH (не больше
+    SIMILAR_RECIPES_MAX_CANDIDATES), поэтому стоимость не зависит
+    от размера каталога.
+    """
+
+    raw = RecipeSignature.objects.filter(recipe_id=recipe_id).values_list(
+        'signature', flat=True
+    ).first()
+    signature = None if raw is None else _signature(bytes(raw))
+    if signature is None:
+        return []
+
+    buckets = Q()
+    for band, bucket in enumerate(band_buckets(signature[None])[0].tolist()):
+        buckets |= Q(band=band, bucket=bucket)
+    candidates = RecipeBucket.objects.filter(buckets).exclude(
+        recipe_id=recipe_id
+    ).values('recipe_id').distinct()
+    candidates = candidates[:settings.SIMILAR_RECIPES_MAX_CANDIDATES]
+
+    rows = [
+        (pk, candidate)
+        for pk, raw in RecipeSignature.objects.filter(
+            recipe_id__in=candidates
+        ).values_list('recipe_id', 'signature')
+        if (candidate := _signature(bytes(raw))) is not None
+    ]
+    if not rows:
+        return []
+    ids = np.array([pk for pk, _ in rows])
+    similarity = (np.stack([row for _, row in rows]) == signature).mean(
+        axis=1
+    )
+    # По убыванию сходства, при равенстве — сначала новые рецепты
+    order = np.lexsort((-ids, -similarity))[:limit]
+    return ids[order].tolist()
@@ -0,0 +1,157 @@
+import base64
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from recipes.models import Recipe
+
+from .models import PopularAuthorRecipe, Subscription, TimelineEntry
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(pub_date, recipe_id):
+    raw = f'{pub_date.isoformat()}|{recipe_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (pub_date, recipe_id) из курсора ленты."""
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        pub_date, recipe_id = raw.split('|')
+        return datetime.fromisoformat(pub_date), int(recipe_id)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor('Некорректный курсор ленты.')
+
+
+def _before(position):
+    """Условие keyset-пагинации: строго после позиции в порядке ленты."""
+
+    if position is None:
+        return Q()
+    pub_date, recipe_id = position
+    return Q(pub_date__lt=pub_date) | Q(
+        pub_date=pub_date, recipe_id__lt=recipe_id
+    )
+
+
+def fan_out(recipe):
+    """
+    Рассылает новый рецепт по лентам подписчиков автора. Если
+    подписчиков больше FEED_FANOUT_MAX_FOLLOWERS, рецепт попадает
+    в PopularAuthorRecipe и читается из него при показе ленты.
+    """
+
+    # Без сортировки по дате подписки список читается только из индекса
+    followers = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).order_by().values_list('user_id', flat=True)
+    if followers.count() > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        PopularAuthorRecipe.objects.get_or_create(
+            recipe=recipe,
+            defaults={
+                'author_id': recipe.author_id,
+                'pub_date': recipe.pub_date,
+            }
+        )
+        return
+
+    followers = followers.iterator(chunk_size=settings.FEED_BATCH_SIZE)
+    while batch := list(islice(followers, settings.FEED_BATCH_SIZE)):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=user_id,
+                    recipe_id=recipe.pk,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pub_date,
+                )
+                for user_id in batch
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def recent_recipes(author_id, limit):
+    """
+    Последние limit рецептов автора в виде (id, pub_date), кроме
+    рецептов, которые читаются из PopularAuthorRecipe.
+    """
+
+    return list(
+        Recipe.objects.filter(author_id=author_id).exclude(
+            pk__in=PopularAuthorRecipe.objects.filter(
+                author_id=author_id
+            ).values('recipe_id')
+        ).order_by('-pub_date', '-id').values_list('id', 'pub_date')[:limit]
+    )
+
+
+def timeline_entries(user_id, author_id, recipes):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            recipe_id=recipe_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for recipe_id, pub_date in recipes
+    ]
+
+
+def follow(user_id, author_id):
+    """Добавляет в ленту последние рецепты нового автора."""
+
+    TimelineEntry.objects.bulk_create(
+        timeline_entries(
+            user_id, author_id,
+            recent_recipes(author_id, settings.FEED_BACKFILL_PER_AUTHOR)
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def unfollow(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed_page(user_id, limit, position=None):
+    """
+    Страница ленты после позиции position: объединение записей ленты
+    пользователя и рецептов популярных авторов из его подписок.
+    Возвращает (рецепты, позиция для следующей страницы или None).
+    """
+
+    ordering = ('-pub_date', '-recipe_id')
+    pushed = TimelineEntry.objects.filter(
+        _before(position), user_id=user_id
+    ).order_by(*ordering).values_list('pub_date', 'recipe_id')[:limit + 1]
+    pulled = PopularAuthorRecipe.objects.filter(
+        _before(position),
+        author_id__in=Subscription.objects.filter(
+            user_id=user_id
+        ).values('author_id'),
+    ).order_by(*ordering).values_list('pub_date', 'recipe_id')[:limit + 1]
+
+    positions = []
+    seen = set()
+    for item in heapq.merge(pushed, pulled, reverse=True):
+        if item[1] not in seen:
+            seen.add(item[1])
+            positions.append(item)
+    page, rest = positions[:limit], positions[limit:]
+
+    recipes = Recipe.objects.select_related('author').prefetch_related(
+        'recipe_ingredients__ingredient'
+    ).in_bulk([recipe_id for _, recipe_id in page])
+    return (
+        [recipes[recipe_id] for _, recipe_id in page if recipe_id in recipes],
+        page[-1] if rest else None,
+    )
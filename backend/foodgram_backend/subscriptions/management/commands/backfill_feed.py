@@ -0,0 +1,92 @@
+from functools import lru_cache
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from recipes.models import Recipe
+from subscriptions import feed
+from subscriptions.models import (
+    PopularAuthorRecipe,
+    Subscription,
+    TimelineEntry,
+)
+
+
+class Command(BaseCommand):
+    """
+    Заполняет ленты подписок по существующим подпискам: рецепты
+    авторов с числом подписчиков больше FEED_FANOUT_MAX_FOLLOWERS
+    попадают в PopularAuthorRecipe, остальным подписчикам в ленту
+    добавляются последние рецепты их авторов.
+    """
+
+    help = 'Заполняет ленты подписок по существующим подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--per-author',
+            type=int,
+            default=settings.FEED_BACKFILL_PER_AUTHOR,
+            help='Сколько последних рецептов автора добавить в ленту.',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Очистить ленты перед заполнением.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = settings.FEED_BATCH_SIZE
+        if options['clear']:
+            TimelineEntry.objects.all().delete()
+            PopularAuthorRecipe.objects.all().delete()
+
+        popular_authors = set(
+            Subscription.objects.values('author_id').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+            ).values_list('author_id', flat=True)
+        )
+        PopularAuthorRecipe.objects.bulk_create(
+            [
+                PopularAuthorRecipe(
+                    recipe_id=recipe_id, author_id=author_id,
+                    pub_date=pub_date
+                )
+                for recipe_id, author_id, pub_date in Recipe.objects.filter(
+                    author_id__in=popular_authors
+                ).values_list('id', 'author_id', 'pub_date')
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+        recent_recipes = lru_cache(maxsize=10000)(
+            lambda author_id: feed.recent_recipes(
+                author_id, options['per_author']
+            )
+        )
+        subscriptions = Subscription.objects.exclude(
+            author_id__in=popular_authors
+        ).values_list('user_id', 'author_id').iterator(chunk_size=batch_size)
+        while batch := list(islice(subscriptions, batch_size)):
+            TimelineEntry.objects.bulk_create(
+                [
+                    entry
+                    for user_id, author_id in batch
+                    for entry in feed.timeline_entries(
+                        user_id, author_id, recent_recipes(author_id)
+                    )
+                ],
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярных авторов: {len(popular_authors)}, '
+            f'их рецептов: {PopularAuthorRecipe.objects.count()}; '
+            f'записей в лентах: {TimelineEntry.objects.count()}'
+        ))
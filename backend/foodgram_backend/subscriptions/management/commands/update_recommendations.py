@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscriptions import recommendations
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает рекомендации авторов всех пользователей. Запускается
+    периодически: подписки обновляют рекомендации сразу, а избранное
+    и подписки популярных авторов учитываются этой командой.
+    """
+
+    help = 'Пересчитывает рекомендации авторов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.AUTHOR_RECOMMENDATIONS_BATCH_SIZE,
+            help='Сколько пользователей пересчитывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        count = recommendations.rebuild(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Пересчитано пользователей: {count}')
+        )
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from recipes.models import Recipe
+
 
 User = get_user_model()
 
@@ -14,11 +16,13 @@ class Subscription(models.Model):
         related_name='following',
         verbose_name='Подписчик'
     )
+    # Отдельный индекс не нужен: его заменяет subscription_author_user_idx
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='follower',
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False
     )
     created_date = models.DateTimeField(
         verbose_name='Дата подписки',
@@ -39,6 +43,142 @@ class Subscription(models.Model):
                 name='prevent_self_subscription'
             )
         ]
+        indexes = [
+            # Подписчики автора (рассылка ленты, рекомендации) читаются
+            # только из индекса
+            models.Index(
+                fields=['author', 'user'],
+                name='subscription_author_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user.username} подписан на {self.author.username}'
+
+
+class TimelineEntry(models.Model):
+    """
+    Запись ленты подписок пользователя: рецепт автора, на которого он
+    подписан. Создаётся при публикации рецепта (fan-out on write),
+    дата публикации продублирована для чтения ленты по индексу.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_user_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.recipe.name}'
+
+
+class PopularAuthorRecipe(models.Model):
+    """
+    Рецепт автора, у которого на момент публикации было слишком много
+    подписчиков для рассылки по лентам. Такие рецепты подмешиваются
+    в ленту при чтении (fan-out on read).
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Рецепт популярного автора'
+        verbose_name_plural = 'Рецепты популярных авторов'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-recipe'],
+                name='popular_author_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class AuthorRecommendation(models.Model):
+    """
+    Автор, которого стоит предложить пользователю: на него подписаны
+    те, на кого подписан пользователь, или пользователь добавляет его
+    рецепты в избранное. Считается subscriptions.recommendations.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='author_recommendations',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рекомендуемый автор'
+    )
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация автора'
+        verbose_name_plural = 'Рекомендации авторов'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_author_recommendation'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score', 'author'],
+                name='recommendation_user_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.author.username}'
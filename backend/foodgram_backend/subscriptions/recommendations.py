@@ -0,0 +1,142 @@
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from scipy import sparse
+
+from constants import (
+    RECOMMENDATION_FAVORITE_WEIGHT,
+    RECOMMENDATION_FOLLOW_WEIGHT,
+)
+from recipes.models import Favorite
+
+from .models import AuthorRecommendation, Subscription
+
+
+User = get_user_model()
+
+
+def _ids(values):
+    return np.unique(np.fromiter(values, dtype=np.int64))
+
+
+def _matrix(pairs, rows, columns, weight):
+    """
+    Разреженная матрица смежности: строки и столбцы — отсортированные
+    id rows и columns, повторяющиеся пары складываются.
+    """
+
+    pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+    return sparse.csr_matrix(
+        (
+            np.full(len(pairs), weight, dtype=np.float64),
+            (
+                np.searchsorted(rows, pairs[:, 0]),
+                np.searchsorted(columns, pairs[:, 1]),
+            ),
+        ),
+        shape=(len(rows), len(columns)),
+    )
+
+
+def compute(user_ids, limit):
+    """
+    Рекомендации авторов для пользователей user_ids: словарь
+    {id пользователя: [(id автора, оценка), ...]} по убыванию оценки.
+
+    Оценка автора — число подписок на него среди тех, на кого подписан
+    пользователь, плюс число его рецептов в избранном пользователя
+    (с весами из constants). Считается произведением разреженных
+    матриц «пользователи × знакомые» и «знакомые × авторы», авторы,
+    на которых пользователь уже подписан, и он сам исключаются.
+    """
+
+    users = _ids(user_ids)
+    follows = list(Subscription.objects.filter(
+        user_id__in=users.tolist()
+    ).order_by().values_list('user_id', 'author_id'))
+    middle = _ids(author_id for _, author_id in follows)
+    second_hop = list(Subscription.objects.filter(
+        user_id__in=middle.tolist()
+    ).order_by().values_list('user_id', 'author_id'))
+    favorites = list(Favorite.objects.filter(
+        user_id__in=users.tolist()
+    ).values_list('user_id', 'recipe__author_id'))
+    authors = np.union1d(
+        users,
+        _ids(author_id for _, author_id in follows + second_hop + favorites)
+    )
+
+    scores = (
+        _matrix(follows, users, middle, RECOMMENDATION_FOLLOW_WEIGHT)
+        @ _matrix(second_hop, middle, authors, 1)
+        + _matrix(favorites, users, authors, RECOMMENDATION_FAVORITE_WEIGHT)
+    )
+    known = _matrix(
+        follows + [(user_id, user_id) for user_id in users.tolist()],
+        users, authors, 1
+    )
+    scores = (scores - scores.multiply(known > 0)).tocsr()
+    scores.eliminate_zeros()
+
+    recommendations = {}
+    for row, user_id in enumerate(users.tolist()):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        candidates = authors[scores.indices[start:end]]
+        values = scores.data[start:end]
+        # По убыванию оценки, при равенстве — по id автора
+        top = np.lexsort((candidates, -values))[:limit]
+        recommendations[user_id] = list(zip(
+            candidates[top].tolist(), values[top].tolist()
+        ))
+    return recommendations
+
+
+def refresh(user_ids):
+    """Пересчитывает и сохраняет рекомендации пользователей user_ids."""
+
+    user_ids = list(user_ids)
+    recommendations = compute(
+        user_ids, settings.AUTHOR_RECOMMENDATIONS_LIMIT
+    )
+    with transaction.atomic():
+        AuthorRecommendation.objects.filter(user_id__in=user_ids).delete()
+        AuthorRecommendation.objects.bulk_create(
+            AuthorRecommendation(
+                user_id=user_id, author_id=author_id, score=score
+            )
+            for user_id, authors in recommendations.items()
+            for author_id, score in authors
+        )
+
+
+def refresh_after_subscription(user_id):
+    """
+    Подписка меняет рекомендации самого пользователя и его
+    подписчиков (для них он — знакомый). Подписчикам сверх
+    AUTHOR_RECOMMENDATIONS_REFRESH_MAX_FOLLOWERS рекомендации
+    обновит update_recommendations.
+    """
+
+    followers = Subscription.objects.filter(
+        author_id=user_id
+    ).order_by().values_list('user_id', flat=True)
+    followers = followers[
+        :settings.AUTHOR_RECOMMENDATIONS_REFRESH_MAX_FOLLOWERS
+    ]
+    refresh([user_id, *followers])
+
+
+def rebuild(batch_size):
+    """Пересчитывает рекомендации всех пользователей пачками."""
+
+    user_ids = User.objects.order_by('pk').values_list(
+        'pk', flat=True
+    ).iterator(chunk_size=batch_size)
+    count = 0
+    while batch := list(islice(user_ids, batch_size)):
+        refresh(batch)
+        count += len(batch)
+    return count
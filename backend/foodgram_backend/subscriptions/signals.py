@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import Recipe
+
+from . import feed, recommendations
+from .models import Subscription
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: feed.fan_out(instance))
+
+
+@receiver(post_save, sender=Subscription)
+def follow_author(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: feed.follow(instance.user_id, instance.author_id)
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def unfollow_author(sender, instance, **kwargs):
+    feed.unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def refresh_recommendations(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: recommendations.refresh_after_subscription(instance.user_id)
+    )
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from monitoring import metrics
+
+
+# Признак того, что текущий поток уже выполняет хеширование в пуле:
+# PBKDF2PasswordHasher.verify вызывает encode, и повторная отправка
+# в пул из его же потока привела бы к взаимной блокировке
+_local = threading.local()
+
+
+class PasswordHashingBusy(Exception):
+    """
+    Очередь на хеширование паролей переполнена. Хеширование идёт
+    не только в API (админка, createsuperuser), поэтому исключение
+    не из DRF: в ответ 503 его переводит api.exception_handler.
+    """
+
+    def __init__(self, message=(
+        'Слишком много одновременных попыток входа. '
+        'Повторите запрос позже.'
+    )):
+        super().__init__(message)
+
+
+def _lower_priority(niceness):
+    """Понижает приоритет потока пула, чтобы он не вытеснял запросы."""
+
+    if niceness and hasattr(os, 'setpriority'):
+        try:
+            os.setpriority(
+                os.PRIO_PROCESS, threading.get_native_id(), niceness
+            )
+        except OSError:
+            pass
+
+
+class PasswordHashingExecutor:
+    """
+    Выделенный пул потоков для хеширования паролей.
+
+    Хеширование занимает сотни миллисекунд CPU, поэтому число
+    одновременно хешируемых паролей в воркере ограничено workers,
+    ожидать в очереди могут не больше queue_size задач,
+    а остальные запросы сразу получают 503. Состояние пула
+    отражается в метриках Prometheus.
+    """
+
+    def __init__(self, workers, queue_size, timeout, niceness):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix='password-hashing',
+            initializer=_lower_priority,
+            initargs=(niceness,),
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, algorithm, func, *args):
+        if getattr(_local, 'active', False):
+            return func(*args)
+
+        if not self._slots.acquire(blocking=False):
+            metrics.PASSWORD_HASHING_REJECTED.inc()
+            raise PasswordHashingBusy
+
+        queued_at = time.perf_counter()
+        metrics.PASSWORD_HASHING_QUEUED.inc()
+
+        def task():
+            metrics.PASSWORD_HASHING_QUEUED.dec()
+            metrics.PASSWORD_HASHING_WAIT.observe(
+                time.perf_counter() - queued_at
+            )
+            metrics.PASSWORD_HASHING_IN_PROGRESS.inc()
+            _local.active = True
+            try:
+                with metrics.PASSWORD_HASHING_DURATION.labels(
+                    algorithm
+                ).time():
+                    return func(*args)
+            finally:
+                _local.active = False
+                metrics.PASSWORD_HASHING_IN_PROGRESS.dec()
+
+        future = self._executor.submit(task)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                metrics.PASSWORD_HASHING_QUEUED.dec()
+            metrics.PASSWORD_HASHING_REJECTED.inc()
+            raise PasswordHashingBusy
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Возвращает пул хеширования текущего процесса."""
+
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = PasswordHashingExecutor(
+                    workers=settings.PASSWORD_HASHING_WORKERS,
+                    queue_size=settings.PASSWORD_HASHING_QUEUE_SIZE,
+                    timeout=settings.PASSWORD_HASHING_TIMEOUT,
+                    niceness=settings.PASSWORD_HASHING_NICENESS,
+                )
+    return _executor
+
+
+class OffloadedHasherMixin:
+    """
+    Выполняет encode и verify хешера в PasswordHashingExecutor.
+    Имя алгоритма не меняется, поэтому существующие хеши
+    проверяются как прежде.
+    """
+
+    def encode(self, password, salt, *args):
+        return get_executor().run(
+            self.algorithm, super().encode, password, salt, *args
+        )
+
+    def verify(self, password, encoded):
+        return get_executor().run(
+            self.algorithm, super().verify, password, encoded
+        )
+
+
+class PBKDF2PasswordHasher(
+    OffloadedHasherMixin, hashers.PBKDF2PasswordHasher
+):
+    """
+    PBKDF2-SHA256 с числом итераций из PASSWORD_PBKDF2_ITERATIONS.
+    Хеши с другим числом итераций пересчитываются при входе.
+    """
+
+    def __init__(self):
+        self.iterations = settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class Argon2PasswordHasher(
+    OffloadedHasherMixin, hashers.Argon2PasswordHasher
+):
+    """Argon2id с параметрами PASSWORD_ARGON2_*. Требует argon2-cffi."""
+
+    def __init__(self):
+        self.time_cost = settings.PASSWORD_ARGON2_TIME_COST
+        self.memory_cost = settings.PASSWORD_ARGON2_MEMORY_COST
+        self.parallelism = settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class ScryptPasswordHasher(
+    OffloadedHasherMixin, hashers.ScryptPasswordHasher
+):
+    """scrypt с коэффициентом сложности PASSWORD_SCRYPT_WORK_FACTOR."""
+
+    def __init__(self):
+        self.work_factor = settings.PASSWORD_SCRYPT_WORK_FACTOR
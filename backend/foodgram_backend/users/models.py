@@ -85,3 +85,21 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class TokenUser(User):
+    """
+    Пользователь, восстановленный из claims access-токена JWT
+    без обращения к БД. Содержит только поля из токена,
+    поэтому сохранять его нельзя — нужно загрузить пользователя из БД.
+    """
+
+    class Meta:
+        proxy = True
+        verbose_name = 'Пользователь из токена'
+        verbose_name_plural = 'Пользователи из токена'
+
+    def save(self, *args, **kwargs):
+        raise TypeError(
+            'TokenUser нельзя сохранить: загрузите пользователя из БД.'
+        )